@@ -4,9 +4,18 @@ import os
 import sys
 import json
 import logging
-from dataclasses import dataclass
+import argparse
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Any
-from sklearn.linear_model import LinearRegression
+
+import argus_store
+import argus_backoff
+import argus_regression
+import argus_metrics
+from argus_facettes import FacetIndex, CASCADE
+from argus_index import CURRENT_YEAR, SEGMENT_COLS, calculer_prix_final, borner_decote_vectorise
 
 # --- CONFIGURATION LOGGING ---
 logging.basicConfig(
@@ -24,24 +33,21 @@ OUTPUT_METADATA = "argus_metadata_v21.json"
 # --- CONSTANTES ---
 MIN_SAMPLES_FOR_VALIDITY = 3
 IQR_THRESHOLD = 1.5
-MIN_PRICE_FLOOR = 500
-MIN_RESIDUAL_VALUE = 0.15 
-
-@dataclass
-class CoteResult:
-    cote_affinee: int
-    cote_brute: int
-    confiance: str
-    volume_source: int
-    kilometrage_reference: int
-    ajustement_km: int
-    prix_plancher_atteint: bool
+
+IMPUTATION_COLS = ['Marque', 'Modèle', 'Année', 'Énergie']
+BUILD_MODES = ("vectorise", "boucle")
+SHARD_STRATEGIES = ("marque", "hash")
+SHARDS_PAR_WORKER = 4
 
 class ArgusEngine:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, robuste: str = None):
         self.data_path = data_path
         self.df = None
         self.referentiel = None
+        # Pente robuste (argus_regression.ROBUST_MODES) pour les petits segments, chemin vectorisé seulement
+        self.robuste = robuste
+        # Durée, lignes en entrée/sortie et mémoire de chaque étape (--stage-report)
+        self.etapes = argus_metrics.SuiviEtapes()
 
     def charger_donnees(self):
         if not os.path.exists(self.data_path):
@@ -50,32 +56,39 @@ class ArgusEngine:
             
         logger.info("Chargement Dataset V16...")
         dtype_dict = {'Titre': str, 'Marque': str, 'Modèle': str, 'Énergie': str, 'Boîte': str, 'Finition': str}
-        self.df = pd.read_csv(self.data_path, sep=';', dtype=dtype_dict)
-        
-        for col in ['Année', 'Kilométrage', 'Puissance', 'Prix']:
-            self.df[col] = pd.to_numeric(self.df[col], errors='coerce').fillna(0).astype(int)
-        for col in ['Marque', 'Modèle', 'Énergie', 'Boîte', 'Finition']:
-            self.df[col] = self.df[col].astype(str).str.upper().str.strip()
+        with self.etapes.etape('chargement') as m:
+            self.df = pd.read_csv(self.data_path, sep=';', dtype=dtype_dict)
+            m['lignes_sortie'] = len(self.df)
+
+        with self.etapes.etape('normalisation', len(self.df)) as m:
+            for col in ['Année', 'Kilométrage', 'Puissance', 'Prix']:
+                self.df[col] = pd.to_numeric(self.df[col], errors='coerce').fillna(0).astype(int)
+            for col in ['Marque', 'Modèle', 'Énergie', 'Boîte', 'Finition']:
+                self.df[col] = self.df[col].astype(str).str.upper().str.strip()
+            m['lignes_sortie'] = len(self.df)
 
         logger.info(f"Chargé : {len(self.df)} lignes brutes.")
 
     def _impute_missing_powers(self):
         logger.info("⚡ Fusion intelligente des données (Imputation)...")
-        df_clean = self.df.copy()
-        group_cols = ['Marque', 'Modèle', 'Année', 'Énergie']
-        
-        df_clean['Puissance_Ref'] = df_clean['Puissance'].replace(0, np.nan)
-        def get_mode(x):
-            m = x.mode()
-            return m.iloc[0] if not m.empty else 0
-            
-        modes = df_clean.groupby(group_cols)['Puissance_Ref'].agg(get_mode)
-        df_merged = df_clean.join(modes, on=group_cols, rsuffix='_Mode')
-        
-        mask_impute = (df_merged['Puissance'] == 0) & (df_merged['Puissance_Ref_Mode'] > 0)
-        df_merged.loc[mask_impute, 'Puissance'] = df_merged.loc[mask_impute, 'Puissance_Ref_Mode'].astype(int)
-        
-        self.df = df_merged.drop(columns=['Puissance_Ref', 'Puissance_Ref_Mode'])
+        with self.etapes.etape('imputation', len(self.df)) as etape:
+            df_clean = self.df.copy()
+            group_cols = IMPUTATION_COLS
+
+            df_clean['Puissance_Ref'] = df_clean['Puissance'].replace(0, np.nan)
+            def get_mode(x):
+                m = x.mode()
+                return m.iloc[0] if not m.empty else 0
+
+            modes = df_clean.groupby(group_cols)['Puissance_Ref'].agg(get_mode)
+            df_merged = df_clean.join(modes, on=group_cols, rsuffix='_Mode')
+
+            mask_impute = (df_merged['Puissance'] == 0) & (df_merged['Puissance_Ref_Mode'] > 0)
+            df_merged.loc[mask_impute, 'Puissance'] = df_merged.loc[mask_impute, 'Puissance_Ref_Mode'].astype(int)
+
+            self.df = df_merged.drop(columns=['Puissance_Ref', 'Puissance_Ref_Mode'])
+            etape['lignes_sortie'] = len(self.df)
+            etape['puissances_imputees'] = int(mask_impute.sum())
         logger.info(f"✨ Fusion terminée (Cleaned).")
 
     def _remove_outliers(self, df):
@@ -90,12 +103,13 @@ class ArgusEngine:
         Calcul de décote STABILISÉ (V21) :
         Empêche les aberrations sur les vieux véhicules ou les faibles volumes.
         """
-        current_year = 2025 # Ou datetime.now().year
+        current_year = CURRENT_YEAR # Ou datetime.now().year
         age = current_year - annee_ref
         
         # 1. Calcul Régression Mathématique
         raw_coef = -0.05 # Default fallback
         if len(df) >= 5:
+            from sklearn.linear_model import LinearRegression  # import différé (~1 s), chemin boucle seulement
             try:
                 reg = LinearRegression().fit(df[['Kilométrage']], df['Prix'])
                 raw_coef = reg.coef_[0]
@@ -135,12 +149,38 @@ class ArgusEngine:
             
         return round(final_coef, 5)
 
-    def construire_referentiel(self):
+    def construire_referentiel(self, mode: str = "vectorise", workers: int = 1, shard_by: str = "marque"):
+        if mode not in BUILD_MODES:
+            raise ValueError(f"Mode de construction inconnu : {mode} (attendu : {BUILD_MODES})")
+        if shard_by not in SHARD_STRATEGIES:
+            raise ValueError(f"Stratégie de shard inconnue : {shard_by} (attendu : {SHARD_STRATEGIES})")
+        if self.robuste is not None and mode == "boucle":
+            raise ValueError("Le mode robuste n'existe que pour le chemin vectorisé")
         if self.df is None: self.charger_donnees()
+
+        if workers > 1:
+            logger.info(f"Calcul des cotes parallèle ({workers} workers, shards par {shard_by}, mode {mode})...")
+            # Imputation, filtre et ajustement ont lieu dans les workers : une seule étape mesurée ici
+            with self.etapes.etape('calcul_parallele', len(self.df)) as m:
+                self.referentiel = construire_referentiel_parallele(self.df, workers, mode, shard_by, self.robuste)
+                m['lignes_sortie'] = len(self.referentiel)
+            logger.info(f"Référentiel V21 : {len(self.referentiel)} cotes uniques.")
+            return
+
         self._impute_missing_powers()
         
-        logger.info("Calcul des cotes (Stabilized V21)...")
-        groups = self.df.groupby(['Marque', 'Modèle', 'Année', 'Puissance', 'Énergie', 'Boîte', 'Finition'])
+        logger.info(f"Calcul des cotes (Stabilized V21, mode {mode})...")
+        if mode == "boucle":
+            with self.etapes.etape('filtre_et_ajustement_boucle', len(self.df)) as m:
+                self.referentiel = self._calculer_cotes_boucle()
+                m['lignes_sortie'] = len(self.referentiel)
+        else:
+            self.referentiel = self._calculer_cotes_vectorise()
+        logger.info(f"Référentiel V21 : {len(self.referentiel)} cotes uniques.")
+
+    def _calculer_cotes_boucle(self):
+        """Chemin historique : une itération Python + une régression sklearn par segment."""
+        groups = self.df.groupby(SEGMENT_COLS)
         
         rows = []
         total = len(groups)
@@ -159,6 +199,7 @@ class ArgusEngine:
             
             # Appel de la nouvelle fonction stabilisée
             coef_decote = self._calculate_depreciation_stabilized(clean, annee, prix_median)
+            ecart_prix, erreur_decote = self._incertitude_segment(clean, coef_decote)
             
             rows.append({
                 'Marque': name[0], 'Modèle': name[1], 'Année': annee,
@@ -167,23 +208,301 @@ class ArgusEngine:
                 'Km_Reference': int(clean['Kilométrage'].mean()),
                 'Decote_par_Km': coef_decote,
                 'Volume_Annonces': count,
-                'Qualite_Cote': "A" if count > 30 else "B" if count > 10 else "C"
+                'Qualite_Cote': "A" if count > 30 else "B" if count > 10 else "C",
+                'Ecart_Type_Prix': ecart_prix,
+                'Erreur_Type_Decote': erreur_decote
             })
             
         print("\n")
-        self.referentiel = pd.DataFrame(rows)
-        logger.info(f"Référentiel V21 : {len(self.referentiel)} cotes uniques.")
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def _incertitude_segment(clean, coef_decote):
+        """(écart-type des prix autour de la décote retenue, erreur-type de la pente) d'un segment."""
+        fit = argus_regression.moindres_carres(np.zeros(len(clean), dtype=np.int64),
+                                               clean['Kilométrage'].to_numpy(dtype=np.float64),
+                                               clean['Prix'].to_numpy(dtype=np.float64), 1)
+        ecart, erreur = argus_regression.incertitude(fit['n'], fit['sxx'], fit['sxy'], fit['syy'], coef_decote)
+        return round(float(ecart[0]), 2), round(float(erreur[0]), 6)
 
-    def sauvegarder_referentiel(self):
+    def _calculer_cotes_vectorise(self):
+        """
+        Chemin vectorisé : mêmes règles que _calculer_cotes_boucle, mais en une passe
+        groupby (quartiles/IQR, médiane) et un ajustement par lot de toutes les pentes
+        (argus_regression : moindres carrés en forme fermée, ou robuste si self.robuste).
+        """
+        with self.etapes.etape('filtre_iqr', len(self.df)) as m:
+            keys, codes, km, prix = self._points_filtres()
+            m['lignes_sortie'] = len(codes)
+        with self.etapes.etape('ajustement', len(codes)) as m:
+            ref = self._ajuster_segments(keys, codes, km, prix)
+            m['lignes_sortie'] = len(ref)
+        return ref
+
+    def _ajuster_segments(self, keys, codes, km, prix):
+        """Étapes 2 à 4 du chemin vectorisé : médiane, pente et incertitude des segments filtrés."""
+        # 2. Médiane par segment après filtrage
+        n_groups = len(keys)
+        prix_median = pd.Series(prix).groupby(codes).median().reindex(range(n_groups)).to_numpy()
+
+        # 3. Pente km -> prix de tous les segments en un lot (équivalent fermé de LinearRegression)
+        fit = argus_regression.ajuster(codes, km, prix, n_groups, robuste=self.robuste)
+        count = fit['n']
+        raw_coef = np.where(count >= 5, fit['pente'], -0.05)
+
+        keep = count >= MIN_SAMPLES_FOR_VALIDITY
+        ref = keys.index.to_frame(index=False)[keep].reset_index(drop=True)
+        count = count[keep]
+        ref['Cote_Reference'] = prix_median[keep].astype(np.int64)
+        ref['Km_Reference'] = fit['x_moyen'][keep].astype(np.int64)
+        ref['Decote_par_Km'] = self._clamp_depreciation_vectorise(raw_coef[keep], ref['Année'].to_numpy())
+        ref['Volume_Annonces'] = count.astype(np.int64)
+        ref['Qualite_Cote'] = np.select([count > 30, count > 10], ["A", "B"], "C")
+
+        # 4. Incertitude autour de la décote retenue (intervalle de prix de /predict)
+        ecart, erreur = argus_regression.incertitude(count, fit['sxx'][keep], fit['sxy'][keep], fit['syy'][keep],
+                                                     ref['Decote_par_Km'].to_numpy())
+        ref['Ecart_Type_Prix'] = np.round(ecart, 2)
+        ref['Erreur_Type_Decote'] = np.round(erreur, 6)
+        return ref
+
+    def _points_filtres(self):
+        """
+        Étape 1 du chemin vectorisé : (clés des segments, code de segment, km, prix) des annonces
+        conservées par le filtre IQR (les segments < 5 annonces sont conservés tels quels).
+        """
+        keys, codes, valid, inlier = self._filtre_iqr()
+        prix = self.df['Prix'].to_numpy()[valid]
+        km = self.df['Kilométrage'].to_numpy()[valid]
+        return keys, codes[inlier], km[inlier], prix[inlier]
+
+    def annonces_filtrees(self):
+        """Annonces (lignes de self.df) conservées par le filtre IQR : données des comparables."""
+        _, _, valid, inlier = self._filtre_iqr()
+        return self.df.iloc[np.flatnonzero(valid)[inlier]]
+
+    def _filtre_iqr(self):
+        """(clés des segments, codes des annonces à clé valide, masque de ces annonces, masque IQR)."""
+        df = self.df[SEGMENT_COLS + ['Kilométrage', 'Prix']]
+        groups = df.groupby(SEGMENT_COLS, sort=True)
+        codes = groups.ngroup()
+        keys = groups.size()
+
+        # Les clés NaN sont ignorées par groupby (ngroup NaN ou -1), comme dans la boucle
+        valid = (codes.notna() & (codes >= 0)).to_numpy()
+        codes = codes.to_numpy()[valid].astype(np.int64)
+        prix = df['Prix'].to_numpy()[valid]
+
+        taille = keys.to_numpy()
+        q1 = groups['Prix'].quantile(0.25).to_numpy()
+        q3 = groups['Prix'].quantile(0.75).to_numpy()
+        iqr = q3 - q1
+        borne_basse = (q1 - IQR_THRESHOLD * iqr)[codes]
+        borne_haute = (q3 + IQR_THRESHOLD * iqr)[codes]
+        inlier = (taille[codes] < 5) | ((prix >= borne_basse) & (prix <= borne_haute))
+        return keys, codes, valid, inlier
+
+    @staticmethod
+    def _clamp_depreciation_vectorise(raw_coef, annees):
+        """Version tableau des bornes de _calculate_depreciation_stabilized."""
+        return borner_decote_vectorise(raw_coef, annees)
+
+    def verifier_parite(self):
+        """
+        Construit le référentiel avec les deux chemins et compare leur export CSV octet par octet.
+        Retourne (identique, nb_lignes_boucle, nb_lignes_vectorise).
+        """
+        if self.df is None: self.charger_donnees()
+        self._impute_missing_powers()
+        ref_boucle = self._calculer_cotes_boucle()
+        ref_vect = self._calculer_cotes_vectorise()
+        csv_boucle = ref_boucle.to_csv(sep=';', index=False)
+        csv_vect = ref_vect.to_csv(sep=';', index=False)
+        return csv_boucle == csv_vect, len(ref_boucle), len(ref_vect)
+
+    def sauvegarder_referentiel(self, path=OUTPUT_DB):
+        if self.referentiel is not None:
+            with self.etapes.etape('sauvegarde_csv', len(self.referentiel)) as m:
+                self.referentiel.to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+                m['lignes_sortie'] = len(self.referentiel)
+            logger.info(f"Base sauvegardée : {path}")
+
+    def sauvegarder_referentiel_colonnes(self, path=argus_store.OUTPUT_COLUMNAR):
+        """Export colonnaire memory-mappable (le CSV reste le format d'échange)."""
+        if self.referentiel is not None:
+            with self.etapes.etape('sauvegarde_colonnes', len(self.referentiel)) as m:
+                argus_store.ecrire_dataframe(self.referentiel, path, meta={'source': OUTPUT_DB})
+                m['lignes_sortie'] = len(self.referentiel)
+            logger.info(f"Base colonnaire sauvegardée : {path}")
+
+    def sauvegarder_backoff(self, path=argus_backoff.OUTPUT_BACKOFF):
+        """Tables de repli hiérarchique (niveaux plus grossiers + cote officielle)."""
         if self.referentiel is not None:
-            self.referentiel.to_csv(OUTPUT_DB, sep=';', index=False, encoding='utf-8-sig')
-            logger.info(f"Base sauvegardée : {OUTPUT_DB}")
+            with self.etapes.etape('sauvegarde_repli', len(self.referentiel)) as m:
+                colonnes = {col: self.referentiel[col].to_numpy() for col in self.referentiel.columns}
+                officielle = argus_backoff.trouver_cote_officielle()
+                tables = argus_backoff.construire_tables(colonnes, officielle)
+                argus_backoff.sauvegarder_tables(tables, path, meta={'source': OUTPUT_DB, 'officielle': officielle})
+                m['lignes_sortie'] = sum(len(t['Cote_Reference']) for t in tables.values())
+            tailles = ', '.join(f"{nom}={len(t['Cote_Reference'])}" for nom, t in tables.items())
+            logger.info(f"Tables de repli sauvegardées : {path} ({tailles})")
+
+    def sauvegarder_snapshot(self, path=None):
+        """Instantané binaire prêt à servir (index + repli + facettes) à partir des fichiers écrits."""
+        if self.referentiel is not None:
+            import argus_snapshot
+            with self.etapes.etape('sauvegarde_instantane', len(self.referentiel)) as m:
+                referentiel, backoff, officielle = argus_snapshot.sources_referentiel(
+                    argus_store.OUTPUT_COLUMNAR, argus_backoff.OUTPUT_BACKOFF)
+                bundle = argus_snapshot.BundleReferentiel.construire(referentiel, backoff, officielle)
+                path = path or argus_snapshot.OUTPUT_SNAPSHOT
+                argus_snapshot.ecrire_snapshot(bundle, path)
+                m['lignes_sortie'] = len(bundle.index)
+            logger.info(f"Instantané sauvegardé : {path} (version {bundle.version})")
+
+    def sauvegarder_courbes(self, path=None):
+        """Courbes prix / km compactes de chaque segment (pentes, km de rupture, plancher)."""
+        if self.referentiel is not None:
+            import argus_courbes
+            from argus_index import SegmentIndex
+            path = path or argus_courbes.OUTPUT_COURBES
+            with self.etapes.etape('sauvegarde_courbes', len(self.referentiel)) as m:
+                index = SegmentIndex.depuis_fichier(argus_store.OUTPUT_COLUMNAR)
+                m['lignes_sortie'] = argus_courbes.ecrire_courbes(index, path, meta={'source': OUTPUT_DB})
+            logger.info(f"Courbes prix / km sauvegardées : {path} ({m['lignes_sortie']} segments)")
+
+    def sauvegarder_comparables(self, path=None):
+        """Index des annonces comparables (annonces nettoyées, memory-mappable) servi par /comparables."""
+        if self.df is not None:
+            import argus_comparables
+            path = path or argus_comparables.OUTPUT_COMPARABLES
+            with self.etapes.etape('sauvegarde_comparables', len(self.df)) as m:
+                m['lignes_sortie'] = argus_comparables.ecrire_index(self.annonces_filtrees(), path,
+                                                                     meta={'source': os.path.basename(self.data_path)})
+            logger.info(f"Index des comparables sauvegardé : {path} ({m['lignes_sortie']} annonces)")
+
+    def sauvegarder_metadata(self, path=OUTPUT_METADATA):
+        """
+        Version du référentiel écrit (empreinte du contenu des fichiers servis, celle que le service
+        affiche et qui clé son cache) et métadonnées de build, lues par /health après rechargement.
+        Marqueur de publication : écrit en dernier, le service ne bascule que vers cette version.
+        """
+        if self.referentiel is not None:
+            import argus_snapshot
+            sources = argus_snapshot.sources_referentiel(argus_store.OUTPUT_COLUMNAR, argus_backoff.OUTPUT_BACKOFF)
+            version = argus_snapshot.empreinte_sources(*sources)
+            metadata = argus_snapshot.metadata_build(
+                version, (*sources, OUTPUT_DB, argus_snapshot.OUTPUT_SNAPSHOT),
+                entree=os.path.basename(self.data_path), segments=len(self.referentiel),
+                duree_build_s=self.etapes.total_s())
+            argus_snapshot.ecrire_metadata(metadata, path)
+            logger.info(f"Métadonnées sauvegardées : {path} (version {version})")
+
+    def sauvegarder_rapport_etapes(self, path):
+        """Mesures des étapes du build (JSON) : durée, lignes en entrée/sortie, mémoire."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.etapes.rapport(), f, indent=2, ensure_ascii=False)
+        logger.info(f"Rapport des étapes : {path} ({self.etapes.total_s()}s au total)")
+
+# --- CONSTRUCTION PARALLÈLE (SHARDS) ---
+# Chaque shard contient des groupes d'imputation (Marque, Modèle, Année, Énergie) complets :
+# imputation, filtre IQR et régression restent donc strictement locaux au shard.
+
+def _partitionner(df, n_shards, shard_by):
+    """Retourne la liste des index de lignes de chaque shard (déterministe)."""
+    if shard_by == "hash":
+        shard_ids = pd.util.hash_pandas_object(df[IMPUTATION_COLS], index=False).to_numpy() % n_shards
+        return [np.flatnonzero(shard_ids == i) for i in range(n_shards)]
+
+    # Par marque : répartition gloutonne (la plus grosse marque vers le shard le moins chargé)
+    tailles = df.groupby('Marque').size().sort_values(ascending=False, kind='mergesort')
+    charges = [(0, i) for i in range(n_shards)]
+    marque_vers_shard = {}
+    for marque, taille in tailles.items():
+        charge, i = heapq.heappop(charges)
+        marque_vers_shard[marque] = i
+        heapq.heappush(charges, (charge + int(taille), i))
+    shard_ids = df['Marque'].map(marque_vers_shard).fillna(-1).to_numpy()
+    return [np.flatnonzero(shard_ids == i) for i in range(n_shards)]
+
+def _init_worker():
+    logger.setLevel(logging.WARNING)
+
+def _construire_shard(df_shard, mode, robuste=None):
+    engine = ArgusEngine(data_path=None, robuste=robuste)
+    engine.df = df_shard
+    engine._impute_missing_powers()
+    if mode == "boucle":
+        return engine._calculer_cotes_boucle()
+    return engine._calculer_cotes_vectorise()
+
+def _fusionner_shards(resultats):
+    """Fusion stable : même ordre que le groupby trié du chemin mono-processus."""
+    non_vides = [r for r in resultats if len(r)]
+    if not non_vides:
+        return resultats[0] if resultats else pd.DataFrame()
+    ref = pd.concat(non_vides, ignore_index=True)
+    return ref.sort_values(SEGMENT_COLS, kind='mergesort').reset_index(drop=True)
+
+def construire_referentiel_parallele(df, workers, mode="vectorise", shard_by="marque", robuste=None):
+    shards = [df.iloc[idx] for idx in _partitionner(df, workers * SHARDS_PAR_WORKER, shard_by) if len(idx)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        resultats = list(pool.map(_construire_shard, shards, [mode] * len(shards), [robuste] * len(shards)))
+    return _fusionner_shards(resultats)
+
+def rapport_scalabilite(df, worker_counts, mode="vectorise", shard_by="marque", robuste=None):
+    """
+    Mesure le débit (lignes/s) de la construction pour chaque nombre de workers,
+    et vérifie que la sortie reste identique à celle du calcul mono-processus.
+    Le chargement du CSV n'est pas inclus dans la mesure.
+    """
+    rapport = []
+    csv_reference = None
+    for workers in worker_counts:
+        engine = ArgusEngine(data_path=None, robuste=robuste)
+        engine.df = df
+        start = time.perf_counter()
+        engine.construire_referentiel(mode=mode, workers=workers, shard_by=shard_by)
+        duree = time.perf_counter() - start
+        csv_out = engine.referentiel.to_csv(sep=';', index=False)
+        if csv_reference is None: csv_reference = csv_out
+        rapport.append({
+            'workers': workers,
+            'secondes': round(duree, 3),
+            'lignes_par_s': int(len(df) / duree) if duree > 0 else 0,
+            'identique': csv_out == csv_reference
+        })
+        logger.info(f"   -> {workers} worker(s) : {duree:.2f}s, {rapport[-1]['lignes_par_s']} lignes/s")
+    return rapport
 
 class InteractiveArgus:
     def __init__(self, db_path):
         if not os.path.exists(db_path): sys.exit(1)
-        self.df = pd.read_csv(db_path, sep=';')
-        self.df[['Année', 'Puissance']] = self.df[['Année', 'Puissance']].astype(int)
+        self.db_path = db_path
+        self._charger()
+
+    def _charger(self):
+        signature = os.stat(self.db_path).st_mtime_ns
+        if self.db_path.endswith(argus_store.COLUMNAR_EXT):
+            df = argus_store.charger_colonnes(self.db_path).to_dataframe()
+        else:
+            df = pd.read_csv(self.db_path, sep=';')
+        df[['Année', 'Puissance']] = df[['Année', 'Puissance']].astype(int)
+        # Cascade et recherche de marque servies par index (construit une fois) plutôt que par masques
+        self.df, self.facettes = df, FacetIndex({c: df[c].to_numpy() for c in CASCADE})
+        self._signature = signature
+
+    def recharger_si_modifie(self):
+        """Référentiel republié pendant la session : relu avant la recherche suivante (l'ancien reste si illisible)."""
+        try:
+            if os.stat(self.db_path).st_mtime_ns == self._signature:
+                return False
+            self._charger()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Référentiel {self.db_path} illisible ({e}), version précédente conservée")
+            return False
+        logger.info(f"Référentiel rechargé : {self.db_path} ({len(self.df)} segments)")
+        return True
 
     def _select(self, options, label):
         opts = sorted(list(set(options)))
@@ -204,65 +523,39 @@ class InteractiveArgus:
             except: pass
 
     def calculer_prix_final(self, ref_prix, ref_km, reel_km, coef):
-        delta = reel_km - ref_km
-        adj = 0
-        
-        if delta > 0: # Trop de bornes
-            adj += min(delta, 50000) * coef
-            if delta > 50000: adj += min(delta-50000, 50000) * (coef * 0.5)
-            if delta > 100000: adj += (delta-100000) * (coef * 0.1)
-        else: # Pas assez de bornes
-            adj = delta * coef 
-            if adj > ref_prix * 0.4: adj = ref_prix * 0.4
-            
-        final = ref_prix + adj
-        plancher = max(MIN_PRICE_FLOOR, ref_prix * MIN_RESIDUAL_VALUE)
-        
-        is_floored = False
-        if final < plancher:
-            final = plancher
-            is_floored = True
-            
-        return int(final), int(adj), is_floored
+        return calculer_prix_final(ref_prix, ref_km, reel_km, coef)
 
     def run(self):
+        self.recharger_si_modifie()
         print("\n🚗 ARGUS V21 (Stabilized) 🚗")
         
         while True:
             s = input("\nMarque (3 lettres) : ").upper()
             if not s: continue
-            m = sorted(self.df[self.df['Marque'].str.contains(s, na=False)]['Marque'].unique())
+            m = self.facettes.rechercher('Marque', s)
             if m: 
                 marque = self._select(m, "MARQUE")
                 if marque: break
         
-        mask = (self.df['Marque'] == marque)
-        modele = self._select(self.df[mask]['Modèle'].unique(), "MODÈLE")
-        mask &= (self.df['Modèle'] == modele)
-        
-        annee = self._select(self.df[mask]['Année'].unique(), "ANNÉE")
-        mask &= (self.df['Année'] == annee)
-        
-        energie = self._select(self.df[mask]['Énergie'].unique(), "ÉNERGIE")
-        mask &= (self.df['Énergie'] == energie)
-        
-        boite = self._select(self.df[mask]['Boîte'].unique(), "BOÎTE")
-        mask &= (self.df['Boîte'] == boite)
+        modele = self._select(self.facettes.options((marque,)), "MODÈLE")
+        annee = self._select(self.facettes.options((marque, modele)), "ANNÉE")
+        energie = self._select(self.facettes.options((marque, modele, annee)), "ÉNERGIE")
+        boite = self._select(self.facettes.options((marque, modele, annee, energie)), "BOÎTE")
         
-        p_vals = self.df[mask]['Puissance'].unique()
+        p_vals = self.facettes.options((marque, modele, annee, energie, boite))
         p_lbls = [f"{p} ch" if p > 0 else "Standard" for p in p_vals]
         p_map = dict(zip(p_lbls, p_vals))
         p_choice = self._select(list(p_map.keys()), "PUISSANCE")
-        mask &= (self.df['Puissance'] == p_map[p_choice])
         
-        finition = self._select(self.df[mask]['Finition'].unique(), "FINITION")
-        mask &= (self.df['Finition'] == finition)
+        cle = (marque, modele, annee, energie, boite, p_map[p_choice])
+        finition = self._select(self.facettes.options(cle), "FINITION")
         
-        if mask.sum() == 0: 
+        i = self.facettes.ligne(cle + (finition,))
+        if i is None: 
             print("❌ Segment vide.")
             return
 
-        row = self.df[mask].iloc[0]
+        row = self.df.iloc[i]
         
         print(f"\n✅ {marque} {modele} {finition} ({annee}) - {p_choice}")
         
@@ -279,10 +572,56 @@ class InteractiveArgus:
         print(f"📉 Décote : {row['Decote_par_Km']:.4f} €/km (Stabilisée)")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construction et consultation du référentiel Argus V21")
+    parser.add_argument("--mode", choices=BUILD_MODES, default="vectorise",
+                        help="Chemin de calcul des cotes (défaut : vectorise)")
+    parser.add_argument("--check-parity", action="store_true",
+                        help="Compare les chemins boucle et vectorisé sur le dataset puis quitte")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus pour la construction (défaut : 1)")
+    parser.add_argument("--shard-by", choices=SHARD_STRATEGIES, default="marque",
+                        help="Découpage des shards en mode parallèle (défaut : marque)")
+    parser.add_argument("--scaling-report", type=int, nargs='*', metavar="N",
+                        help="Mesure le débit pour chaque nombre de workers (défaut : 1 2 4 ... nb CPU) puis quitte")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lecture par morceaux et agrégation en statistiques suffisantes (faible empreinte mémoire)")
+    parser.add_argument("--robuste", choices=argus_regression.ROBUST_MODES,
+                        help=f"Pente robuste pour les segments de <= {argus_regression.ROBUSTE_MAX_N} annonces (chemin vectorisé)")
+    parser.add_argument("--stage-report", metavar="JSON",
+                        help="Écrit la durée, les lignes en entrée/sortie et la mémoire de chaque étape du build")
+    args = parser.parse_args()
+    if args.robuste and (args.mode == "boucle" or args.streaming or args.check_parity):
+        parser.error("--robuste ne s'applique qu'au chemin vectorisé en mémoire")
+
+    if args.scaling_report is not None:
+        counts = args.scaling_report or [2 ** i for i in range((os.cpu_count() or 1).bit_length())]
+        engine = ArgusEngine(INPUT_FILE, robuste=args.robuste)
+        engine.charger_donnees()
+        rapport = rapport_scalabilite(engine.df, counts, mode=args.mode, shard_by=args.shard_by, robuste=args.robuste)
+        print(json.dumps(rapport, indent=2))
+        sys.exit(0 if all(r['identique'] for r in rapport) else 1)
+
+    if args.check_parity:
+        identique, n_boucle, n_vect = ArgusEngine(INPUT_FILE).verifier_parite()
+        logger.info(f"Parité boucle/vectorisé : {'OK' if identique else 'ÉCART'} ({n_boucle} vs {n_vect} cotes)")
+        sys.exit(0 if identique else 1)
+
     if not os.path.exists(OUTPUT_DB):
-        engine = ArgusEngine(INPUT_FILE)
-        engine.construire_referentiel()
+        engine = ArgusEngine(INPUT_FILE, robuste=args.robuste)
+        if args.streaming:
+            from argus_streaming import construire_referentiel_streaming  # import différé (dépend de ce module)
+            engine.referentiel, _ = construire_referentiel_streaming(INPUT_FILE, etapes=engine.etapes)
+        else:
+            engine.construire_referentiel(mode=args.mode, workers=args.workers, shard_by=args.shard_by)
         engine.sauvegarder_referentiel()
+        engine.sauvegarder_referentiel_colonnes()
+        engine.sauvegarder_backoff()
+        engine.sauvegarder_snapshot()
+        engine.sauvegarder_courbes()
+        engine.sauvegarder_comparables()  # Chemin en mémoire seulement (le flux ne garde pas les annonces)
+        engine.sauvegarder_metadata()
+        if args.stage_report:
+            engine.sauvegarder_rapport_etapes(args.stage_report)
     
     app = InteractiveArgus(OUTPUT_DB)
     while True:
@@ -1,140 +1,688 @@
 # Fichier: api_ia.py
 # Tech Lead Refactoring: API Flask Robuste avec validation stricte et Logging
 
+import os
+import sys
+import json
+import math
+import time
+import random
 import logging
-from flask import Flask, request, jsonify
+import argparse
+import subprocess
+from collections import Counter
+import numpy as np
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-import re
-import random  # Utilisé pour le mock en attendant le chargement du modèle réel
+
+from argus_index import SegmentInvalide, NIVEAU_INTERVALLE, ALIAS_CHAMPS, normaliser_cle, lire_km, evaluer_courbes
+from argus_facettes import CASCADE as FACETTES_CASCADE, RECHERCHE_COLS, lire_selection
+import argus_cache
+import argus_snapshot
+import argus_metrics
+import argus_comparables
+import argus_courbes
+import argus_risque
+from argus_profiler import ProfileurRequetesLentes
 
 # --- CONFIGURATION DU LOGGING (Indispensable pour le debug) ---
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("ARGUS_LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - [%(levelname)s] - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# Part des requêtes réussies journalisées en INFO (1 = toutes, 0 = aucune) ; erreurs toujours journalisées
+LOG_SAMPLE = float(os.environ.get("ARGUS_LOG_SAMPLE", 0.01))
+
+
+def log_echantillon(msg, *args):
+    """Log INFO par requête, échantillonné et formaté seulement s'il est émis (style %)."""
+    if LOG_SAMPLE > 0 and (LOG_SAMPLE >= 1 or random.random() < LOG_SAMPLE):
+        logger.info(msg, *args)
 
 app = Flask(__name__)
 # Autoriser les requêtes Cross-Origin (Node -> Python)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# --- SIMULATION ML (MOCK ENGINE) ---
-# En production, vous feriez ici : model = joblib.load('model.pkl')
-def mock_predict_price(data):
+# --- RÉFÉRENTIEL V21 ---
+# Priorité : variable d'environnement, puis export colonnaire local, puis CSV du backend
+# (voir argus_snapshot). Au démarrage, l'instantané binaire est préféré s'il est à jour.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENTIEL_CANDIDATS = argus_snapshot.REFERENTIEL_CANDIDATS
+BACKOFF_CANDIDATS = argus_snapshot.BACKOFF_CANDIDATS
+trouver_referentiel = argus_snapshot.trouver_referentiel
+trouver_backoff = argus_snapshot.trouver_backoff
+# Champs dont l'absence déclenche un repli vers un niveau plus grossier plutôt qu'une erreur
+CHAMPS_OPTIONNELS = ('Puissance', 'Boîte', 'Finition')
+MODEL_VERSION = "v21-referentiel"
+# Ancien contrat de /predict (scan d'annonce du backend Node : description, extractedPrice,
+# extractedYear, siren, autoviza) : sans Marque ni Modèle, réponse dégradée plutôt qu'un 422
+MODEL_VERSION_ANNONCE = "v1.1-heuristique-annonce"
+PRIX_BASE_ANNONCE = 10000
+PLANCHER_ANNONCE = 500
+MAX_BATCH_SIZE = 10000
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+
+# Index, repli et facettes (cascade Marque -> ... -> Finition) : chargés au démarrage (avant le
+# fork des workers gunicorn), puis remplacés à chaud quand les fichiers servis changent
+# (ARGUS_REFERENTIEL_RELOAD_S, voir argus_snapshot.ReferentielServi). Chaque requête lit
+# REFERENTIEL.actuel() une fois et utilise ce bundle jusqu'au bout.
+REFERENTIEL = argus_snapshot.ReferentielServi.depuis_env()
+DEMARRAGE = REFERENTIEL.demarrage
+if REFERENTIEL.bundle is not None:
+    logger.info("🪜 Repli hiérarchique : %s", [nom for nom, _, _ in REFERENTIEL.bundle.backoff.niveaux])
+# Cache des réponses /predict (ARGUS_CACHE_MAX_ENTRIES=0 pour le désactiver)
+CACHE = argus_cache.CachePrediction.depuis_env()
+
+
+def charger_comparables():
+    """Index des annonces comparables (memory-mappé), ou None : /comparables répond alors 503."""
+    path = argus_comparables.trouver_comparables()
+    if path is None:
+        logger.info("Index des comparables absent : /comparables indisponible")
+        return None
+    try:
+        index = argus_comparables.IndexComparables(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Index des comparables %s illisible (%s) : /comparables indisponible", path, e)
+        return None
+    logger.info("🔎 Comparables : %d annonces, %d modèles (%s)", len(index), len(index.plages_modele), index.source)
+    return index
+
+
+COMPARABLES = charger_comparables()
+
+# Score de risque des descriptions (/risk) : règles de backend/patterns.json + argus_risque_regles.json,
+# rechargées à chaud quand les fichiers changent (ARGUS_RISQUE_RELOAD_S)
+RISQUE = argus_risque.MoteurRisque.depuis_env()
+
+# --- OBSERVABILITÉ ---
+# /metrics (format Prometheus) : latences par route, résolutions par niveau de repli, cache.
+# Métriques propres au processus (un jeu par worker gunicorn). Profileur des requêtes lentes
+# optionnel : ARGUS_PROFILE_SLOW_MS (voir argus_profiler).
+METRIQUES = argus_metrics.Registre()
+LATENCES = METRIQUES.histogramme("argus_http_request_duration_seconds", "Durée de traitement des requêtes HTTP",
+                                 ("endpoint",))
+REQUETES = METRIQUES.compteur("argus_http_requests_total", "Requêtes HTTP par route et code de statut",
+                              ("endpoint", "status"))
+RESOLUTIONS = METRIQUES.compteur("argus_lookups_total",
+                                 "Annonces résolues par niveau de repli (introuvable, invalide) hors hits du cache",
+                                 ("endpoint", "niveau"))
+PROFILEUR = ProfileurRequetesLentes.depuis_env()
+DEMARRAGE_PROCESSUS = time.time()
+
+
+@METRIQUES.collecteur
+def _metriques_service():
+    series = [
+        ("argus_process_info", "gauge", "Processus servant la requête /metrics", [({"pid": os.getpid()}, 1)]),
+        ("argus_process_start_time_seconds", "gauge", "Démarrage du processus (epoch)", [({}, DEMARRAGE_PROCESSUS)]),
+    ]
+    bundle = REFERENTIEL.bundle
+    if bundle is not None:
+        series.append(("argus_referentiel_info", "gauge", "Référentiel servi",
+                       [({"version": bundle.version, "source": bundle.source, "chargement": REFERENTIEL.chargement}, 1)]))
+        series.append(("argus_referentiel_segments", "gauge", "Segments du référentiel servi", [({}, len(bundle.index))]))
+    rechargement = REFERENTIEL.stats()
+    series.append(("argus_referentiel_swaps_total", "counter", "Remplacements à chaud du référentiel",
+                   [({}, rechargement['bascules'])]))
+    series.append(("argus_referentiel_reload_errors_total", "counter", "Rechargements du référentiel refusés",
+                   [({}, rechargement['erreurs'])]))
+    if rechargement['derniere_bascule'] is not None:
+        series.append(("argus_referentiel_last_swap_build_seconds", "gauge",
+                       "Construction du dernier référentiel remplacé à chaud",
+                       [({}, rechargement['derniere_bascule']['construction_s'])]))
+    if COMPARABLES is not None:
+        series.append(("argus_comparables_listings", "gauge", "Annonces de l'index des comparables",
+                       [({"source": COMPARABLES.source}, len(COMPARABLES))]))
+    stats = RISQUE.stats()
+    series.append(("argus_risk_rules_info", "gauge", "Jeu de règles de risque servi",
+                   [({"version": stats['version']}, 1)]))
+    series.append(("argus_risk_rules", "gauge", "Règles de risque compilées", [({}, stats['regles'])]))
+    series.append(("argus_risk_rules_reloads_total", "counter", "Rechargements à chaud des règles de risque",
+                   [({}, stats['rechargements'])]))
+    series.append(("argus_risk_rules_errors_total", "counter", "Rechargements refusés (fichier invalide)",
+                   [({}, stats['erreurs'])]))
+    if CACHE is not None:
+        stats = CACHE.stats()
+        for cle in ('hits', 'misses', 'evictions', 'invalidations'):
+            series.append((f"argus_cache_{cle}_total", "counter", f"Cache /predict local : {cle}", [({}, stats[cle])]))
+        for cle in ('entries', 'bytes', 'max_entries', 'max_bytes'):
+            series.append((f"argus_cache_{cle}", "gauge", f"Cache /predict local : {cle}", [({}, stats[cle])]))
+        if 'partage' in stats:
+            labels = {"backend": stats['partage']['backend']}
+            series.append(("argus_cache_shared_hits_total", "counter", "Hits du backend partagé",
+                           [(labels, stats['partage']['hits'])]))
+            series.append(("argus_cache_shared_errors_total", "counter", "Erreurs du backend partagé",
+                           [(labels, stats['partage']['erreurs'])]))
+    return series
+
+
+def _endpoint():
+    # Motif de la route (pas le chemin brut) : cardinalité bornée même sous balayage d'URL
+    return request.url_rule.rule if request.url_rule is not None else "inconnu"
+
+
+@app.before_request
+def _debut_requete():
+    g.debut_requete = time.perf_counter()
+    if PROFILEUR is not None:
+        PROFILEUR.debut()
+
+
+@app.after_request
+def _fin_requete(response):
+    endpoint = _endpoint()
+    LATENCES.observer(time.perf_counter() - g.debut_requete, endpoint)
+    REQUETES.inc(endpoint, response.status_code)
+    return response
+
+
+@app.teardown_request
+def _fin_profil(exc):
+    # teardown plutôt qu'after_request : appelé même si la vue lève, le thread est toujours désinscrit
+    if PROFILEUR is not None and 'debut_requete' in g:
+        PROFILEUR.fin(time.perf_counter() - g.debut_requete, _endpoint())
+
+
+def construire_reponse(details, niveau, bundle):
     """
-    Logique de repli (Fallback) pour simuler une IA
-    en attendant que le modèle Scikit-Learn soit connecté.
+    Corps de réponse commun à /predict et /predict/batch. `interval` : intervalle de prix issu de
+    la dispersion du segment (None si le référentiel chargé n'a pas les colonnes d'incertitude).
     """
-    try:
-        base_price = 10000
-        
-        # 1. Extraction des features
-        description = data.get('description', '').lower()
-        price_input = data.get('extractedPrice')
-        year_input = data.get('extractedYear')
-        
-        # 2. Logique heuristique simple
-        score_modifier = 1.0
-        
-        # Mots clés valorisants
-        if 'excellent état' in description or 'très bon état' in description:
-            score_modifier += 0.1
-        if 'contrôle technique ok' in description or 'ct ok' in description:
-            score_modifier += 0.05
-            
-        # Mots clés dévalorisants
-        if 'à débattre' in description:
-            score_modifier -= 0.05
-        if 'dans l\'état' in description or 'sans ct' in description:
-            score_modifier -= 0.3
-            
-        # Ajustement par année (si dispo)
-        if year_input:
-            age = 2025 - int(year_input)
-            # Dépréciation simple
-            depreciation = max(0, age * 0.05) 
-            score_modifier -= depreciation
-
-        # Si un prix est fourni, l'IA "estime" autour de ce prix pour l'instant
-        # pour éviter des incohérences visuelles majeures dans la démo
-        if price_input and isinstance(price_input, (int, float)):
-            estimated = price_input * (1.0 + random.uniform(-0.15, 0.15)) # Écart étendu pour plus de variation
-        else:
-            estimated = base_price * score_modifier
-
-        return round(max(500, estimated)) # Plancher à 500€
+    bas, haut = details.get('intervalle_bas'), details.get('intervalle_haut')
+    return {
+        "prediction": details['cote_affinee'],
+        "confidence": bundle.backoff.confiance(details['confiance'], niveau),
+        "interval": {"low": bas, "high": haut, "level": NIVEAU_INTERVALLE} if bas is not None else None,
+        "details": details,
+        "meta": {
+            "model_version": MODEL_VERSION,
+            "referentiel_version": bundle.version,
+            "niveau": niveau,
+            "confidence_source": "Qualite_Cote x niveau de repli",
+            "interval_source": "Ecart_Type_Prix + Erreur_Type_Decote"
+        }
+    }
 
-    except Exception as e:
-        logger.error(f"Erreur dans le calcul heuristique: {str(e)}")
+
+def est_annonce_libre(data):
+    """Requête de l'ancien contrat : aucun champ Marque / Modèle (l'année seule ne suffit pas à un segment)."""
+    return all(data.get(alias) is None for col in ('Marque', 'Modèle') for alias in ALIAS_CHAMPS[col])
+
+
+def _nombre(valeur):
+    try:
+        valeur = float(valeur)
+    except (TypeError, ValueError):
         return None
+    return valeur if math.isfinite(valeur) else None
+
+
+def estimer_annonce_libre(data, bundle):
+    """
+    Réponse dégradée à l'ancien contrat : heuristique du moteur V1 (prix annoncé repris tel quel,
+    sinon base modulée par l'état décrit et l'âge), sans l'aléa de la démo. Aucune cote du
+    référentiel : confiance basse, `meta.niveau` = "annonce_libre".
+    """
+    description = str(data.get('description') or '').lower()
+    prix = _nombre(data.get('extractedPrice'))
+    annee = _nombre(data.get('extractedYear'))
+
+    modificateur = 1.0
+    if 'excellent état' in description or 'très bon état' in description:
+        modificateur += 0.1
+    if 'contrôle technique ok' in description or 'ct ok' in description:
+        modificateur += 0.05
+    if 'à débattre' in description:
+        modificateur -= 0.05
+    if "dans l'état" in description or 'sans ct' in description:
+        modificateur -= 0.3
+    if annee is not None:
+        modificateur -= max(0.0, (time.localtime().tm_year - annee) * 0.05)
+    estimation = prix if prix is not None and prix > 0 else PRIX_BASE_ANNONCE * modificateur
+
+    confiance = 0.5 - (0.15 if annee is None else 0) - (0.1 if prix is None else 0)
+    return {
+        "prediction": round(max(PLANCHER_ANNONCE, estimation)),
+        "confidence": round(confiance, 2),
+        "interval": None,
+        "details": None,
+        "meta": {
+            "model_version": MODEL_VERSION_ANNONCE,
+            "referentiel_version": bundle.version,
+            "niveau": "annonce_libre",
+            "confidence_source": "Heuristique annonce (segment absent : Marque, Modèle, Énergie, km attendus)"
+        }
+    }
+
+
+def lire_lot():
+    """Annonces d'un lot : tableau JSON, objet {"listings": [...]} ou flux NDJSON (une annonce par ligne)."""
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for ligne in request.get_data(as_text=True).splitlines():
+            if not ligne.strip():
+                continue
+            try:
+                items.append(json.loads(ligne))
+            except ValueError:
+                items.append(SegmentInvalide("Ligne NDJSON invalide"))
+        return items, True
+    if not request.is_json:
+        return None, False
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('listings')
+    return (data if isinstance(data, list) else None), False
+
+
+def predire_lot(items, bundle):
+    """
+    Résolution des segments puis cotation vectorisée. Chaque annonce renvoie soit une
+    prédiction soit une erreur, dans l'ordre d'entrée.
+    """
+    n = len(items)
+    cles = [None] * n
+    kms = np.full(n, -1, dtype=np.int64)
+    erreurs = [None] * n
+    for i, item in enumerate(items):
+        if isinstance(item, Exception):
+            erreurs[i] = str(item)
+            continue
+        if not isinstance(item, dict):
+            erreurs[i] = "Objet JSON attendu"
+            continue
+        try:
+            cles[i] = normaliser_cle(item, CHAMPS_OPTIONNELS)
+            km = lire_km(item)
+            if km is not None: kms[i] = km
+        except SegmentInvalide as e:
+            erreurs[i] = str(e)
+            cles[i] = None
+
+    niveaux, lignes = bundle.backoff.resoudre_lot(cles)
+    trouves = np.flatnonzero(lignes >= 0)
+    lot = bundle.backoff.estimer_lot(niveaux[trouves], lignes[trouves], kms[trouves])
+    noms_niveaux = lot.pop('niveau').tolist()
+    nb_invalides = sum(1 for e in erreurs if e is not None)
+    comptes = Counter(noms_niveaux)
+    comptes.update({"introuvable": n - len(trouves) - nb_invalides, "invalide": nb_invalides})
+    for niveau, c in comptes.items():
+        if c:
+            RESOLUTIONS.inc("/predict/batch", niveau, n=c)
+    colonnes = {k: v.tolist() for k, v in lot.items()}
+
+    resultats = [None] * n
+    for j, i in enumerate(trouves.tolist()):
+        details = {k: v[j] for k, v in colonnes.items()}
+        resultats[i] = {"index": i, **construire_reponse(details, noms_niveaux[j], bundle)}
+    for i in range(n):
+        if resultats[i] is None:
+            resultats[i] = {"index": i, "error": erreurs[i] or "Segment introuvable dans le référentiel"}
+    return resultats
+
 
 # --- ROUTES API ---
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Route de diagnostic pour vérifier que le serveur est vivant."""
-    return jsonify({"status": "healthy", "service": "Python AI Engine"}), 200
+    """
+    Route de diagnostic pour vérifier que le serveur est vivant. `rechargement` : version
+    précédente, dernière bascule (durée de construction, délai détection -> bascule, durée de
+    l'affectation) et reconstruction en cours.
+    """
+    bundle = REFERENTIEL.actuel()
+    return jsonify({
+        "status": "healthy" if bundle is not None else "degraded",
+        "service": "Python AI Engine",
+        "referentiel": {"source": bundle.source, "segments": len(bundle.index), "version": bundle.version,
+                        "chargement": REFERENTIEL.chargement, "build": REFERENTIEL.metadata} if bundle is not None else None,
+        "rechargement": REFERENTIEL.stats(),
+        "niveaux_repli": [nom for nom, _, _ in bundle.backoff.niveaux] if bundle is not None else [],
+        "comparables": {"source": COMPARABLES.source, "annonces": len(COMPARABLES)} if COMPARABLES is not None else None,
+        "risque": RISQUE.stats(),
+        "cache": CACHE.stats() if CACHE is not None else None
+    }), 200
 
 @app.route('/predict', methods=['POST'])
 def predict():
     """
     Endpoint principal appelé par Node.js.
-    Attend un JSON : { description, extractedPrice, extractedYear, ... }
-    Renvoie : { prediction: int, confidence: float }
+    Attend un JSON : { Marque, Modele, Annee, Puissance, Energie, Boite, Finition, km }
+    (noms accentués du référentiel acceptés aussi ; km absent = km de référence du segment ;
+    Puissance/Boite/Finition absents ou segment inconnu = repli vers un niveau plus grossier)
+    Ancien contrat sans segment ({ description, extractedPrice, extractedYear, ... }, scan du
+    backend) : estimation heuristique dégradée, meta.niveau = "annonce_libre" (voir estimer_annonce_libre).
+    Renvoie : { prediction: int, confidence: float, interval: {low, high, level} | null, details: {...} }
+    Avec le cache actif, l'en-tête X-Cache indique HIT ou MISS ; la cote est celle du km demandé,
+    sauf tranches de km activées explicitement (ARGUS_CACHE_KM_BUCKET > 1, cote au milieu de la tranche).
     """
     try:
         # 1. Validation de l'entrée
         if not request.is_json:
             logger.warning("Reçu requête non-JSON")
             return jsonify({"error": "Format JSON attendu"}), 400
-        
-        data = request.get_json()
-        logger.info(f"🔮 Nouvelle demande de prédiction reçue. Données partielles: {list(data.keys())}")
-
-        # 2. Prédiction (Simulation ou Modèle Réel)
-        prediction_val = mock_predict_price(data)
-        
-        if prediction_val is None:
-             return jsonify({"error": "Impossible de calculer une estimation"}), 422
-
-        # 3. Calcul de confiance (Simulé de manière réaliste)
-        
-        confidence_metric = 0.95 # Valeur de base haute
-        
-        # PÉNALITÉS RÉALISTES (pour forcer la variation de la confiance)
-        if not data.get('extractedYear'):
-            # Si l'IA n'a pas l'année, la confiance chute lourdement
-            confidence_metric -= 0.30 
-        if not data.get('extractedPrice'):
-            # Si pas de prix, la prédiction est incertaine
-            confidence_metric -= 0.15 
-        
-        # La confiance varie maintenant en fonction de la qualité des données reçues.
-        confidence_score = max(0.40, min(0.99, confidence_metric))
-
-
-        response = {
-            "prediction": prediction_val,
-            "confidence": confidence_score,
-            "meta": {
-                "model_version": "v1.1-advanced-mock",
-                "confidence_source": "Heuristique de pénalité (À remplacer par predict_proba)"
-            }
-        }
-        
-        logger.info(f"✅ Prédiction réussie: {prediction_val}€ (Confiance: {confidence_score:.2f})")
-        return jsonify(response), 200
+        bundle = REFERENTIEL.actuel()
+        if bundle is None:
+            return jsonify({"error": "Référentiel non chargé"}), 503
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Objet JSON attendu"}), 400
+
+        if est_annonce_libre(data):
+            RESOLUTIONS.inc("/predict", "annonce_libre")
+            return jsonify(estimer_annonce_libre(data, bundle)), 200
+
+        try:
+            cle = normaliser_cle(data, CHAMPS_OPTIONNELS)
+            km = lire_km(data)
+        except SegmentInvalide as e:
+            RESOLUTIONS.inc("/predict", "invalide")
+            return jsonify({"error": str(e)}), 422
+
+        cle_cache = None
+        if CACHE is not None:
+            tranche, km = argus_cache.tranche_km(km, CACHE.km_bucket)
+            cle_cache = (cle, tranche)
+            body = CACHE.get(bundle.version, cle_cache)
+            if body is not None:
+                return Response(body, status=200, mimetype=app.json.mimetype, headers={"X-Cache": "HIT"})
+
+        # 2. Cotation déterministe (niveau le plus fin renseigné + décote km par paliers + plancher)
+        result, niveau = bundle.backoff.estimer(cle, km)
+        RESOLUTIONS.inc("/predict", niveau or "introuvable")
+        if result is None:
+            return jsonify({"error": "Segment introuvable dans le référentiel"}), 404
+
+        # 3. Confiance issue de la fiabilité du segment (Qualite_Cote) et du niveau de repli
+        response = construire_reponse(result.to_dict(), niveau, bundle)
+
+        log_echantillon("✅ Prédiction réussie: %s€ (Confiance: %.2f, niveau: %s, champs: %s)",
+                        result.cote_affinee, response['confidence'], niveau, list(data.keys()))
+        if cle_cache is None:
+            return jsonify(response), 200
+        body = (app.json.dumps(response) + "\n").encode("utf-8")
+        CACHE.set(bundle.version, cle_cache, body)
+        return Response(body, status=200, mimetype=app.json.mimetype, headers={"X-Cache": "MISS"})
+
+    except Exception as e:
+        logger.error("🔥 Erreur Critique Serveur: %s", e, exc_info=True)
+        return jsonify({"error": "Erreur interne du serveur IA"}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Cotation en lot (pages de résultats, balayages de marché).
+    Attend un tableau JSON d'annonces (même format que /predict), un objet {"listings": [...]}
+    ou un flux NDJSON (Content-Type application/x-ndjson).
+    Renvoie les résultats dans l'ordre, avec une erreur par annonce plutôt qu'un échec global.
+    """
+    try:
+        bundle = REFERENTIEL.actuel()
+        if bundle is None:
+            return jsonify({"error": "Référentiel non chargé"}), 503
+        items, ndjson = lire_lot()
+        if items is None:
+            return jsonify({"error": "Tableau JSON ou flux NDJSON attendu"}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Lot trop volumineux (max {MAX_BATCH_SIZE})"}), 413
+
+        resultats = predire_lot(items, bundle)
+        nb_erreurs = sum(1 for r in resultats if "error" in r)
+        log_echantillon("📦 Lot traité : %d annonces, %d erreurs", len(resultats), nb_erreurs)
+
+        if ndjson:
+            corps = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultats)
+            return Response(corps, status=200, mimetype="application/x-ndjson")
+        return jsonify({"count": len(resultats), "errors": nb_erreurs, "results": resultats}), 200
 
     except Exception as e:
-        logger.error(f"🔥 Erreur Critique Serveur: {str(e)}", exc_info=True)
+        logger.error("🔥 Erreur Critique Serveur (batch): %s", e, exc_info=True)
         return jsonify({"error": "Erreur interne du serveur IA"}), 500
 
+@app.route('/predict/curve', methods=['POST'])
+def predict_curve():
+    """
+    Cote du segment sur une plage de kilométrages (graphiques prix / km).
+    Attend le JSON de /predict + "kms": [...] ou km_min / km_max / step (défaut 0 à 300000 par 10000).
+    Renvoie les cotes de chaque km et les points de rupture de la courbe (paliers, plafond du
+    bonus, entrée dans le plancher), évalués sur la courbe précalculée du segment.
+    """
+    bundle = REFERENTIEL.actuel()
+    if bundle is None:
+        return jsonify({"error": "Référentiel non chargé"}), 503
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Objet JSON attendu"}), 400
+    try:
+        cle = normaliser_cle(data, CHAMPS_OPTIONNELS)
+        kms = argus_courbes.lire_grille_km(data)
+    except SegmentInvalide as e:
+        RESOLUTIONS.inc("/predict/curve", "invalide")
+        return jsonify({"error": str(e)}), 422
+
+    n, i = bundle.backoff.resoudre(cle)
+    niveau, _, index = bundle.backoff.niveaux[n] if n is not None else (None, None, None)
+    RESOLUTIONS.inc("/predict/curve", niveau or "introuvable")
+    if index is None:
+        return jsonify({"error": "Segment introuvable dans le référentiel"}), 404
+    final, _, floored = evaluer_courbes(index.courbes, np.full(len(kms), i), kms)
+    return jsonify({
+        "kms": kms.tolist(), "prices": final.tolist(), "floored": floored.tolist(),
+        "breakpoints": argus_courbes.points_rupture(index.courbes, i),
+        "meta": {"model_version": MODEL_VERSION, "referentiel_version": bundle.version, "niveau": niveau,
+                 "cote_brute": int(index.cote[i]),
+                 "kilometrage_reference": int(index.km_ref[i])},
+    }), 200
+
+@app.route('/comparables', methods=['POST'])
+def comparables():
+    """
+    Les k annonces réelles les plus proches et leur distribution de prix.
+    Attend le JSON de /predict (Marque et Modèle obligatoires, autres champs optionnels) + k (défaut 10).
+    Recherche dans les annonces du même modèle, à défaut de la même marque (meta.niveau).
+    """
+    if COMPARABLES is None:
+        return jsonify({"error": "Index des comparables non chargé"}), 503
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Objet JSON attendu"}), 400
+    try:
+        criteres, k = argus_comparables.lire_requete(data)
+    except SegmentInvalide as e:
+        RESOLUTIONS.inc("/comparables", "invalide")
+        return jsonify({"error": str(e)}), 422
+
+    trouve = COMPARABLES.chercher(**criteres, k=k)
+    if trouve is None:
+        RESOLUTIONS.inc("/comparables", "introuvable")
+        return jsonify({"error": "Marque introuvable dans les annonces"}), 404
+    indices, distances, niveau = trouve
+    RESOLUTIONS.inc("/comparables", niveau)
+    return jsonify({
+        "comparables": COMPARABLES.annonces(indices, distances),
+        "prices": argus_comparables.distribution_prix(COMPARABLES.prix[indices]),
+        "meta": {"niveau": niveau, "k": k, "source": COMPARABLES.source},
+    }), 200
+
+def lire_description(item):
+    """(description, téléphone) d'une annonce : chaîne seule ou objet {description, phone}."""
+    if isinstance(item, str):
+        return item, None
+    if not isinstance(item, dict):
+        raise SegmentInvalide("Chaîne ou objet JSON attendu")
+    description = item.get('description', item.get('Description'))
+    telephone = item.get('phone', item.get('telephone'))
+    if description is not None and not isinstance(description, str):
+        raise SegmentInvalide("description doit être une chaîne")
+    if telephone is not None and not isinstance(telephone, (str, int)):
+        raise SegmentInvalide("phone doit être une chaîne")
+    return description, telephone
+
+
+@app.route('/risk', methods=['POST'])
+def risk():
+    """
+    Score de risque d'une description (signatures d'arnaque, mots-clés, numéros virtuels).
+    Attend un JSON { description, phone? } ; renvoie { score: 0-100, details: [...], meta: {rules_version} }.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Objet JSON attendu"}), 400
+    try:
+        description, telephone = lire_description(data)
+    except SegmentInvalide as e:
+        return jsonify({"error": str(e)}), 422
+    jeu = RISQUE.actuel()
+    return jsonify({**jeu.scorer(description, telephone), "meta": {"rules_version": jeu.version}}), 200
+
+@app.route('/risk/batch', methods=['POST'])
+def risk_batch():
+    """
+    Score de risque en lot (balayages de descriptions) : tableau JSON de descriptions ou d'objets
+    { description, phone }, objet {"listings": [...]} ou flux NDJSON. Un seul parcours du lot.
+    """
+    items, ndjson = lire_lot()
+    if items is None:
+        return jsonify({"error": "Tableau JSON ou flux NDJSON attendu"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Lot trop volumineux (max {MAX_BATCH_SIZE})"}), 413
+
+    descriptions, telephones, erreurs = [None] * len(items), [None] * len(items), {}
+    for i, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            descriptions[i], telephones[i] = lire_description(item)
+        except SegmentInvalide as e:
+            erreurs[i] = str(e)
+    jeu = RISQUE.actuel()
+    scores = jeu.scorer_lot(descriptions, telephones)
+    resultats = [{"index": i, "error": erreurs[i]} if i in erreurs else {"index": i, **r}
+                 for i, r in enumerate(scores)]
+    log_echantillon("🚩 Lot de risque : %d descriptions, %d signalées", len(items),
+                    sum(1 for r in resultats if r.get("score")))
+
+    if ndjson:
+        corps = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultats)
+        return Response(corps, status=200, mimetype="application/x-ndjson")
+    return jsonify({"count": len(resultats), "errors": len(erreurs), "rules_version": jeu.version,
+                    "results": resultats}), 200
+
+@app.route('/options', methods=['GET'])
+def options():
+    """
+    Options du champ suivant dans la cascade Marque -> Modèle -> Année -> Énergie -> Boîte -> Puissance -> Finition.
+    Paramètres : champs déjà choisis (noms accentués ou ASCII), q = texte d'autocomplétion (Marque/Modèle),
+    limit = nombre max d'options renvoyées.
+    Exemple : /options?Marque=RENAULT&q=cli -> modèles RENAULT contenant « CLI ».
+    """
+    bundle = REFERENTIEL.actuel()
+    if bundle is None:
+        return jsonify({"error": "Référentiel non chargé"}), 503
+    facettes = bundle.facettes
+    try:
+        selection = lire_selection(request.args)
+        limit = request.args.get('limit', type=int)
+    except SegmentInvalide as e:
+        return jsonify({"error": str(e)}), 422
+
+    champ = facettes.champ_suivant(selection)
+    choix = dict(zip(FACETTES_CASCADE, selection))
+    if champ is None:
+        trouve = facettes.ligne(selection) is not None
+        return jsonify({"champ": None, "selection": choix, "segment": trouve}), 200 if trouve else 404
+
+    opts = facettes.options(selection)
+    if opts is None:
+        return jsonify({"error": "Sélection introuvable dans le référentiel", "selection": choix}), 404
+    q = request.args.get('q', '').strip()
+    if q:
+        if champ not in RECHERCHE_COLS:
+            return jsonify({"error": f"Autocomplétion disponible pour {' et '.join(RECHERCHE_COLS)} uniquement"}), 400
+        opts = facettes.rechercher(champ, q, marque=selection[0] if selection else None)
+    total = len(opts)
+    if limit is not None and limit >= 0:
+        opts = opts[:limit]
+    return jsonify({"champ": champ, "selection": choix, "options": opts, "total": total}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques du processus au format texte Prometheus (latences, résolutions, cache, référentiel)."""
+    return Response(METRIQUES.exposer(), status=200, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- MESURE DU DÉMARRAGE À FROID ---
+# Exécuté dans un interpréteur neuf : imports tiers, import de api_ia (chargement + index),
+# première requête. Aucune dépendance de construction (pandas, scikit-learn) ne doit apparaître.
+_SCRIPT_DEMARRAGE = """
+import sys, json, time
+t0 = time.perf_counter()
+import numpy, flask, flask_cors
+t1 = time.perf_counter()
+import api_ia
+t2 = time.perf_counter()
+client = api_ia.app.test_client()
+index = api_ia.REFERENTIEL.bundle.index
+payload = dict(zip(index.key_cols, next(iter(index.index))))
+statut = client.post('/predict', json=payload).status_code
+t3 = time.perf_counter()
+print(json.dumps({'imports_tiers_s': t1 - t0, 'import_api_s': t2 - t1, 'premiere_requete_s': t3 - t2,
+                  'statut': statut, 'demarrage': api_ia.DEMARRAGE,
+                  'pandas_importe': 'pandas' in sys.modules, 'sklearn_importe': 'sklearn' in sys.modules}))
+"""
+
+
+def mesurer_demarrage(repetitions=5):
+    """Décomposition du démarrage à froid (médianes sur `repetitions` interpréteurs neufs)."""
+    env = {**os.environ, "ARGUS_LOG_LEVEL": "warning", "ARGUS_LOG_SAMPLE": "0"}
+    mesures = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        sortie = subprocess.run([sys.executable, "-c", _SCRIPT_DEMARRAGE], cwd=BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - start
+        m = json.loads(sortie.strip().splitlines()[-1])
+        d = m.pop('demarrage')
+        charge = d.get('chargement_s', 0.0) + d.get('construction_index_s', 0.0) + d.get('empreinte_s', 0.0)
+        m.update({
+            'source': d.get('source'),
+            'empreinte_s': d.get('empreinte_s', 0.0),
+            'chargement_s': d.get('chargement_s', 0.0),
+            'construction_index_s': d.get('construction_index_s', 0.0),
+            'imports_api_s': m['import_api_s'] - charge,  # Flask, modules argus_*, création de l'app
+            'interpreteur_s': total - m['imports_tiers_s'] - m['import_api_s'] - m['premiere_requete_s'],
+            'total_s': total,
+        })
+        mesures.append(m)
+    rapport = {'repetitions': repetitions, 'source': mesures[0]['source'], 'statut': mesures[0]['statut'],
+               'pandas_importe': any(m['pandas_importe'] for m in mesures),
+               'sklearn_importe': any(m['sklearn_importe'] for m in mesures)}
+    for cle in ('interpreteur_s', 'imports_tiers_s', 'imports_api_s', 'empreinte_s', 'chargement_s',
+                'construction_index_s', 'premiere_requete_s', 'total_s'):
+        rapport[cle] = round(float(np.median([m[cle] for m in mesures])), 4)
+    return rapport
+
+
 # --- POINT D'ENTRÉE ---
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Moteur IA Argus (serveur de développement)")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="Décompose le démarrage à froid (imports, chargement, index, 1re requête) puis quitte")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpréteurs neufs mesurés avec --measure-startup")
+    args = parser.parse_args()
+
+    if args.measure_startup:
+        print(json.dumps(mesurer_demarrage(args.repeat), indent=2))
+        sys.exit(0)
+
     # Configuration explicite du port 8000 pour matcher server.js
     logger.info("🚀 Démarrage du moteur IA sur le port 8000...")
-    
+
+    # Serveur de développement uniquement. Production : gunicorn -c gunicorn.conf.py api_ia:app
     # Debug=True permet le rechargement auto, mais attention en prod
-    # Host='0.0.0.0' est nécessaire pour être accessible si dockerisé, 
+    # Host='0.0.0.0' est nécessaire pour être accessible si dockerisé,
     # mais '127.0.0.1' est plus sûr pour du dev local strict.
-    app.run(host='127.0.0.1', port=8000, debug=True)
\ No newline at end of file
+    app.run(host='127.0.0.1', port=8000, debug=True)
@@ -0,0 +1,314 @@
+# Fichier: argus_backoff.py
+# Repli hiérarchique quand le segment exact est absent du référentiel V21.
+#
+# Les tables agrégées sont précalculées (pondérées par le volume d'annonces) à chaque
+# niveau plus grossier : sans Finition, sans Puissance, sans Boîte, années voisines (±1),
+# puis la cote officielle (MA_COTE_ARGUS_OFFICIELLE). À la requête, on sonde les niveaux
+# du plus fin au plus grossier : au plus len(NIVEAUX) lookups de dict, sans balayage.
+# Pas de pandas : construction en Python/NumPy, exécutable aussi au démarrage du service.
+
+import os
+import csv
+
+import numpy as np
+
+import argus_store
+from argus_index import (
+    SegmentIndex, SEGMENT_COLS, CONFIANCE_QUALITE, INCERTITUDE_COLS, CoteResult,
+    borner_decote_vectorise, calculer_prix_final
+)
+
+# --- CONFIGURATION ---
+OUTPUT_BACKOFF = "argus_backoff_v21" + argus_store.COLUMNAR_EXT
+OFFICIELLE_FILE = "MA_COTE_ARGUS_OFFICIELLE.csv"
+
+# (nom du niveau, colonnes de la clé), du plus fin au plus grossier
+NIVEAUX = (
+    ('segment', SEGMENT_COLS),
+    ('sans_finition', ['Marque', 'Modèle', 'Année', 'Puissance', 'Énergie', 'Boîte']),
+    ('sans_puissance', ['Marque', 'Modèle', 'Année', 'Énergie', 'Boîte']),
+    ('sans_boite', ['Marque', 'Modèle', 'Année', 'Énergie']),
+    ('annees_voisines', ['Marque', 'Modèle', 'Année', 'Énergie']),
+    ('cote_officielle', ['Marque', 'Modèle', 'Année', 'Énergie', 'Boîte']),
+)
+FENETRE_ANNEES = 1
+
+# Pénalité de confiance selon le niveau qui a répondu
+FACTEUR_NIVEAU = {
+    'segment': 1.0, 'sans_finition': 0.95, 'sans_puissance': 0.9,
+    'sans_boite': 0.8, 'annees_voisines': 0.7, 'cote_officielle': 0.6,
+}
+
+# Libellés de la cote officielle -> libellés du référentiel V21
+ENERGIE_OFFICIELLE = {
+    'HYBRIDES': 'HYBRIDE',
+    'BICARBURATION ESSENCE / GPL': 'GPL',
+    'BICARBURATION ESSENCE BIOÉTHANOL': 'ESSENCE',
+}
+BOITE_OFFICIELLE = {'AUTO': 'AUTOMATIQUE'}
+
+VALEUR_COLS = ['Cote_Reference', 'Km_Reference', 'Decote_par_Km', 'Volume_Annonces']
+INT_KEY_COLS = ('Année', 'Puissance')
+
+
+def trouver_cote_officielle(base_dir=None):
+    """Cote officielle nettoyée (clean.py) si disponible, sinon brute ; cwd puis backend/."""
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    noms = ("MA_COTE_ARGUS_OFFICIELLE_CLEAN.csv", OFFICIELLE_FILE)
+    for dossier in (os.getcwd(), base_dir, os.path.join(base_dir, "..", "backend")):
+        for nom in noms:
+            path = os.path.join(dossier, nom)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _positions(key_cols):
+    return tuple(SEGMENT_COLS.index(c) for c in key_cols)
+
+
+def _vers_colonnes(acc, key_cols, incertitude=False):
+    """
+    acc : {clé: [volume, Σcote·v, Σkm·v, Σdecote·v (+ Σσ²·v, Σcote²·v, Σ(se·v)²)]} -> colonnes NumPy
+    (moyennes pondérées). Écart-type du niveau = variance intra-segments + dispersion des cotes
+    entre segments ; erreur-type de la décote moyenne pondérée = √Σ(se·v)² / Σv.
+    """
+    cles = sorted(acc)
+    largeur = 7 if incertitude else 4
+    valeurs = np.array([acc[k] for k in cles], dtype=np.float64).reshape(-1, largeur)
+    volume = valeurs[:, 0]
+    colonnes = {}
+    for j, col in enumerate(key_cols):
+        vals = [k[j] for k in cles]
+        colonnes[col] = np.array(vals, dtype=np.int64) if col in INT_KEY_COLS else np.array(vals, dtype=str)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        colonnes['Cote_Reference'] = np.round(valeurs[:, 1] / volume).astype(np.int64)
+        colonnes['Km_Reference'] = (valeurs[:, 2] / volume).astype(np.int64)
+        colonnes['Decote_par_Km'] = np.round(valeurs[:, 3] / volume, 5)
+        if incertitude:
+            variance = valeurs[:, 4] / volume + valeurs[:, 5] / volume - (valeurs[:, 1] / volume) ** 2
+            colonnes['Ecart_Type_Prix'] = np.round(np.sqrt(np.maximum(variance, 0)), 2)
+            colonnes['Erreur_Type_Decote'] = np.round(np.sqrt(valeurs[:, 6]) / volume, 6)
+    colonnes['Volume_Annonces'] = volume.astype(np.int64)
+    return colonnes
+
+
+def _agreger(cles, cote, km, decote, volume, ecart=None, erreur=None):
+    if ecart is None:
+        contributions = ([v, c * v, m * v, d * v] for c, m, d, v in zip(cote, km, decote, volume))
+    else:
+        contributions = ([v, c * v, m * v, d * v, s * s * v, c * c * v, (e * v) ** 2]
+                         for c, m, d, v, s, e in zip(cote, km, decote, volume, ecart, erreur))
+    acc = {}
+    for k, contribution in zip(cles, contributions):
+        a = acc.get(k)
+        if a is None:
+            acc[k] = contribution
+        else:
+            for j, x in enumerate(contribution): a[j] += x
+    return acc
+
+
+def lire_cote_officielle(path):
+    """
+    Cote officielle agrégée par (Marque, Modèle, Année, Énergie, Boîte) : moyenne pondérée par
+    Nb_Annonces sur les tranches de km, décote = pente pondérée cote ~ milieu de tranche
+    (bornée avec les règles V21, -0.05 par défaut si une seule tranche).
+    """
+    for encoding in ('utf-8', 'latin-1'):
+        try:
+            with open(path, newline='', encoding=encoding) as f:
+                lignes = list(csv.DictReader(f, delimiter=';'))
+            break
+        except UnicodeDecodeError:
+            continue
+
+    acc = {}
+    for ligne in lignes:
+        try:
+            annee = int(ligne['Annee'])
+            w = float(ligne['Nb_Annonces'])
+            y = float(ligne['Cote_Moyenne'])
+            bas, haut = (float(x) for x in ligne['Km_Tranche'].split('-'))
+        except (ValueError, KeyError, AttributeError):
+            continue
+        if w <= 0:
+            continue
+        energie = ligne['Energie'].strip().upper()
+        boite = ligne['Boite'].strip().upper()
+        cle = (ligne['Marque'].strip().upper(), ligne['Modele'].strip().upper(), annee,
+               ENERGIE_OFFICIELLE.get(energie, energie), BOITE_OFFICIELLE.get(boite, boite))
+        x = (bas + haut) / 2
+        a = acc.setdefault(cle, [0.0, 0.0, 0.0, 0.0, 0.0, 0])
+        a[0] += w; a[1] += w * x; a[2] += w * y; a[3] += w * x * x; a[4] += w * x * y; a[5] += 1
+
+    key_cols = NIVEAUX[-1][1]
+    cles = sorted(acc)
+    s = np.array([acc[k] for k in cles], dtype=np.float64).reshape(-1, 6)
+    sw, swx, swy, swxx, swxy, nb_tranches = s.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        den = sw * swxx - swx * swx
+        pente = np.where((nb_tranches >= 2) & (den > 0), (sw * swxy - swx * swy) / den, -0.05)
+    annees = np.array([k[2] for k in cles], dtype=np.int64)
+
+    colonnes = {}
+    for j, col in enumerate(key_cols):
+        vals = [k[j] for k in cles]
+        colonnes[col] = np.array(vals, dtype=np.int64) if col in INT_KEY_COLS else np.array(vals, dtype=str)
+    colonnes['Cote_Reference'] = np.round(swy / sw).astype(np.int64)
+    colonnes['Km_Reference'] = (swx / sw).astype(np.int64)
+    colonnes['Decote_par_Km'] = borner_decote_vectorise(pente, annees)
+    colonnes['Volume_Annonces'] = sw.astype(np.int64)
+    return colonnes
+
+
+def construire_tables(colonnes, officielle_path=None):
+    """
+    Tables de repli {niveau: colonnes} à partir des colonnes du référentiel V21
+    (et de la cote officielle si le fichier est fourni).
+    """
+    n = len(colonnes['Cote_Reference'])
+    cles_completes = list(zip(*(np.asarray(colonnes[c]).tolist() for c in SEGMENT_COLS)))
+    cote = np.asarray(colonnes['Cote_Reference'], dtype=np.float64).tolist()
+    km = np.asarray(colonnes['Km_Reference'], dtype=np.float64).tolist()
+    decote = np.asarray(colonnes['Decote_par_Km'], dtype=np.float64).tolist()
+    volume = np.asarray(colonnes['Volume_Annonces'], dtype=np.float64).tolist()
+    incertitude = all(c in colonnes for c in INCERTITUDE_COLS)
+    ecart, erreur = ((np.asarray(colonnes[c], dtype=np.float64).tolist() for c in INCERTITUDE_COLS)
+                     if incertitude else (None, None))
+
+    tables = {}
+    acc_sans_boite = None
+    for nom, key_cols in NIVEAUX[1:4]:
+        pos = _positions(key_cols)
+        cles = [tuple(k[p] for p in pos) for k in cles_completes] if n else []
+        acc = _agreger(cles, cote, km, decote, volume, ecart, erreur)
+        tables[nom] = _vers_colonnes(acc, key_cols, incertitude)
+        if nom == 'sans_boite':
+            acc_sans_boite = acc
+
+    # Années voisines : chaque (Marque, Modèle, Année, Énergie) contribue aux années ±FENETRE_ANNEES
+    fenetre = {}
+    for (marque, modele, annee, energie), a in (acc_sans_boite or {}).items():
+        for dy in range(-FENETRE_ANNEES, FENETRE_ANNEES + 1):
+            cle = (marque, modele, annee + dy, energie)
+            f = fenetre.get(cle)
+            if f is None:
+                fenetre[cle] = list(a)
+            else:
+                for j in range(len(f)): f[j] += a[j]
+    tables['annees_voisines'] = _vers_colonnes(fenetre, NIVEAUX[4][1], incertitude)
+
+    if officielle_path and os.path.exists(officielle_path):
+        tables['cote_officielle'] = lire_cote_officielle(officielle_path)
+    return tables
+
+
+def sauvegarder_tables(tables, path=OUTPUT_BACKOFF, meta=None):
+    """
+    Toutes les tables dans un seul fichier colonnaire (colonne 'Niveau', clés inutilisées vides,
+    incertitude NaN pour les niveaux qui n'en ont pas).
+    """
+    incertitude = [c for c in INCERTITUDE_COLS if any(c in t for t in tables.values())]
+    blocs = {col: [] for col in ['Niveau'] + SEGMENT_COLS + VALEUR_COLS + incertitude}
+    for nom, colonnes in tables.items():
+        n = len(colonnes['Cote_Reference'])
+        blocs['Niveau'].append(np.full(n, nom))
+        for col in SEGMENT_COLS:
+            if col in colonnes:
+                blocs[col].append(np.asarray(colonnes[col]))
+            else:
+                blocs[col].append(np.full(n, -1 if col in INT_KEY_COLS else ""))
+        for col in VALEUR_COLS:
+            blocs[col].append(np.asarray(colonnes[col]))
+        for col in incertitude:
+            blocs[col].append(np.asarray(colonnes[col], dtype=np.float64) if col in colonnes else np.full(n, np.nan))
+    argus_store.ecrire_colonnes({col: np.concatenate(v) if v else np.array([]) for col, v in blocs.items()}, path, meta)
+
+
+def charger_tables(path=OUTPUT_BACKOFF):
+    table = argus_store.charger_colonnes(path)
+    niveaux = table['Niveau']
+    valeur_cols = VALEUR_COLS + [c for c in INCERTITUDE_COLS if c in table.noms]
+    tables = {}
+    for nom, key_cols in NIVEAUX[1:]:
+        mask = niveaux == nom
+        if mask.any():
+            tables[nom] = {col: table[col][mask] for col in key_cols + valeur_cols}
+    return tables
+
+
+class BackoffIndex:
+    """Résolution du niveau le plus fin renseigné, en un nombre constant de lookups."""
+
+    def __init__(self, segment_index, tables):
+        self.niveaux = [('segment', _positions(SEGMENT_COLS), segment_index)]
+        for nom, key_cols in NIVEAUX[1:]:
+            if nom in tables:
+                self.niveaux.append((nom, _positions(key_cols), SegmentIndex(tables[nom], key_cols=key_cols)))
+
+    def resoudre(self, cle):
+        """(numéro de niveau, ligne) du premier niveau qui connaît la clé, ou (None, None)."""
+        for n, (_, pos, index) in enumerate(self.niveaux):
+            sous_cle = tuple(cle[p] for p in pos)
+            if None in sous_cle:
+                continue
+            i = index.index.get(sous_cle)
+            if i is not None:
+                return n, i
+        return None, None
+
+    def estimer(self, cle, reel_km=None):
+        """(CoteResult, nom du niveau) ou (None, None)."""
+        n, i = self.resoudre(cle)
+        if n is None:
+            return None, None
+        nom, _, index = self.niveaux[n]
+        ref_prix = int(index.cote[i])
+        ref_km = int(index.km_ref[i])
+        km = ref_km if reel_km is None else reel_km
+        coef = float(index.decote[i])
+        final, adj, floored = calculer_prix_final(ref_prix, ref_km, km, coef)
+        bas, haut = index.intervalle(i, final, adj, coef)
+        result = CoteResult(
+            cote_affinee=final, cote_brute=ref_prix, confiance=str(index.qualite[i]),
+            volume_source=int(index.volume[i]), kilometrage_reference=ref_km,
+            ajustement_km=adj, prix_plancher_atteint=floored,
+            intervalle_bas=bas, intervalle_haut=haut
+        )
+        return result, nom
+
+    def resoudre_lot(self, cles):
+        """Tableaux (niveau, ligne) pour une liste de clés (-1 si introuvable ou clé None)."""
+        niveaux = np.full(len(cles), -1, dtype=np.int64)
+        lignes = np.full(len(cles), -1, dtype=np.int64)
+        for j, cle in enumerate(cles):
+            if cle is None:
+                continue
+            n, i = self.resoudre(cle)
+            if n is not None:
+                niveaux[j], lignes[j] = n, i
+        return niveaux, lignes
+
+    def estimer_lot(self, niveaux, lignes, kms):
+        """Cotation vectorisée, niveau par niveau. Retourne les colonnes de CoteResult + 'niveau'."""
+        n = len(lignes)
+        out = {
+            'cote_affinee': np.zeros(n, np.int64), 'cote_brute': np.zeros(n, np.int64),
+            'confiance': np.full(n, "C", dtype=object), 'volume_source': np.zeros(n, np.int64),
+            'kilometrage_reference': np.zeros(n, np.int64), 'ajustement_km': np.zeros(n, np.int64),
+            'prix_plancher_atteint': np.zeros(n, bool), 'niveau': np.full(n, "", dtype=object),
+            'intervalle_bas': np.full(n, None, dtype=object), 'intervalle_haut': np.full(n, None, dtype=object),
+        }
+        for num, (nom, _, index) in enumerate(self.niveaux):
+            sel = np.flatnonzero(niveaux == num)
+            if not len(sel):
+                continue
+            lot = index.estimer_lot(lignes[sel], kms[sel])
+            for k, v in lot.items():
+                out[k][sel] = v
+            out['niveau'][sel] = nom
+        return out
+
+    def confiance(self, qualite, niveau):
+        return round(CONFIANCE_QUALITE.get(qualite, 0.5) * FACTEUR_NIVEAU.get(niveau, 0.5), 4)
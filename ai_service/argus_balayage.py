@@ -0,0 +1,403 @@
+# Fichier: argus_balayage.py
+# Balayage de marché hors ligne : cote de chaque annonce d'un export CSV (scrape complet) et
+# signalement des annonces très en dessous de la cote, sans passer par l'API HTTP.
+#
+# Le fichier est lu par morceaux ; chaque morceau est normalisé en colonnes (mêmes règles que
+# normaliser_cle), ses clés distinctes sont résolues une fois dans le repli hiérarchique du
+# service (BackoffIndex.resoudre_lot) puis la décote par paliers, le plafond de bonus et le
+# plancher sont appliqués en tableau (estimer_lot -> courbes prix / km du segment) : mêmes
+# cotes que /predict/batch. Les résultats sont écrits au fil de l'eau (CSV, ou Parquet avec
+# pyarrow, un row group par morceau) : la mémoire dépend de --chunksize, pas de la taille du
+# fichier. Avec --workers, les morceaux sont cotés par un pool de processus (référentiel chargé
+# une fois par worker, au plus 2 morceaux en vol par worker) et écrits dans l'ordre d'entrée.
+#
+# Colonnes ajoutées : Statut (ok / introuvable / invalide), Niveau, Cote_Affinee, Cote_Brute,
+# Ajustement_Km, Prix_Plancher, Intervalle_Bas, Intervalle_Haut, Ratio_Prix, Sous_Cote
+# (+ Risque_Score et Risque_Details avec --risque, depuis la colonne Description).
+#
+# Usage : python argus_balayage.py --input annonces.csv [--output balayage.csv|.parquet]
+#                                  [--chunksize 100000] [--workers 4] [--seuil 0.7] [--flagged-only]
+#                                  [--risque] [--check-parity] [--report JSON]
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import argus_metrics
+import argus_snapshot
+from argus_index import SEGMENT_COLS, ALIAS_CHAMPS, ALIAS_KM, KM_MAX
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger("ArgusBalayage")
+
+# --- CONFIGURATION ---
+CHUNKSIZE = 100_000
+# Même seuil que le backend Node (prix annoncé / cote IA < 0.7 : alerte)
+SEUIL_SOUS_COTE = 0.7
+MORCEAUX_EN_VOL_PAR_WORKER = 2
+
+ALIAS_PRIX = ('Prix', 'prix', 'price', 'extractedPrice')
+ALIAS_DESCRIPTION = ('Description', 'description')
+# Champs dont l'absence déclenche un repli plutôt qu'une erreur (comme CHAMPS_OPTIONNELS du service)
+CHAMPS_OPTIONNELS = ('Puissance', 'Boîte', 'Finition')
+CHAMPS_NUMERIQUES = ('Année', 'Puissance')
+FORMATS = ('csv', 'parquet')
+ENTIER_RE = re.compile(r"[+-]?\d{1,18}")
+
+
+def _colonne(chunk, alias):
+    return next((chunk[nom] for nom in alias if nom in chunk.columns), None)
+
+
+# Normalisation appliquée aux catégories (valeurs distinctes du morceau), pas aux lignes, comme
+# argus_streaming : chaque fonction renvoie (valeur par code, illisible par code, code par ligne),
+# le code des valeurs manquantes étant le dernier.
+
+def _categorie(serie):
+    serie = serie if isinstance(serie.dtype, pd.CategoricalDtype) else serie.astype('category')
+    codes = serie.cat.codes.to_numpy().astype(np.int64)
+    categories = serie.cat.categories.astype(str)
+    return categories, np.where(codes < 0, len(categories), codes)
+
+
+def _codes_texte(serie):
+    """Valeurs upper/strip, None si manquante ou vide."""
+    categories, codes = _categorie(serie)
+    valeurs = [v.upper().strip() or None for v in categories] + [None]
+    return np.array(valeurs, dtype=object), np.zeros(len(valeurs), dtype=bool), codes
+
+
+def _codes_entier(serie):
+    """Entiers seulement, comme int() côté /predict : « 150.0 » ou « 150ch » sont illisibles."""
+    categories, codes = _categorie(serie)
+    valeurs, illisible = [], []
+    for v in categories:
+        v = v.strip()
+        lisible = ENTIER_RE.fullmatch(v) is not None
+        valeurs.append(int(v) if lisible else None)
+        illisible.append(bool(v) and not lisible)
+    return np.array(valeurs + [None], dtype=object), np.array(illisible + [False]), codes
+
+
+def cles_morceau(chunk):
+    """
+    Clés de segment du morceau (tuples, None si la ligne est invalide), km (-1 = km de référence)
+    et masque des lignes invalides. Mêmes règles que normaliser_cle + lire_km, en colonnes.
+    Les tuples ne sont construits que pour les combinaisons de valeurs distinctes du morceau :
+    (clés distinctes, indice de la clé de chaque ligne, km, invalide).
+    """
+    n = len(chunk)
+    invalide_cle = np.zeros(n, dtype=bool)
+    colonnes = []
+    for col in SEGMENT_COLS:
+        serie = _colonne(chunk, ALIAS_CHAMPS[col])
+        if serie is None:
+            if col not in CHAMPS_OPTIONNELS:
+                invalide_cle[:] = True
+            colonnes.append((np.array([None], dtype=object), np.zeros(n, dtype=np.int64)))
+            continue
+        valeurs, illisible, codes = (_codes_entier if col in CHAMPS_NUMERIQUES else _codes_texte)(serie)
+        rejet = illisible if col in CHAMPS_OPTIONNELS else illisible | np.equal(valeurs, None)
+        invalide_cle |= rejet[codes]
+        colonnes.append((valeurs, codes))
+
+    kms = np.full(n, -1, dtype=np.int64)
+    invalide = invalide_cle.copy()
+    serie = _colonne(chunk, ALIAS_KM)
+    if serie is not None:
+        valeurs, illisible, codes = _codes_entier(serie)
+        rejet = illisible | np.array([v is not None and not 0 <= v <= KM_MAX for v in valeurs])
+        invalide |= rejet[codes]
+        kms = np.array([-1 if v is None or r else v for v, r in zip(valeurs, rejet)], dtype=np.int64)[codes]
+
+    # Combinaisons distinctes de codes (groupby ngroup, comme argus_streaming.Vocabulaire) : la
+    # validité de la clé ne dépend que des codes, elle est donc commune à tout le groupe
+    groupes = pd.DataFrame({i: codes for i, (_, codes) in enumerate(colonnes)}).groupby(
+        list(range(len(colonnes))), sort=False).ngroup().to_numpy()
+    _, representants = np.unique(groupes, return_index=True)
+    cles = list(zip(*(valeurs[codes[representants]].tolist() for valeurs, codes in colonnes)))
+    cles = [None if inv else cle for cle, inv in zip(cles, invalide_cle[representants].tolist())]
+    return cles, groupes, kms, invalide
+
+
+def resoudre_distinctes(backoff, cles, groupes):
+    """resoudre_lot sur les seules clés distinctes du morceau (un lookup par segment, pas par annonce)."""
+    distinctes = list(dict.fromkeys(cles))
+    position = {cle: i for i, cle in enumerate(distinctes)}
+    niveaux, lignes = backoff.resoudre_lot(distinctes)
+    inverse = np.fromiter(map(position.__getitem__, cles), dtype=np.int64, count=len(cles))[groupes]
+    return niveaux[inverse], lignes[inverse]
+
+
+def coter_morceau(chunk, backoff, seuil=SEUIL_SOUS_COTE, risque=None):
+    """(morceau + colonnes de cote, durées par étape) ; les colonnes d'entrée sont conservées telles quelles."""
+    durees = {}
+    start = time.perf_counter()
+    cles, groupes, kms, invalide = cles_morceau(chunk)
+    niveaux, lignes = resoudre_distinctes(backoff, cles, groupes)
+    lignes[invalide] = -1  # Km invalide : clé valide mais annonce rejetée, comme lire_km
+    durees['resolution_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n = len(chunk)
+    trouves = np.flatnonzero(lignes >= 0)
+    lot = backoff.estimer_lot(niveaux[trouves], lignes[trouves], kms[trouves])
+    statut = np.where(invalide, "invalide", "introuvable").astype(object)
+    statut[trouves] = "ok"
+    niveau = np.full(n, None, dtype=object)
+    niveau[trouves] = lot['niveau']
+    sortie = {'Statut': statut, 'Niveau': niveau}
+    for nom, cle, dtype in (('Cote_Affinee', 'cote_affinee', "Int64"), ('Cote_Brute', 'cote_brute', "Int64"),
+                            ('Ajustement_Km', 'ajustement_km', "Int64"),
+                            ('Prix_Plancher', 'prix_plancher_atteint', "boolean"),
+                            ('Intervalle_Bas', 'intervalle_bas', "Int64"),
+                            ('Intervalle_Haut', 'intervalle_haut', "Int64")):
+        valeurs = np.full(n, None, dtype=object)
+        valeurs[trouves] = lot[cle]
+        sortie[nom] = pd.array(valeurs, dtype=dtype)
+
+    cote = np.full(n, np.nan)
+    cote[trouves] = lot['cote_affinee']
+    serie_prix = _colonne(chunk, ALIAS_PRIX)
+    prix = np.full(n, np.nan)
+    if serie_prix is not None:
+        categories, codes = _categorie(serie_prix)
+        prix = np.append(pd.to_numeric(categories, errors='coerce').to_numpy(dtype=np.float64), np.nan)[codes]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where((cote > 0) & (prix > 0), prix / cote, np.nan)
+    sortie['Ratio_Prix'] = np.round(ratio, 4)
+    sortie['Sous_Cote'] = ratio < seuil
+    durees['cotation_s'] = time.perf_counter() - start
+
+    if risque is not None:
+        start = time.perf_counter()
+        serie = _colonne(chunk, ALIAS_DESCRIPTION)
+        descriptions = serie.astype(object).where(serie.notna(), None).tolist() if serie is not None else [None] * n
+        scores = risque.scorer_lot(descriptions)
+        sortie['Risque_Score'] = np.array([s['score'] for s in scores], dtype=np.int64)
+        sortie['Risque_Details'] = ["|".join(d['label'] for d in s['details']) for s in scores]
+        durees['risque_s'] = time.perf_counter() - start
+
+    resultat = pd.concat([chunk.reset_index(drop=True), pd.DataFrame(sortie)], axis=1)
+    return resultat, durees
+
+
+def lire_morceaux(path, chunksize=CHUNKSIZE, nrows=None):
+    """Lecteur par morceaux : colonnes de clé, km et prix en catégories, les autres en texte brut."""
+    categorielles = {nom: 'category' for alias in (*ALIAS_CHAMPS.values(), ALIAS_KM, ALIAS_PRIX) for nom in alias}
+    entete = pd.read_csv(path, sep=';', nrows=0).columns
+    dtype = {nom: categorielles.get(nom, str) for nom in entete}
+    return pd.read_csv(path, sep=';', dtype=dtype, keep_default_na=False, na_values=[''],
+                       chunksize=chunksize, nrows=nrows)
+
+
+# --- POOL DE PROCESSUS ---
+
+_WORKER = {}
+
+
+def _init_worker(seuil, risque):
+    logging.getLogger().setLevel(logging.WARNING)
+    bundle = argus_snapshot.charger_bundle()
+    _WORKER.update(backoff=bundle.backoff, seuil=seuil, risque=_moteur_risque() if risque else None)
+
+
+def _coter_dans_worker(chunk):
+    return coter_morceau(chunk, _WORKER['backoff'], _WORKER['seuil'], _WORKER['risque'])
+
+
+def _moteur_risque():
+    import argus_risque
+    return argus_risque.MoteurRisque.depuis_env().jeu
+
+
+def _morceaux_cotes(reader, workers, backoff, seuil, risque):
+    """Morceaux cotés dans l'ordre d'entrée ; en pool, nombre borné de morceaux en vol."""
+    if workers <= 1:
+        jeu = _moteur_risque() if risque else None
+        for chunk in reader:
+            yield len(chunk), coter_morceau(chunk, backoff, seuil, jeu)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(seuil, risque)) as pool:
+        en_vol = deque()
+        for chunk in reader:
+            en_vol.append((len(chunk), pool.submit(_coter_dans_worker, chunk)))
+            if len(en_vol) >= workers * MORCEAUX_EN_VOL_PAR_WORKER:
+                n, futur = en_vol.popleft()
+                yield n, futur.result()
+        while en_vol:
+            n, futur = en_vol.popleft()
+            yield n, futur.result()
+
+
+# --- ÉCRITURE EN FLUX ---
+
+class EcrivainCSV:
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8', newline='')
+        self.entete = True
+
+    def ecrire(self, df):
+        df.to_csv(self.f, sep=';', index=False, header=self.entete)
+        self.entete = False
+
+    def fermer(self):
+        self.f.close()
+
+
+class EcrivainParquet:
+    """Un row group par morceau (paquet `pyarrow` optionnel)."""
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = path
+        self.writer = None
+
+    def ecrire(self, df):
+        # Texte en `string` : même schéma à chaque morceau (catégories et colonnes entièrement vides incluses)
+        texte = df.select_dtypes(include=['category', 'object']).columns
+        table = self.pa.Table.from_pandas(df.astype({col: "string" for col in texte}), preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def fermer(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def format_sortie(path, format_=None):
+    return format_ or ('parquet' if path.endswith(('.parquet', '.pq')) else 'csv')
+
+
+def balayer(input_path, output_path, chunksize=CHUNKSIZE, workers=1, seuil=SEUIL_SOUS_COTE,
+            flagged_only=False, risque=False, format_=None):
+    """Cote tout le fichier ; écrit les résultats au fil de l'eau et renvoie le rapport de débit."""
+    demarrage = {}
+    bundle = argus_snapshot.charger_bundle(demarrage)
+    if bundle is None:
+        raise FileNotFoundError("Référentiel V21 introuvable")
+
+    format_ = format_sortie(output_path, format_)
+    tmp = f"{output_path}.tmp{os.getpid()}"
+    ecrivain = EcrivainParquet(tmp) if format_ == 'parquet' else EcrivainCSV(tmp)
+    reader = lire_morceaux(input_path, chunksize)
+
+    lignes = ecrites = sous_cote = morceaux = 0
+    statuts, niveaux = Counter(), Counter()
+    durees = Counter()
+    start = time.perf_counter()
+    try:
+        for n, (resultat, durees_morceau) in _morceaux_cotes(reader, workers, bundle.backoff, seuil, risque):
+            durees.update(durees_morceau)
+            lignes += n
+            morceaux += 1
+            statuts.update(resultat['Statut'].value_counts().to_dict())
+            niveaux.update(resultat['Niveau'].dropna().value_counts().to_dict())
+            sous_cote += int(resultat['Sous_Cote'].sum())
+            if flagged_only:
+                resultat = resultat[resultat['Sous_Cote']]
+            t = time.perf_counter()
+            ecrivain.ecrire(resultat)
+            durees['ecriture_s'] += time.perf_counter() - t
+            ecrites += len(resultat)
+            if morceaux % 10 == 0:
+                logger.info(f"   -> {lignes} annonces, {sous_cote} sous la cote "
+                            f"({int(lignes / (time.perf_counter() - start))} lignes/s)")
+        ecrivain.fermer()
+        os.replace(tmp, output_path)
+    except BaseException:
+        ecrivain.fermer()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    duree = time.perf_counter() - start
+
+    return {
+        'fichier': input_path, 'sortie': output_path, 'format': format_,
+        'referentiel': {'version': bundle.version, 'source': bundle.source, 'chargement': demarrage.get('source')},
+        'workers': workers, 'chunksize': chunksize, 'morceaux': morceaux,
+        'lignes': lignes, 'lignes_ecrites': ecrites, 'sous_cote': sous_cote, 'seuil': seuil,
+        'statuts': dict(statuts), 'niveaux': dict(niveaux),
+        'secondes': round(duree, 3), 'lignes_par_s': int(lignes / duree) if duree > 0 else 0,
+        # En pool, durées cumulées des workers (peuvent dépasser la durée totale)
+        'etapes_s': {k: round(v, 3) for k, v in durees.items()},
+        'pic_rss_mo': round(argus_metrics.pic_rss_mo(), 1),
+    }
+
+
+def verifier_parite(input_path, lignes=20_000):
+    """Cotes du balayage == cotes scalaires (BackoffIndex.estimer, comme /predict) sur les premières lignes."""
+    from argus_index import normaliser_cle, lire_km, SegmentInvalide
+    bundle = argus_snapshot.charger_bundle()
+    chunk = next(iter(lire_morceaux(input_path, lignes, nrows=lignes)))
+    resultat, _ = coter_morceau(chunk, bundle.backoff)
+    ecarts = 0
+    for ligne, attendu in zip(chunk.astype(object).to_dict('records'), resultat.itertuples(index=False)):
+        data = {k: v for k, v in ligne.items() if not pd.isna(v)}
+        try:
+            cle, km = normaliser_cle(data, CHAMPS_OPTIONNELS), lire_km(data)
+        except SegmentInvalide:
+            ecarts += attendu.Statut != "invalide"
+            continue
+        result, niveau = bundle.backoff.estimer(cle, km)
+        if result is None:
+            ecarts += attendu.Statut != "introuvable"
+            continue
+        ecarts += (attendu.Statut != "ok" or attendu.Niveau != niveau
+                   or (attendu.Cote_Affinee, attendu.Ajustement_Km, bool(attendu.Prix_Plancher))
+                   != (result.cote_affinee, result.ajustement_km, result.prix_plancher_atteint))
+    return ecarts == 0, len(chunk), int(ecarts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balayage de marché : cote et signalement des annonces d'un CSV")
+    parser.add_argument("--input", required=True, help="Annonces (CSV ';', colonnes du dataset LeBonCoin ou noms ASCII)")
+    parser.add_argument("--output", default="balayage_v21.csv", help="Sortie .csv ou .parquet")
+    parser.add_argument("--format", choices=FORMATS, help="Format de sortie (défaut : d'après l'extension)")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Processus de cotation (défaut : 1, sans pool)")
+    parser.add_argument("--seuil", type=float, default=SEUIL_SOUS_COTE,
+                        help="Signale les annonces dont prix / cote est inférieur au seuil (défaut : 0.7)")
+    parser.add_argument("--flagged-only", action="store_true", help="N'écrit que les annonces sous la cote")
+    parser.add_argument("--risque", action="store_true",
+                        help="Ajoute le score de risque de la colonne Description (argus_risque)")
+    parser.add_argument("--check-parity", type=int, nargs='?', const=20_000, metavar="N",
+                        help="Compare les N premières cotes au calcul scalaire de /predict puis quitte")
+    parser.add_argument("--report", metavar="JSON", help="Écrit aussi le rapport de débit dans ce fichier")
+    args = parser.parse_args()
+
+    if args.check_parity:
+        identique, n, ecarts = verifier_parite(args.input, args.check_parity)
+        logger.info(f"Parité balayage/scalaire : {'OK' if identique else 'ÉCART'} ({n} annonces, {ecarts} écarts)")
+        sys.exit(0 if identique else 1)
+
+    if format_sortie(args.output, args.format) == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            parser.error("sortie Parquet : paquet 'pyarrow' requis (ou sortie .csv)")
+
+    rapport = balayer(args.input, args.output, args.chunksize, args.workers, args.seuil,
+                      args.flagged_only, args.risque, args.format)
+    logger.info(f"Balayage terminé : {rapport['lignes']} annonces en {rapport['secondes']}s "
+                f"({rapport['lignes_par_s']} lignes/s), {rapport['sous_cote']} sous la cote -> {args.output}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
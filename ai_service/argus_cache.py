@@ -0,0 +1,197 @@
+# Fichier: argus_cache.py
+# Cache des réponses /predict : LRU en mémoire du processus, devant un backend partagé optionnel.
+#
+# Clé : (version du référentiel, segment normalisé, km). La version est l'empreinte
+# des fichiers chargés : un nouveau référentiel vide le cache local, et les clés du backend
+# partagé sont préfixées par la version (les anciennes expirent d'elles-mêmes).
+# Par défaut la clé est au km près : une réponse servie du cache est identique à celle calculée
+# (et à /predict/batch, /predict/curve, au balayage). ARGUS_CACHE_KM_BUCKET > 1 regroupe les km
+# par tranche, cotées au milieu de la tranche : meilleur taux de hit, au prix d'une cote approchée
+# (jusqu'à la décote de largeur/2 km) ; à n'activer qu'en connaissance de cause.
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION (surchargée par variables d'environnement) ---
+MAX_ENTRIES = 50_000
+MAX_BYTES = 64 * 1024 * 1024
+KM_BUCKET = 1         # Largeur des tranches de km (1 = clé au km près, sans approximation ; > 1 : opt-in)
+SHARED_TTL = 3600     # Durée de vie des entrées du backend partagé (secondes)
+
+
+def empreinte_fichiers(*paths):
+    """Empreinte SHA-256 (12 caractères) du contenu des fichiers, dans l'ordre donné."""
+    h = hashlib.sha256()
+    for path in paths:
+        if path is None:
+            continue
+        with open(path, 'rb') as f:
+            for bloc in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloc)
+    return h.hexdigest()[:12]
+
+
+def tranche_km(km, largeur=KM_BUCKET):
+    """(clé de tranche, km coté). None = km de référence du segment ; km coté au milieu de la tranche."""
+    if km is None:
+        return None, None
+    if largeur <= 1:
+        return km, km
+    tranche = km // largeur
+    return tranche, tranche * largeur + largeur // 2
+
+
+class LRUCache:
+    """LRU borné en nombre d'entrées et en octets (valeurs : corps JSON sérialisés)."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _synchroniser(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._synchroniser(version)
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, version, key, body):
+        taille = len(body)
+        if taille > self.max_bytes:
+            return
+        with self._lock:
+            self._synchroniser(version)
+            ancien = self._entries.pop(key, None)
+            if ancien is not None:
+                self._bytes -= len(ancien)
+            self._entries[key] = body
+            self._bytes += taille
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, sortie = self._entries.popitem(last=False)
+                self._bytes -= len(sortie)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries), 'bytes': self._bytes,
+            'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+class BackendLocal:
+    """Backend partagé de substitution (dictionnaire du processus), même interface que BackendRedis."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, body, ttl=SHARED_TTL):
+        self.data[key] = body
+
+
+class BackendRedis:
+    """Backend partagé entre workers/instances (paquet `redis` optionnel)."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, body, ttl=SHARED_TTL):
+        self.client.set(key, body, ex=ttl)
+
+
+class CachePrediction:
+    """LRU local + backend partagé optionnel. Les erreurs du backend partagé ne font jamais échouer une requête."""
+
+    def __init__(self, local=None, partage=None, km_bucket=KM_BUCKET):
+        self.local = local if local is not None else LRUCache()
+        self.partage = partage
+        self.km_bucket = km_bucket
+        self.hits_partages = 0
+        self.erreurs_partagees = 0
+
+    @classmethod
+    def depuis_env(cls):
+        """ARGUS_CACHE_MAX_ENTRIES (0 = désactivé), ARGUS_CACHE_MAX_BYTES, ARGUS_CACHE_KM_BUCKET, ARGUS_CACHE_URL."""
+        max_entries = int(os.environ.get("ARGUS_CACHE_MAX_ENTRIES", MAX_ENTRIES))
+        if max_entries <= 0:
+            return None
+        local = LRUCache(max_entries, int(os.environ.get("ARGUS_CACHE_MAX_BYTES", MAX_BYTES)))
+        partage = None
+        url = os.environ.get("ARGUS_CACHE_URL")
+        if url:
+            try:
+                partage = BackendRedis(url)
+            except ImportError:
+                logger.warning("ARGUS_CACHE_URL défini mais paquet 'redis' absent : cache local uniquement")
+        return cls(local, partage, int(os.environ.get("ARGUS_CACHE_KM_BUCKET", KM_BUCKET)))
+
+    @staticmethod
+    def _cle_partagee(version, key):
+        return "argus:" + version + ":" + repr(key)
+
+    def get(self, version, key):
+        body = self.local.get(version, key)
+        if body is not None or self.partage is None:
+            return body
+        try:
+            body = self.partage.get(self._cle_partagee(version, key))
+        except Exception:
+            self.erreurs_partagees += 1
+            return None
+        if body is not None:
+            self.hits_partages += 1
+            self.local.set(version, key, body)
+        return body
+
+    def set(self, version, key, body):
+        self.local.set(version, key, body)
+        if self.partage is None:
+            return
+        try:
+            self.partage.set(self._cle_partagee(version, key), body)
+        except Exception:
+            self.erreurs_partagees += 1
+
+    def stats(self):
+        stats = {**self.local.stats(), 'km_bucket': self.km_bucket, 'version': self.local.version}
+        if self.partage is not None:
+            stats['partage'] = {'backend': type(self.partage).__name__, 'hits': self.hits_partages,
+                                'erreurs': self.erreurs_partagees}
+        return stats
@@ -0,0 +1,199 @@
+# Fichier: argus_comparables.py
+# Annonces comparables : les k annonces réelles les plus proches d'un véhicule et leur
+# distribution de prix, là où le référentiel ne donne qu'une médiane par segment (ou rien).
+#
+# Index de type IVF : les annonces nettoyées (imputation + filtre IQR du build) sont triées par
+# (Marque, Modèle), chaque couple formant une liste contiguë ; une requête ne parcourt que la
+# liste de son modèle (à défaut celle de sa marque, contiguë elle aussi) et y calcule toutes les
+# distances en NumPy, sans arbre ni quantification : les listes font au plus quelques dizaines de
+# milliers d'annonces. Caractéristiques float32 à l'échelle (1 unité ~ 1 an d'écart) pour année,
+# km et puissance, et pénalités fixes de désaccord sur énergie, boîte et finition (codes int16).
+# Persistance au format colonnaire d'argus_store : le fichier est memory-mappé au chargement,
+# ses pages sont partagées entre workers gunicorn. Pas de pandas au service.
+#
+# Usage : python argus_comparables.py [--input leboncoin_FINAL_PLATINUM_V16.csv] [--output argus_comparables_v21.cols]
+# (construit aussi par ArgusBuilder ; benchmark : benchmarks/bench_comparables.py)
+
+import os
+import logging
+import argparse
+
+import numpy as np
+
+import argus_store
+from argus_index import SegmentInvalide, normaliser_cle, lire_km
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_COMPARABLES = "argus_comparables_v21" + argus_store.COLUMNAR_EXT
+FORMAT_COMPARABLES = 1
+
+K_DEFAUT = 10
+K_MAX = 100
+# Échelles des caractéristiques numériques : un écart d'une échelle compte comme un an d'écart
+ECHELLE_ANNEE = 1.0
+ECHELLE_KM = 20_000.0
+ECHELLE_PUISSANCE = 15.0
+# Pénalités de désaccord (en années équivalentes) sur les champs catégoriels
+PENALITES = {'Énergie': 4.0, 'Boîte': 2.0, 'Finition': 1.5}
+# Écart compté pour une caractéristique inconnue de l'annonce (puissance 0 non imputée)
+PENALITE_INCONNUE = 1.0
+
+CATEGORIELS = tuple(PENALITES)
+CHAMPS_REQUETE_OPTIONNELS = ('Année', 'Puissance', 'Énergie', 'Boîte', 'Finition')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPARABLES_CANDIDATS = (os.path.join(BASE_DIR, OUTPUT_COMPARABLES),)
+
+
+def trouver_comparables():
+    return os.environ.get("ARGUS_COMPARABLES") or next((p for p in COMPARABLES_CANDIDATS if os.path.exists(p)), None)
+
+
+# --- CONSTRUCTION (build) ---
+
+def colonnes_annonces(df):
+    """Colonnes à persister depuis les annonces nettoyées (DataFrame), triées par (Marque, Modèle)."""
+    df = df[(df['Prix'] > 0) & (df['Année'] > 0)]
+    ordre = np.lexsort((df['Modèle'].to_numpy(dtype=str), df['Marque'].to_numpy(dtype=str)))
+    colonnes = {col: df[col].to_numpy(dtype=str)[ordre] for col in ('Marque', 'Modèle') + CATEGORIELS}
+    colonnes['Année'] = df['Année'].to_numpy()[ordre].astype(np.int16)
+    colonnes['Kilométrage'] = df['Kilométrage'].to_numpy()[ordre].clip(0, np.iinfo(np.int32).max).astype(np.int32)
+    colonnes['Puissance'] = df['Puissance'].to_numpy()[ordre].astype(np.int16)
+    colonnes['Prix'] = df['Prix'].to_numpy()[ordre].clip(0, np.iinfo(np.int32).max).astype(np.int32)
+    # Caractéristiques précalculées : aucune conversion au chargement, tout reste memory-mappé
+    colonnes['f_annee'] = (colonnes['Année'] / ECHELLE_ANNEE).astype(np.float32)
+    colonnes['f_km'] = (colonnes['Kilométrage'] / ECHELLE_KM).astype(np.float32)
+    colonnes['f_puissance'] = np.where(colonnes['Puissance'] > 0, colonnes['Puissance'] / ECHELLE_PUISSANCE,
+                                       np.nan).astype(np.float32)
+    return colonnes
+
+
+def ecrire_index(df, path=OUTPUT_COMPARABLES, meta=None):
+    colonnes = colonnes_annonces(df)
+    argus_store.ecrire_colonnes(colonnes, path, meta={'format': FORMAT_COMPARABLES, **(meta or {})})
+    return len(colonnes['Prix'])
+
+
+# --- INDEX (service) ---
+
+def _plages(codes):
+    """{code: (début, fin)} des suites contiguës d'un tableau de codes trié par groupe."""
+    if not len(codes):
+        return {}
+    debuts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    fins = np.r_[debuts[1:], len(codes)]
+    return dict(zip(codes[debuts].tolist(), zip(debuts.tolist(), fins.tolist())))
+
+
+class IndexComparables:
+    """Annonces memory-mappées + listes (Marque, Modèle) et Marque. Lecture seule, partageable entre threads."""
+
+    def __init__(self, path):
+        self.table = argus_store.charger_colonnes(path)
+        if self.table.meta.get('format') != FORMAT_COMPARABLES:
+            raise ValueError(f"{path} : format de comparables {self.table.meta.get('format')} non supporté")
+        self.source = os.path.basename(path)
+        t = self.table
+        self.categories = {col: t.categories(col) for col in ('Marque', 'Modèle') + CATEGORIELS}
+        self.codes = {col: t.codes(col) for col in ('Marque', 'Modèle') + CATEGORIELS}
+        self.annee, self.km, self.puissance, self.prix = t['Année'], t['Kilométrage'], t['Puissance'], t['Prix']
+        self.f_annee, self.f_km, self.f_puissance = t['f_annee'], t['f_km'], t['f_puissance']
+
+        # Listes de l'IVF : une par marque, une par (marque, modèle) ; contiguës grâce au tri du build
+        marques = self.codes['Marque'].astype(np.int64)
+        self.plages_marque = _plages(marques)
+        n_modeles = len(self.categories['Modèle'])
+        self.plages_modele = _plages(marques * n_modeles + self.codes['Modèle'])
+        self._n_modeles = n_modeles
+
+    def __len__(self):
+        return len(self.table)
+
+    def _code(self, col, valeur):
+        """Code de `valeur` dans la table des catégories (-1 si inconnue)."""
+        cats = self.categories[col]
+        i = int(np.searchsorted(cats, valeur))
+        return i if i < len(cats) and cats[i] == valeur else -1
+
+    def plage(self, marque, modele):
+        """(début, fin, niveau) de la liste à parcourir, ou None si la marque est inconnue."""
+        m = self._code('Marque', marque)
+        if m < 0:
+            return None
+        mo = self._code('Modèle', modele)
+        if mo >= 0 and (m * self._n_modeles + mo) in self.plages_modele:
+            return (*self.plages_modele[m * self._n_modeles + mo], 'modele')
+        return (*self.plages_marque[m], 'marque')
+
+    def distances(self, debut, fin, annee=None, km=None, puissance=None, categoriels=None):
+        """Distances² de la requête aux annonces [début, fin) ; un champ absent ne compte pas."""
+        d2 = np.zeros(fin - debut, dtype=np.float32)
+        for f, valeur, echelle in ((self.f_annee, annee, ECHELLE_ANNEE), (self.f_km, km, ECHELLE_KM),
+                                   (self.f_puissance, puissance, ECHELLE_PUISSANCE)):
+            if valeur is not None:
+                ecart = f[debut:fin] - np.float32(valeur / echelle)
+                d2 += np.nan_to_num(ecart * ecart, copy=False, nan=PENALITE_INCONNUE ** 2)
+        for col, code in (categoriels or {}).items():
+            d2 += np.float32(PENALITES[col] ** 2) * (self.codes[col][debut:fin] != code)
+        return d2
+
+    def chercher(self, marque, modele, annee=None, km=None, puissance=None, energie=None, boite=None,
+                 finition=None, k=K_DEFAUT):
+        """(indices des k plus proches triés par distance, distances, niveau) ou None."""
+        plage = self.plage(marque, modele)
+        if plage is None:
+            return None
+        debut, fin, niveau = plage
+        categoriels = {col: self._code(col, v) for col, v in zip(CATEGORIELS, (energie, boite, finition))
+                       if v is not None}
+        d2 = self.distances(debut, fin, annee, km, puissance, categoriels)
+        k = min(k, len(d2))
+        proches = np.argpartition(d2, k - 1)[:k] if k < len(d2) else np.arange(len(d2))
+        proches = proches[np.lexsort((proches, d2[proches]))]  # Ex aequo : ordre du fichier
+        return debut + proches, np.sqrt(d2[proches]), niveau
+
+    def annonces(self, indices, distances):
+        cats = self.categories
+        return [{
+            'Marque': str(cats['Marque'][self.codes['Marque'][i]]),
+            'Modèle': str(cats['Modèle'][self.codes['Modèle'][i]]),
+            'Année': int(self.annee[i]), 'Kilométrage': int(self.km[i]), 'Puissance': int(self.puissance[i]),
+            'Énergie': str(cats['Énergie'][self.codes['Énergie'][i]]),
+            'Boîte': str(cats['Boîte'][self.codes['Boîte'][i]]),
+            'Finition': str(cats['Finition'][self.codes['Finition'][i]]),
+            'Prix': int(self.prix[i]), 'distance': round(float(d), 4),
+        } for i, d in zip(indices.tolist(), distances.tolist())]
+
+
+def distribution_prix(prix):
+    prix = np.asarray(prix, dtype=np.float64)
+    if not len(prix):
+        return None
+    q = np.percentile(prix, [0, 25, 50, 75, 100])
+    return {'count': int(len(prix)), 'min': int(q[0]), 'p25': int(round(q[1])), 'median': int(round(q[2])),
+            'p75': int(round(q[3])), 'max': int(q[4]), 'mean': int(round(prix.mean()))}
+
+
+def lire_requete(data):
+    """(arguments de chercher, k) depuis un JSON /predict + k ; Marque et Modèle obligatoires."""
+    cle = normaliser_cle(data, CHAMPS_REQUETE_OPTIONNELS)
+    marque, modele, annee, puissance, energie, boite, finition = cle
+    k = data.get('k', K_DEFAUT)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= K_MAX:
+        raise SegmentInvalide(f"k doit être un entier entre 1 et {K_MAX}")
+    return dict(marque=marque, modele=modele, annee=annee, km=lire_km(data), puissance=puissance,
+                energie=energie, boite=boite, finition=finition), k
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index des annonces comparables servi par /comparables")
+    parser.add_argument("--input", default=None, help="Dataset LeBonCoin (défaut : celui d'ArgusBuilder)")
+    parser.add_argument("--output", default=OUTPUT_COMPARABLES)
+    args = parser.parse_args()
+
+    from ArgusBuilder import ArgusEngine, INPUT_FILE
+    engine = ArgusEngine(args.input or INPUT_FILE)
+    engine.charger_donnees()
+    engine._impute_missing_powers()
+    engine.sauvegarder_comparables(args.output)
@@ -0,0 +1,216 @@
+# Fichier: argus_courbes.py
+# Courbes prix / km précalculées par segment (voir courbes_prix dans argus_index).
+#
+# Pour un segment, la cote en fonction du kilométrage est affine par morceaux : bonus plafonné
+# sous le km de référence, trois paliers de décote, plancher. Le build en exporte une forme
+# compacte (pentes, km de rupture dont le plafond de bonus et l'entrée dans le plancher) ;
+# le service l'évalue en tableau sur autant de km que voulu (SegmentIndex.estimer_lot, /predict/curve).
+#
+# La cote doit rester exactement celle de calculer_prix_final : --check-properties tire des
+# segments aléatoires (décotes nulles, positives, cotes sous le plancher, très grands écarts de km)
+# et les km autour de chaque rupture, puis compare courbe, version scalaire et version tableau,
+# ainsi que tous les segments du référentiel sur une grille de km et l'aller-retour par l'export.
+#
+# Usage : python argus_courbes.py --check-properties 20000 [--seed 0] [--referentiel chemin]
+#         python argus_courbes.py --export [argus_courbes_v21.cols] [--referentiel chemin]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import argus_store
+from argus_index import (
+    SegmentIndex, SegmentInvalide, PALIERS_KM, DELTA_MAX, MIN_PRICE_FLOOR,
+    calculer_prix_final, calculer_prix_final_vectorise, courbes_prix, evaluer_courbes
+)
+
+OUTPUT_COURBES = "argus_courbes_v21" + argus_store.COLUMNAR_EXT
+# Grille de km de /predict/curve sans liste explicite
+KM_MAX_DEFAUT = 300000
+PAS_KM_DEFAUT = 10000
+MAX_POINTS = 10000
+# Grille de la vérification sur le référentiel réel
+GRILLE_VERIFICATION = np.arange(0, 600001, 2500)
+
+
+def points_rupture(courbes, i):
+    """Km (>= 0) où la courbe du segment `i` change de pente, avec la cote en ces points."""
+    km_ref = int(courbes['km_ref'][i])
+    ruptures = [(km_ref + d, 'palier') for d in PALIERS_KM[1:]]
+    if courbes['seuil_bonus'][i] > -DELTA_MAX:
+        ruptures.append((km_ref + int(courbes['seuil_bonus'][i]), 'plafond_bonus'))
+    if courbes['seuil_plancher'][i] <= DELTA_MAX:
+        ruptures.append((km_ref + int(courbes['seuil_plancher'][i]), 'plancher'))
+    ruptures = sorted((km, nature) for km, nature in ruptures if km >= 0)
+    kms = np.array([km for km, _ in ruptures], dtype=np.int64)
+    final, _, floored = evaluer_courbes(courbes, np.full(len(kms), i), kms)
+    return [{"km": km, "price": p, "type": nature, "floored": f}
+            for (km, nature), p, f in zip(ruptures, final.tolist(), floored.tolist())]
+
+
+def lire_grille_km(data):
+    """Km demandés à /predict/curve : liste "kms", ou grille km_min / km_max / step."""
+    kms = data.get('kms')
+    if kms is None:
+        try:
+            debut, fin, pas = (int(data.get(k, d)) for k, d in
+                               (('km_min', 0), ('km_max', KM_MAX_DEFAUT), ('step', PAS_KM_DEFAUT)))
+        except (TypeError, ValueError):
+            raise SegmentInvalide("km_min, km_max et step doivent être des entiers")
+        if pas <= 0 or debut < 0 or fin < debut:
+            raise SegmentInvalide("Grille de km invalide (0 <= km_min <= km_max, step > 0)")
+        if (fin - debut) // pas + 1 > MAX_POINTS:
+            raise SegmentInvalide(f"Trop de points (max {MAX_POINTS})")
+        return np.arange(debut, fin + 1, pas, dtype=np.int64)
+    if not isinstance(kms, list) or len(kms) > MAX_POINTS:
+        raise SegmentInvalide(f"kms doit être une liste d'au plus {MAX_POINTS} kilométrages")
+    if not all(isinstance(k, int) and not isinstance(k, bool) and 0 <= k < DELTA_MAX for k in kms):
+        raise SegmentInvalide("kms : entiers positifs attendus")
+    return np.array(kms, dtype=np.int64)
+
+
+# --- EXPORT ---
+
+def colonnes_courbes(index):
+    """Clé de segment + forme compacte de la courbe de chaque ligne d'un SegmentIndex."""
+    c = index.courbes
+    colonnes = {col: np.asarray(index.colonnes[col]) for col in index.key_cols}
+    colonnes.update({
+        'Cote_Reference': c['cote'], 'Km_Reference': c['km_ref'],
+        'Pente_Bonus': c['pente'][:, 0], 'Pente_Palier_2': c['pente'][:, 2], 'Pente_Palier_3': c['pente'][:, 3],
+        'Km_Plafond_Bonus': c['km_ref'] + c['seuil_bonus'], 'Prix_Plafond_Bonus': c['cote'] + c['bonus_max'],
+        'Km_Plancher': c['km_ref'] + c['seuil_plancher'], 'Prix_Plancher': c['plancher'],
+        'Plancher_Bas': c['plancher_bas'],
+    })
+    return colonnes
+
+
+def ecrire_courbes(index, path=OUTPUT_COURBES, meta=None):
+    argus_store.ecrire_colonnes(colonnes_courbes(index), path, meta={'source': index.source, **(meta or {})})
+    return len(index)
+
+
+def charger_courbes(path=OUTPUT_COURBES):
+    """Courbes lues depuis l'export, évaluables par evaluer_courbes (ordonnées recalculées à l'identique)."""
+    table = argus_store.charger_colonnes(path)
+    coef = np.asarray(table['Pente_Bonus'], dtype=np.float64)
+    courbes = courbes_prix(np.asarray(table['Cote_Reference']), np.asarray(table['Km_Reference']), coef)
+    # Seuils repris de l'export (pas de recherche) : contrôlés contre ceux recalculés par --check-properties
+    courbes_export = dict(courbes)
+    courbes_export['seuil_bonus'] = np.asarray(table['Km_Plafond_Bonus']) - courbes['km_ref']
+    courbes_export['seuil_plancher'] = np.asarray(table['Km_Plancher']) - courbes['km_ref']
+    return courbes_export, courbes
+
+
+# --- VÉRIFICATION ---
+
+def segments_aleatoires(n, rng):
+    """Segments couvrant les cas limites : cote nulle ou sous le plancher, décote nulle, positive, forte."""
+    cote = np.select(
+        [rng.random(n) < 0.05, rng.random(n) < 0.15, rng.random(n) < 0.2, rng.random(n) < 0.05],
+        [np.zeros(n), rng.integers(1, MIN_PRICE_FLOOR + 1, n), rng.integers(3000, 3700, n),
+         rng.integers(10 ** 6, 10 ** 8, n)],
+        rng.integers(800, 120000, n)).astype(np.int64)
+    coef = np.select(
+        [rng.random(n) < 0.05, rng.random(n) < 0.03, rng.random(n) < 0.1, rng.random(n) < 0.1],
+        [np.zeros(n), np.full(n, -0.0), rng.uniform(0, 0.3, n), rng.uniform(-20, -0.15, n)],
+        np.round(rng.uniform(-0.15, -0.005, n), 5))
+    km_ref = np.where(rng.random(n) < 0.05, 0, rng.integers(0, 400000, n)).astype(np.int64)
+    return cote, km_ref, coef
+
+
+def km_sondes(courbes, rng, tirages=8):
+    """Pour chaque segment : km aléatoires (jusqu'à 2^40) et km de part et d'autre de chaque rupture."""
+    n = len(courbes['cote'])
+    km_ref = courbes['km_ref'][:, None]
+    ruptures = np.concatenate([np.broadcast_to(np.array(PALIERS_KM[1:]), (n, 3)),
+                               courbes['seuil_bonus'][:, None], courbes['seuil_plancher'][:, None]], axis=1)
+    ruptures = np.clip(ruptures, -DELTA_MAX // 2, DELTA_MAX // 2)
+    autour = (km_ref[:, :, None] + ruptures[:, :, None] + np.array([-1, 0, 1])).reshape(n, -1)
+    hasard = np.concatenate([rng.integers(0, 10 ** 6, (n, tirages)), rng.integers(0, 2 ** 40, (n, 2))], axis=1)
+    return np.concatenate([autour, hasard, km_ref], axis=1)
+
+
+def _comparer(courbes, lignes, kms, reference):
+    obtenu = evaluer_courbes(courbes, lignes, kms)
+    return int(sum(np.count_nonzero(a != b) for a, b in zip(obtenu, reference)))
+
+
+def verifier_proprietes(n, seed=0, referentiel_path=None):
+    rng = np.random.default_rng(seed)
+    rapport = {}
+
+    # 1. Segments aléatoires x km de rupture : scalaire (référence), tableau et courbes
+    cote, km_ref, coef = segments_aleatoires(n, rng)
+    start = time.perf_counter()
+    courbes = courbes_prix(cote, km_ref, coef)
+    construction_s = time.perf_counter() - start
+    kms = km_sondes(courbes, rng)
+    lignes = np.broadcast_to(np.arange(n)[:, None], kms.shape)
+    scalaire = [calculer_prix_final(int(cote[i]), int(km_ref[i]), int(k), float(coef[i]))
+                for i, k in zip(lignes.ravel().tolist(), kms.ravel().tolist())]
+    scalaire = tuple(np.array(v).reshape(kms.shape) for v in zip(*scalaire))
+    vectorise = calculer_prix_final_vectorise(cote[lignes], km_ref[lignes], kms, coef[lignes])
+    rapport['aleatoire'] = {
+        'segments': n, 'evaluations': int(kms.size), 'construction_ms': round(construction_s * 1000, 2),
+        'ecarts_scalaire': _comparer(courbes, lignes, kms, scalaire),
+        'ecarts_vectorise': _comparer(courbes, lignes, kms, vectorise),
+        'plancher_atteint': int(scalaire[2].sum()), 'plafond_bonus': int((courbes['seuil_bonus'] > -DELTA_MAX).sum()),
+    }
+
+    # 2. Référentiel réel (tous les segments) x grille de km, et aller-retour par l'export
+    path = referentiel_path or _referentiel_defaut()
+    if path:
+        index = SegmentIndex.depuis_fichier(path)
+        lignes = np.arange(len(index))[:, None]
+        grille = GRILLE_VERIFICATION[None, :]
+        vectorise = calculer_prix_final_vectorise(index.cote[lignes], index.km_ref[lignes], grille, index.decote[lignes])
+        export = os.path.join(os.environ.get("TMPDIR", "/tmp"), f"argus_courbes_check_{os.getpid()}{argus_store.COLUMNAR_EXT}")
+        try:
+            ecrire_courbes(index, export)
+            courbes_export, courbes_relues = charger_courbes(export)
+        finally:
+            if os.path.exists(export): os.remove(export)
+        rapport['referentiel'] = {
+            'source': index.source, 'segments': len(index), 'evaluations': int(len(index) * grille.size),
+            'ecarts_vectorise': _comparer(index.courbes, lignes, grille, vectorise),
+            'ecarts_export': _comparer(courbes_export, lignes, grille, vectorise),
+            'export_identique': all(np.array_equal(courbes_export[k], index.courbes[k])
+                                    and np.array_equal(courbes_relues[k], index.courbes[k]) for k in index.courbes),
+        }
+    rapport['ok'] = all(r.get('ecarts_scalaire', 0) == 0 and r['ecarts_vectorise'] == 0 and r.get('ecarts_export', 0) == 0
+                        and r.get('export_identique', True) for r in rapport.values())
+    return rapport
+
+
+def _referentiel_defaut():
+    from argus_snapshot import trouver_referentiel  # import différé : argus_snapshot charge le service
+    return trouver_referentiel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Courbes prix / km précalculées par segment")
+    parser.add_argument("--check-properties", type=int, metavar="N",
+                        help="Vérifie l'égalité exacte avec calculer_prix_final sur N segments aléatoires puis quitte")
+    parser.add_argument("--export", nargs='?', const=OUTPUT_COURBES, metavar="CHEMIN",
+                        help=f"Écrit les courbes du référentiel (défaut : {OUTPUT_COURBES})")
+    parser.add_argument("--referentiel", help="Référentiel (CSV ou .cols) ; défaut : celui du service")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.check_properties:
+        rapport = verifier_proprietes(args.check_properties, args.seed, args.referentiel)
+        print(json.dumps(rapport, indent=2, ensure_ascii=False))
+        sys.exit(0 if rapport['ok'] else 1)
+    if args.export:
+        source = args.referentiel or _referentiel_defaut()
+        if not source:
+            parser.error("Aucun référentiel trouvé (--referentiel)")
+        n = ecrire_courbes(SegmentIndex.depuis_fichier(source), args.export)
+        print(f"{n} courbes écrites : {args.export}")
+    else:
+        parser.print_help()
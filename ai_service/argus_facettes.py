@@ -0,0 +1,101 @@
+# Fichier: argus_facettes.py
+# Index de navigation par facettes du référentiel V21 (cascade Marque -> ... -> Finition).
+#
+# Construit une fois au chargement : chaque préfixe de la cascade pointe vers la liste triée des
+# options suivantes, et un index de n-grammes sert l'autocomplétion des marques et modèles
+# (même sémantique « contient » que str.contains). Chaque étape devient une lecture de dictionnaire.
+# Pas de pandas : colonnes NumPy telles que fournies par argus_index.charger_colonnes_referentiel.
+
+import numpy as np
+
+from argus_index import ALIAS_CHAMPS, SegmentInvalide
+
+# Ordre de la cascade (différent de SEGMENT_COLS : la puissance se choisit après la boîte)
+CASCADE = ['Marque', 'Modèle', 'Année', 'Énergie', 'Boîte', 'Puissance', 'Finition']
+RECHERCHE_COLS = ('Marque', 'Modèle')
+NGRAM = 3  # Sous-chaînes de longueur <= NGRAM indexées telles quelles ; au-delà, intersection puis vérification
+
+
+def lire_selection(data):
+    """
+    Sélection de cascade depuis une requête (noms accentués ou ASCII, mêmes normalisations que
+    normaliser_cle). Les champs doivent être renseignés dans l'ordre de CASCADE, sans trou.
+    """
+    selection = []
+    for col in CASCADE:
+        valeur = next((data.get(nom) for nom in ALIAS_CHAMPS[col] if data.get(nom) not in (None, "")), None)
+        if valeur is None:
+            break
+        if col in ('Année', 'Puissance'):
+            try:
+                valeur = int(valeur)
+            except (TypeError, ValueError):
+                raise SegmentInvalide(f"Champ numérique invalide : {col}={valeur!r}")
+        else:
+            valeur = str(valeur).upper().strip()
+        selection.append(valeur)
+    for col in CASCADE[len(selection) + 1:]:
+        if any(data.get(nom) not in (None, "") for nom in ALIAS_CHAMPS[col]):
+            raise SegmentInvalide(f"{col} renseigné sans {CASCADE[len(selection)]}")
+    return tuple(selection)
+
+
+class FacetIndex:
+    """Options triées par préfixe de cascade + autocomplétion par n-grammes."""
+
+    def __init__(self, colonnes):
+        valeurs = [np.asarray(colonnes[c]).tolist() for c in CASCADE]
+        self.lignes = {}
+        ensembles = {}
+        for i, cle in enumerate(zip(*valeurs)):
+            self.lignes.setdefault(cle, i)
+            for d in range(len(CASCADE)):
+                ensembles.setdefault(cle[:d], set()).add(cle[d])
+        self.options_par_prefixe = {prefixe: sorted(opts) for prefixe, opts in ensembles.items()}
+
+        self.ngrammes = {}
+        for champ in RECHERCHE_COLS:
+            index = {}
+            for nom in set(valeurs[CASCADE.index(champ)]):
+                for sous_chaine in self._ngrammes(nom):
+                    index.setdefault(sous_chaine, set()).add(nom)
+            self.ngrammes[champ] = index
+        self._modeles_par_marque = {prefixe[0]: frozenset(opts) for prefixe, opts in ensembles.items() if len(prefixe) == 1}
+
+    @staticmethod
+    def _ngrammes(nom):
+        n = len(nom)
+        return {nom[i:i + k] for k in range(1, NGRAM + 1) for i in range(n - k + 1)}
+
+    def __len__(self):
+        return len(self.lignes)
+
+    def champ_suivant(self, selection):
+        return CASCADE[len(selection)] if len(selection) < len(CASCADE) else None
+
+    def options(self, selection=()):
+        """Options triées du champ suivant la sélection (tuple dans l'ordre CASCADE), None si préfixe inconnu."""
+        return self.options_par_prefixe.get(tuple(selection))
+
+    def ligne(self, cle):
+        """Ligne du référentiel pour une clé complète (ordre CASCADE), None si absente."""
+        return self.lignes.get(tuple(cle))
+
+    def rechercher(self, champ, texte, marque=None):
+        """
+        Noms de `champ` (Marque ou Modèle) contenant `texte`, triés.
+        Pour les modèles, `marque` restreint aux modèles de cette marque.
+        """
+        index = self.ngrammes[champ]
+        texte = texte.upper()
+        if len(texte) <= NGRAM:
+            noms = index.get(texte, ())
+        else:
+            postings = [index.get(texte[i:i + NGRAM], ()) for i in range(len(texte) - NGRAM + 1)]
+            postings.sort(key=len)
+            noms = set(postings[0]).intersection(*postings[1:]) if postings[0] else ()
+            noms = [nom for nom in noms if texte in nom]
+        if marque is not None and champ == 'Modèle':
+            modeles = self._modeles_par_marque.get(marque, frozenset())
+            noms = [nom for nom in noms if nom in modeles]
+        return sorted(noms)
@@ -0,0 +1,384 @@
+# Fichier: argus_incremental.py
+# Mise à jour incrémentale du référentiel V21 à partir de lots de nouvelles annonces.
+#
+# Principe : pour chaque segment on conserve sur disque des statistiques suffisantes
+# (n, somme km, somme prix, somme km², somme km·prix, somme prix²) ventilées par "cellule" de prix.
+# Tant qu'un segment a moins de SKETCH_CAPACITY prix distincts, chaque cellule correspond
+# à un prix exact : médiane, quartiles, filtre IQR et régression sont alors reproduits
+# exactement. Au-delà, les cellules voisines sont fusionnées par rang (sketch de quantiles
+# fusionnable) et le résultat devient approché.
+
+import os
+import sys
+import argparse
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import argus_regression
+from ArgusBuilder import (
+    ArgusEngine, INPUT_FILE, OUTPUT_DB, SEGMENT_COLS, IMPUTATION_COLS,
+    MIN_SAMPLES_FOR_VALIDITY, IQR_THRESHOLD
+)
+
+logger = logging.getLogger("ArgusIncremental")
+
+# --- CONFIGURATION ---
+STATS_FILE = "argus_stats_v21.npz"
+STATS_FORMAT_VERSION = 2  # 2 : ajout de sum_prix2 (incertitude par segment)
+SKETCH_CAPACITY = 256  # Nb max de cellules de prix conservées par segment
+
+CELL_COLS = ['n', 'sum_km', 'sum_prix', 'sum_km2', 'sum_km_prix', 'sum_prix2']
+
+# Tolérances annoncées pour l'écart incrémental vs reconstruction complète
+TOLERANCE_COTE = 0.02     # 2% d'écart relatif sur Cote_Reference
+TOLERANCE_KM = 0.02       # 2% d'écart relatif sur Km_Reference
+TOLERANCE_DECOTE = 0.005  # 0.005 €/km d'écart absolu sur Decote_par_Km
+TOLERANCE_COUVERTURE = 0.99  # Part minimale des segments dans les tolérances
+
+
+def _quantiles_par_segment(seg, prix, n, n_groups, qs):
+    """
+    Quantiles (interpolation linéaire, comme pandas) de chaque segment à partir de cellules
+    (prix, effectif) triées par segment puis par prix.
+    """
+    cum = np.cumsum(n)
+    total = np.bincount(seg, weights=n, minlength=n_groups).astype(np.int64)
+    offset = np.cumsum(total) - total
+
+    def valeur(rang):
+        idx = np.searchsorted(cum, offset + rang, side='right')
+        return prix[np.minimum(idx, len(prix) - 1)]
+
+    resultats = []
+    for q in qs:
+        pos = q * (total - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(total - 1, 0))
+        t = pos - lo
+        a, b = valeur(lo), valeur(hi)
+        # Même formule que numpy (lerp stable), pour rester identique à Series.quantile
+        diff = b - a
+        resultats.append(np.where(t >= 0.5, b - diff * (1 - t), a + diff * t))
+    return resultats, total
+
+
+class StatsSegments:
+    """Statistiques suffisantes par segment (fusionnables) + comptages de puissance pour l'imputation."""
+
+    # Colonnes identifiant un segment dans les cellules (une clé compacte unique en mode flux)
+    CLES = SEGMENT_COLS
+
+    def __init__(self, cellules=None, puissances=None):
+        self.cellules = cellules if cellules is not None else pd.DataFrame(columns=self.CLES + ['Prix'] + CELL_COLS)
+        self.puissances = puissances if puissances is not None else pd.DataFrame(columns=IMPUTATION_COLS + ['Puissance', 'n'])
+
+    # --- CONSTRUCTION ---
+
+    @staticmethod
+    def comptes_puissances(df):
+        """Comptages des puissances non nulles par groupe d'imputation (avant imputation)."""
+        d = df.loc[df['Puissance'] > 0, IMPUTATION_COLS + ['Puissance']].dropna()
+        return d.groupby(IMPUTATION_COLS + ['Puissance'], as_index=False).size().rename(columns={'size': 'n'})
+
+    @classmethod
+    def cellules_depuis_df(cls, df):
+        """Agrège des annonces normalisées et imputées en cellules (segment, prix)."""
+        d = df[cls.CLES + ['Prix', 'Kilométrage']].dropna(subset=cls.CLES)
+        km = d['Kilométrage'].to_numpy(dtype=np.int64)
+        prix = d['Prix'].to_numpy(dtype=np.int64)
+        d = d[cls.CLES].assign(
+            Prix=prix.astype(np.float64), n=np.int64(1), sum_km=km, sum_prix=prix,
+            sum_km2=km * km, sum_km_prix=km * prix, sum_prix2=prix * prix
+        )
+        return d.groupby(cls.CLES + ['Prix'], as_index=False, sort=True)[CELL_COLS].sum()
+
+    def ajouter(self, df_brut):
+        """
+        Ajoute des annonces normalisées (non imputées) : imputation des puissances avec les
+        comptages cumulés, puis fusion des cellules. Retourne les clés des segments touchés.
+        """
+        nouvelles_puissances = self.comptes_puissances(df_brut)
+        self.puissances = self._fusionner_puissances(self.puissances, nouvelles_puissances)
+        df = self.imputer(df_brut)
+        nouvelles = self.cellules_depuis_df(df)
+        self.cellules = self._fusionner_cellules(self.cellules, nouvelles)
+        return nouvelles[SEGMENT_COLS].drop_duplicates()
+
+    def accumuler(self, morceaux):
+        """
+        Accumule des morceaux d'annonces normalisées SANS imputation (puissance brute dans la clé).
+        À compléter par imputer_cellules() une fois tous les morceaux vus.
+        """
+        puissances = [self.comptes_puissances(m) for m in morceaux]
+        cellules = [self.cellules_depuis_df(m) for m in morceaux]
+        for p in puissances:
+            self.puissances = self._fusionner_puissances(self.puissances, p)
+        if cellules:
+            self.cellules = self._fusionner_cellules(self.cellules, pd.concat(cellules, ignore_index=True))
+
+    def imputer(self, df):
+        """Même règle que ArgusEngine._impute_missing_powers (mode, plus petite valeur en cas d'égalité)."""
+        if self.puissances.empty:
+            return df
+        modes = (self.puissances
+                 .sort_values(IMPUTATION_COLS + ['n', 'Puissance'], ascending=[True] * len(IMPUTATION_COLS) + [False, True])
+                 .drop_duplicates(IMPUTATION_COLS)
+                 .set_index(IMPUTATION_COLS)['Puissance']
+                 .rename('Puissance_Mode'))
+        df = df.join(modes, on=IMPUTATION_COLS)
+        mask = (df['Puissance'] == 0) & (df['Puissance_Mode'] > 0)
+        df.loc[mask, 'Puissance'] = df.loc[mask, 'Puissance_Mode'].astype(df['Puissance'].dtype)
+        return df.drop(columns=['Puissance_Mode'])
+
+    @staticmethod
+    def _fusionner_puissances(a, b):
+        if a.empty: return b
+        if b.empty: return a
+        return pd.concat([a, b], ignore_index=True).groupby(IMPUTATION_COLS + ['Puissance'], as_index=False)['n'].sum()
+
+    @classmethod
+    def _fusionner_cellules(cls, a, b):
+        if a.empty: return cls._compresser(b)
+        if b.empty: return a
+        cells = pd.concat([a, b], ignore_index=True)
+        cells = cells.groupby(cls.CLES + ['Prix'], as_index=False, sort=True)[CELL_COLS].sum()
+        return cls._compresser(cells)
+
+    @classmethod
+    def _compresser(cls, cells, capacite=SKETCH_CAPACITY):
+        """Fusionne par rang les cellules des segments qui dépassent la capacité du sketch."""
+        seg = cells.groupby(cls.CLES, sort=True).ngroup().to_numpy()
+        nb_cellules = np.bincount(seg)
+        trop = nb_cellules[seg] > capacite
+        if not trop.any():
+            return cells
+
+        gros = cells[trop].copy()
+        n = gros['n'].to_numpy()
+        seg_gros = seg[trop]
+        total = np.bincount(seg_gros, weights=n)[seg_gros]
+        avant = gros.groupby(seg_gros)['n'].cumsum().to_numpy() - n
+        gros['_bucket'] = (avant * capacite // total).astype(np.int64)
+        gros = gros.groupby(cls.CLES + ['_bucket'], as_index=False, sort=True)[CELL_COLS].sum()
+        gros['Prix'] = gros['sum_prix'] / gros['n']
+        gros = gros.drop(columns=['_bucket'])
+
+        cells = pd.concat([cells[~trop], gros[cells.columns]], ignore_index=True)
+        return cells.sort_values(cls.CLES + ['Prix'], kind='mergesort').reset_index(drop=True)
+
+    # --- CALCUL DES COTES ---
+
+    def calculer_referentiel(self, segments=None):
+        """
+        Recalcule les cotes (mêmes règles que le build complet) pour tous les segments,
+        ou seulement pour `segments` (DataFrame de clés).
+        """
+        cells = self.cellules
+        if segments is not None:
+            cells = cells.merge(segments, on=self.CLES, how='inner')
+        cells = cells.sort_values(self.CLES + ['Prix'], kind='mergesort').reset_index(drop=True)
+        groups = cells.groupby(self.CLES, sort=True)
+        seg = groups.ngroup().to_numpy()
+        keys = self._decoder_cles(groups.size().index.to_frame(index=False))
+        n_groups = len(keys)
+        prix = cells['Prix'].to_numpy()
+        n = cells['n'].to_numpy()
+
+        # 1. Filtre IQR sur les cellules
+        (q1, q3), taille = _quantiles_par_segment(seg, prix, n, n_groups, (0.25, 0.75))
+        iqr = q3 - q1
+        inlier = (taille[seg] < 5) | ((prix >= (q1 - IQR_THRESHOLD * iqr)[seg]) & (prix <= (q3 + IQR_THRESHOLD * iqr)[seg]))
+        seg, prix, n = seg[inlier], prix[inlier], n[inlier]
+        sums = cells.loc[inlier, CELL_COLS].groupby(seg).sum().reindex(range(n_groups), fill_value=0)
+
+        # 2. Médiane, km moyen, pente exacte (entiers Python) depuis les sommes
+        (mediane,), _ = _quantiles_par_segment(seg, prix, n, n_groups, (0.5,))
+        count = sums['n'].to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            km_moyen = sums['sum_km'].to_numpy() / count
+        nn, sk, sp = (sums[c].to_numpy().astype(object) for c in ('n', 'sum_km', 'sum_prix'))
+        skk, skp, spp = (sums[c].to_numpy().astype(object) for c in ('sum_km2', 'sum_km_prix', 'sum_prix2'))
+        num = nn * skp - sk * sp
+        den = nn * skk - sk * sk
+        pente = np.array([float(a / b) if b > 0 else 0.0 for a, b in zip(num, den)], dtype=np.float64)
+        # Sommes centrées (n·Sxx = n·Σx² - (Σx)², exactes en entiers) pour argus_regression.incertitude
+        centree = lambda a: np.array([float(x / m) if m > 0 else 0.0 for x, m in zip(a, nn)], dtype=np.float64)
+        sxx, sxy, syy = centree(den), centree(num), centree(nn * spp - sp * sp)
+        raw_coef = np.where(count >= 5, pente, -0.05)
+
+        keep = count >= MIN_SAMPLES_FOR_VALIDITY
+        ref = keys[keep].reset_index(drop=True)
+        count = count[keep]
+        ref['Cote_Reference'] = mediane[keep].astype(np.int64)
+        ref['Km_Reference'] = km_moyen[keep].astype(np.int64)
+        ref['Decote_par_Km'] = ArgusEngine._clamp_depreciation_vectorise(raw_coef[keep], ref['Année'].to_numpy())
+        ref['Volume_Annonces'] = count.astype(np.int64)
+        ref['Qualite_Cote'] = np.select([count > 30, count > 10], ["A", "B"], "C")
+        ecart, erreur = argus_regression.incertitude(count, sxx[keep], sxy[keep], syy[keep], ref['Decote_par_Km'].to_numpy())
+        ref['Ecart_Type_Prix'] = np.round(ecart, 2)
+        ref['Erreur_Type_Decote'] = np.round(erreur, 6)
+        return ref
+
+    def _decoder_cles(self, keys):
+        """Clés CLES -> colonnes SEGMENT_COLS (identité hors mode flux)."""
+        return keys
+
+    # --- PERSISTANCE ---
+
+    def sauvegarder(self, path=STATS_FILE):
+        arrays = {'format_version': np.array(STATS_FORMAT_VERSION)}
+        for prefix, table in (('cell', self.cellules), ('puis', self.puissances)):
+            for col in table.columns:
+                values = table[col]
+                arrays[f"{prefix}__{col}"] = values.to_numpy(dtype=str) if values.dtype == object or pd.api.types.is_string_dtype(values) else values.to_numpy()
+        np.savez_compressed(path, **arrays)
+        logger.info(f"Statistiques sauvegardées : {path} ({len(self.cellules)} cellules)")
+
+    @classmethod
+    def charger(cls, path=STATS_FILE):
+        if not os.path.exists(path):
+            logger.critical(f"Fichier de statistiques {path} introuvable (lancer 'init' d'abord).")
+            sys.exit(1)
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != STATS_FORMAT_VERSION:
+                raise ValueError(f"Format de statistiques incompatible : {int(data['format_version'])}")
+            tables = {'cell': {}, 'puis': {}}
+            for name in data.files:
+                if '__' in name:
+                    prefix, col = name.split('__', 1)
+                    tables[prefix][col] = data[name]
+        return cls(pd.DataFrame(tables['cell']), pd.DataFrame(tables['puis']))
+
+
+# --- PIPELINE INCRÉMENTAL ---
+
+def publier_referentiel(engine, output_db=OUTPUT_DB, publier=True):
+    """
+    Écrit le référentiel. Avec `publier`, régénère aussi les fichiers servis par la même chaîne que
+    le build complet (colonnaire, repli, instantané, courbes, puis métadonnées en dernier) : le
+    service préfère le .cols et l'instantané au CSV, un CSV seul ne lui parviendrait pas.
+    """
+    engine.sauvegarder_referentiel(output_db)
+    if publier:
+        engine.sauvegarder_referentiel_colonnes()
+        engine.sauvegarder_backoff()
+        engine.sauvegarder_snapshot()
+        engine.sauvegarder_courbes()
+        engine.sauvegarder_metadata()
+
+
+def initialiser(input_file=INPUT_FILE, stats_path=STATS_FILE, output_db=OUTPUT_DB, publier=True):
+    """Construction complète + écriture des statistiques suffisantes."""
+    engine = ArgusEngine(input_file)
+    engine.charger_donnees()
+    puissances = StatsSegments.comptes_puissances(engine.df)
+    engine.construire_referentiel()
+    stats = StatsSegments(StatsSegments._compresser(StatsSegments.cellules_depuis_df(engine.df)), puissances)
+    stats.sauvegarder(stats_path)
+    publier_referentiel(engine, output_db, publier)
+    return stats, engine.referentiel
+
+
+def patcher_referentiel(referentiel, nouvelles_cotes, segments):
+    """Remplace les lignes des segments touchés par leurs nouvelles cotes (ordre trié conservé)."""
+    touches = pd.MultiIndex.from_frame(segments[SEGMENT_COLS])
+    restant = referentiel[~pd.MultiIndex.from_frame(referentiel[SEGMENT_COLS]).isin(touches)]
+    patched = pd.concat([restant, nouvelles_cotes], ignore_index=True)
+    return patched.sort_values(SEGMENT_COLS, kind='mergesort').reset_index(drop=True)
+
+
+def lire_referentiel(path=OUTPUT_DB):
+    str_cols = {c: str for c in ['Marque', 'Modèle', 'Énergie', 'Boîte', 'Finition', 'Qualite_Cote']}
+    return pd.read_csv(path, sep=';', dtype=str_cols, keep_default_na=False)
+
+
+def mettre_a_jour(delta_file, stats_path=STATS_FILE, output_db=OUTPUT_DB, publier=True):
+    """
+    Applique un lot d'annonces : seuls les segments touchés sont recalculés. L'index des
+    comparables n'est pas régénéré (il demande toutes les annonces, pas seulement le delta).
+    """
+    stats = StatsSegments.charger(stats_path)
+    delta = ArgusEngine(delta_file)
+    delta.charger_donnees()
+    segments = stats.ajouter(delta.df)
+    logger.info(f"Delta : {len(delta.df)} annonces, {len(segments)} segments touchés.")
+
+    nouvelles_cotes = stats.calculer_referentiel(segments)
+    referentiel = patcher_referentiel(lire_referentiel(output_db), nouvelles_cotes, segments)
+    stats.sauvegarder(stats_path)
+    delta.referentiel = referentiel
+    publier_referentiel(delta, output_db, publier)
+    logger.info(f"Référentiel patché : {len(referentiel)} cotes ({len(nouvelles_cotes)} recalculées).")
+    return referentiel
+
+
+def comparer_referentiels(ref_incr, ref_complet):
+    """Écarts entre un référentiel incrémental et une reconstruction complète."""
+    merged = ref_incr.merge(ref_complet, on=SEGMENT_COLS, how='outer', suffixes=('_incr', '_full'), indicator=True)
+    communs = merged[merged['_merge'] == 'both']
+    ecart_cote = (communs['Cote_Reference_incr'] - communs['Cote_Reference_full']).abs() / communs['Cote_Reference_full'].clip(lower=1)
+    ecart_km = (communs['Km_Reference_incr'] - communs['Km_Reference_full']).abs() / communs['Km_Reference_full'].clip(lower=1)
+    ecart_decote = (communs['Decote_par_Km_incr'] - communs['Decote_par_Km_full']).abs()
+    dans_tolerance = (ecart_cote <= TOLERANCE_COTE) & (ecart_km <= TOLERANCE_KM) & (ecart_decote <= TOLERANCE_DECOTE)
+    couverture = dans_tolerance.sum() / len(merged) if len(merged) else 1.0
+    return {
+        'segments_communs': int(len(communs)),
+        'segments_incr_seul': int((merged['_merge'] == 'left_only').sum()),
+        'segments_complet_seul': int((merged['_merge'] == 'right_only').sum()),
+        'ecart_cote_max': float(ecart_cote.max()) if len(communs) else 0.0,
+        'ecart_km_max': float(ecart_km.max()) if len(communs) else 0.0,
+        'ecart_decote_max': float(ecart_decote.max()) if len(communs) else 0.0,
+        'couverture_tolerance': round(float(couverture), 5),
+        'ok': bool(couverture >= TOLERANCE_COUVERTURE),
+    }
+
+
+def verifier_tolerance(base_file, delta_file, workdir=None):
+    """
+    Construit la base, applique le delta en incrémental, puis compare au build complet
+    (base + delta) avec les tolérances TOLERANCE_*. Fichiers de contrôle dans `workdir`, ou dans
+    un dossier temporaire supprimé au retour (jamais dans le répertoire courant, où le service et
+    le build cherchent le référentiel).
+    """
+    if workdir is None:
+        with tempfile.TemporaryDirectory(prefix="argus_check_") as tmp:
+            return verifier_tolerance(base_file, delta_file, tmp)
+    stats_path = os.path.join(workdir, "check_" + STATS_FILE)
+    db_path = os.path.join(workdir, "check_" + OUTPUT_DB)
+    # Fichiers de contrôle seulement : les fichiers servis ne sont pas régénérés
+    initialiser(base_file, stats_path, db_path, publier=False)
+    ref_incr = mettre_a_jour(delta_file, stats_path, db_path, publier=False)
+
+    complet = ArgusEngine(None)
+    base, delta = ArgusEngine(base_file), ArgusEngine(delta_file)
+    base.charger_donnees()
+    delta.charger_donnees()
+    complet.df = pd.concat([base.df, delta.df], ignore_index=True)
+    complet.construire_referentiel()
+    return comparer_referentiels(ref_incr, complet.referentiel)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mise à jour incrémentale du référentiel Argus V21")
+    sub = parser.add_subparsers(dest="commande", required=True)
+    p_init = sub.add_parser("init", help="Build complet + statistiques suffisantes")
+    p_init.add_argument("--input", default=INPUT_FILE)
+    p_update = sub.add_parser("update", help="Applique un CSV delta au référentiel")
+    p_update.add_argument("delta")
+    p_check = sub.add_parser("check", help="Compare incrémental et build complet sur base + delta")
+    p_check.add_argument("--base", default=INPUT_FILE)
+    p_check.add_argument("--delta", required=True)
+    p_check.add_argument("--workdir", help="Conserve les fichiers de contrôle dans ce dossier (défaut : dossier temporaire)")
+    args = parser.parse_args()
+
+    if args.commande == "init":
+        initialiser(args.input)
+    elif args.commande == "update":
+        mettre_a_jour(args.delta)
+    else:
+        rapport = verifier_tolerance(args.base, args.delta, args.workdir)
+        for k, v in rapport.items(): logger.info(f"   {k} : {v}")
+        sys.exit(0 if rapport['ok'] else 1)
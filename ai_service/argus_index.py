@@ -0,0 +1,408 @@
+# Fichier: argus_index.py
+# Index de segments du référentiel V21 pour le service de cotation (lookup O(1)).
+#
+# Chargé une seule fois au démarrage : depuis le format colonnaire (.cols) s'il existe,
+# sinon depuis le CSV d'échange. Pas de pandas : lecture csv/NumPy uniquement.
+
+import os
+import csv
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import numpy as np
+
+import argus_store
+
+# --- CONSTANTES DE COTATION ---
+MIN_PRICE_FLOOR = 500
+MIN_RESIDUAL_VALUE = 0.15
+CURRENT_YEAR = 2025
+
+SEGMENT_COLS = ['Marque', 'Modèle', 'Année', 'Puissance', 'Énergie', 'Boîte', 'Finition']
+INT_COLS = ('Année', 'Puissance', 'Cote_Reference', 'Km_Reference', 'Volume_Annonces')
+# Incertitude par segment (argus_regression) : absente des référentiels construits avant son ajout
+INCERTITUDE_COLS = ('Ecart_Type_Prix', 'Erreur_Type_Decote')
+FLOAT_COLS = ('Decote_par_Km',) + INCERTITUDE_COLS
+
+# Intervalle de prix renvoyé par /predict (loi normale, 95%)
+NIVEAU_INTERVALLE = 0.95
+Z_INTERVALLE = 1.96
+
+# Confiance associée à la fiabilité du segment (volume d'annonces A > 30, B > 10, C >= 3)
+CONFIANCE_QUALITE = {"A": 0.9, "B": 0.75, "C": 0.6}
+
+# Noms acceptés dans les requêtes JSON (Node utilise les noms sans accents)
+ALIAS_CHAMPS = {
+    'Marque': ('Marque', 'marque'),
+    'Modèle': ('Modèle', 'Modele', 'modele'),
+    'Année': ('Année', 'Annee', 'annee', 'extractedYear'),
+    'Puissance': ('Puissance', 'puissance'),
+    'Énergie': ('Énergie', 'Energie', 'energie'),
+    'Boîte': ('Boîte', 'Boite', 'boite'),
+    'Finition': ('Finition', 'finition'),
+}
+ALIAS_KM = ('km', 'Kilométrage', 'Kilometrage', 'extractedKm')
+# Au-delà : saisie erronée (10 millions de km), rejetée plutôt que cotée au plancher
+KM_MAX = 10_000_000
+
+
+@dataclass
+class CoteResult:
+    cote_affinee: int
+    cote_brute: int
+    confiance: str
+    volume_source: int
+    kilometrage_reference: int
+    ajustement_km: int
+    prix_plancher_atteint: bool
+    intervalle_bas: Optional[int] = None
+    intervalle_haut: Optional[int] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class SegmentInvalide(ValueError):
+    """Requête ne permettant pas de construire une clé de segment."""
+
+
+def qualite_depuis_volume(volume):
+    """Fiabilité A/B/C d'après le volume d'annonces (mêmes seuils que le build)."""
+    volume = np.asarray(volume)
+    return np.select([volume > 30, volume > 10], ["A", "B"], "C")
+
+
+def borner_decote_vectorise(raw_coef, annees):
+    """Bornes de décote V21 selon l'âge (version tableau de _calculate_depreciation_stabilized)."""
+    age = CURRENT_YEAR - np.asarray(annees)
+    max_loss = np.select([age >= 15, age >= 10, age >= 5], [-0.02, -0.05, -0.08], -0.15)
+    final_coef = np.where(raw_coef > 0, max_loss / 2, np.maximum(raw_coef, max_loss))
+    final_coef = np.where(final_coef > -0.005, -0.005, final_coef)
+    return np.round(final_coef, 5)
+
+
+def calculer_prix_final(ref_prix, ref_km, reel_km, coef):
+    delta = reel_km - ref_km
+    adj = 0
+
+    if delta > 0: # Trop de bornes
+        adj += min(delta, 50000) * coef
+        if delta > 50000: adj += min(delta-50000, 50000) * (coef * 0.5)
+        if delta > 100000: adj += (delta-100000) * (coef * 0.1)
+    else: # Pas assez de bornes
+        adj = delta * coef
+        if adj > ref_prix * 0.4: adj = ref_prix * 0.4
+
+    final = ref_prix + adj
+    plancher = max(MIN_PRICE_FLOOR, ref_prix * MIN_RESIDUAL_VALUE)
+
+    is_floored = False
+    if final < plancher:
+        final = plancher
+        is_floored = True
+
+    return int(final), int(adj), is_floored
+
+
+def calculer_prix_final_vectorise(ref_prix, ref_km, reel_km, coef):
+    """
+    Version tableau de calculer_prix_final : mêmes opérations flottantes dans le même ordre,
+    donc résultats identiques élément par élément. Retourne (final, adj, is_floored).
+    """
+    ref_prix = np.asarray(ref_prix, dtype=np.int64)
+    coef = np.asarray(coef, dtype=np.float64)
+    delta = np.asarray(reel_km, dtype=np.int64) - np.asarray(ref_km, dtype=np.int64)
+
+    # Trop de bornes : paliers cumulés comme dans la version scalaire
+    adj_haut = np.minimum(delta, 50000) * coef
+    adj_haut = np.where(delta > 50000, adj_haut + np.minimum(delta - 50000, 50000) * (coef * 0.5), adj_haut)
+    adj_haut = np.where(delta > 100000, adj_haut + (delta - 100000) * (coef * 0.1), adj_haut)
+    # Pas assez de bornes : bonus plafonné à 40%
+    adj_bas = delta * coef
+    bonus_max = ref_prix * 0.4
+    adj_bas = np.where(adj_bas > bonus_max, bonus_max, adj_bas)
+    adj = np.where(delta > 0, adj_haut, adj_bas)
+
+    final = ref_prix + adj
+    plancher = np.maximum(MIN_PRICE_FLOOR, ref_prix * MIN_RESIDUAL_VALUE)
+    is_floored = final < plancher
+    final = np.where(is_floored, plancher, final)
+    return np.trunc(final).astype(np.int64), np.trunc(adj).astype(np.int64), is_floored
+
+
+# --- COURBES PRIX / KM PRÉCALCULÉES ---
+# Pour un segment, calculer_prix_final ne dépend que du delta de km : courbe affine par morceaux
+# (bonus plafonné sous le km de référence, trois paliers de décote au-delà), bornée par le
+# plancher. Pentes et ordonnées des paliers sont calculées une fois par segment, avec les mêmes
+# opérations flottantes que la version scalaire ; le franchissement du plafond de bonus et celui
+# du plancher sont des seuils entiers de delta (la cote est monotone en delta : recherche
+# dichotomique sur le prédicat exact). Évaluer = choisir le palier, une multiplication-addition,
+# deux comparaisons de seuils : résultats identiques à calculer_prix_final (argus_courbes.py).
+
+# Origine en km de chaque palier : 0 (delta <= 0, bonus), puis décote au-delà de 0, 50000, 100000
+PALIERS_KM = (0, 0, 50000, 100000)
+FACTEURS_PALIER = (0.5, 0.1)
+BONUS_MAX = 0.4
+# Domaine exact des seuils : |delta| <= 2^53 (entiers représentables en float64)
+DELTA_MAX = 2 ** 53
+
+
+def _premier_vrai(predicat, lo, hi):
+    """Plus petit d de [lo, hi] où `predicat` (monotone faux -> vrai) est vrai, hi + 1 sinon ; par élément."""
+    lo, hi = lo.copy(), hi + 1
+    actifs = lo < hi
+    while actifs.any():
+        mid = lo + (hi - lo) // 2
+        vrai = predicat(mid)
+        hi = np.where(actifs & vrai, mid, hi)
+        lo = np.where(actifs & ~vrai, mid + 1, lo)
+        actifs = lo < hi
+    return lo
+
+
+def _ajustement_courbe(courbes, lignes, delta):
+    palier = (delta > PALIERS_KM[1]).astype(np.intp) + (delta > PALIERS_KM[2]) + (delta > PALIERS_KM[3])
+    # Tables (n, 4) lues à plat : une seule indirection par valeur
+    pos = lignes * len(PALIERS_KM) + palier
+    adj = courbes['origine'].ravel()[pos] + (delta - np.take(PALIERS_KM, palier)) * courbes['pente'].ravel()[pos]
+    return np.where(delta < courbes['seuil_bonus'][lignes], courbes['bonus_max'][lignes], adj)
+
+
+def courbes_prix(ref_prix, ref_km, coef):
+    """
+    Courbes des segments (dict de tableaux, une ligne par segment) :
+      pente, origine (n, 4) : ajustement = origine + (delta - PALIERS_KM[p]) * pente, palier p
+                              (0 : delta <= 0, puis les trois paliers de décote)
+      seuil_bonus           : delta < seuil -> ajustement = bonus_max (bonus plafonné à 40 %)
+      seuil_plancher        : delta >= seuil -> cote = plancher (delta < seuil si plancher_bas,
+                              décote positive)
+    """
+    ref_prix = np.asarray(ref_prix, dtype=np.int64)
+    if (ref_prix < 0).any():
+        raise ValueError("Cote de référence négative : courbe non monotone")
+    coef = np.asarray(coef, dtype=np.float64)
+    n = len(ref_prix)
+    lignes = np.arange(n)
+    # Mêmes expressions que calculer_prix_final : paliers cumulés 50000*coef puis 50000*(coef*0.5)
+    origine_2 = 50000 * coef
+    origine_3 = origine_2 + 50000 * (coef * FACTEURS_PALIER[0])
+    zeros = np.zeros(n)
+    courbes = {
+        'cote': ref_prix, 'km_ref': np.asarray(ref_km, dtype=np.int64),
+        'pente': np.stack([coef, coef, coef * FACTEURS_PALIER[0], coef * FACTEURS_PALIER[1]], axis=1),
+        'origine': np.stack([zeros, zeros, origine_2, origine_3], axis=1),
+        'bonus_max': ref_prix * BONUS_MAX,
+        'plancher': np.maximum(MIN_PRICE_FLOOR, ref_prix * MIN_RESIDUAL_VALUE),
+        'plancher_bas': coef > 0,
+    }
+    bornes = np.full(n, -DELTA_MAX, dtype=np.int64), np.full(n, DELTA_MAX, dtype=np.int64)
+    # Plafond : delta * coef > bonus_max, vrai en deçà d'un seuil (delta <= 0 seulement)
+    courbes['seuil_bonus'] = _premier_vrai(lambda d: ~(d * coef > courbes['bonus_max']), bornes[0], np.zeros(n, np.int64))
+
+    def sous_plancher(d):
+        return ((ref_prix + _ajustement_courbe(courbes, lignes, d)) < courbes['plancher']) ^ courbes['plancher_bas']
+    courbes['seuil_plancher'] = _premier_vrai(sous_plancher, *bornes)
+    return courbes
+
+
+def evaluer_courbes(courbes, lignes, reel_km):
+    """
+    (final, adj, is_floored) comme calculer_prix_final_vectorise, depuis les courbes précalculées.
+    `lignes` et `reel_km` sont diffusés : lignes[:, None] et une grille de km donnent une matrice.
+    """
+    lignes = np.asarray(lignes, dtype=np.intp)
+    delta = np.asarray(reel_km, dtype=np.int64) - courbes['km_ref'][lignes]
+    adj = _ajustement_courbe(courbes, lignes, delta)
+    seuil = courbes['seuil_plancher'][lignes]
+    is_floored = np.where(courbes['plancher_bas'][lignes], delta < seuil, delta >= seuil)
+    final = np.where(is_floored, courbes['plancher'][lignes], courbes['cote'][lignes] + adj)
+    return np.trunc(final).astype(np.int64), np.trunc(adj).astype(np.int64), is_floored
+
+
+def intervalle_prix(final, adj, coef, volume, ecart_prix, erreur_decote):
+    """
+    Intervalle de prédiction (NIVEAU_INTERVALLE) autour de la cote affinée : dispersion des
+    annonces autour de la droite du segment, incertitude de la cote de référence (1/n) et de la
+    décote sur le km réellement appliqué (adj / coef, paliers compris).
+    (None, None) si l'incertitude du segment est inconnue.
+    """
+    if ecart_prix is None or not np.isfinite(ecart_prix) or not np.isfinite(erreur_decote):
+        return None, None
+    km_applique = adj / coef if coef else 0.0
+    demi = Z_INTERVALLE * np.sqrt(ecart_prix * ecart_prix * (1 + 1 / max(volume, 1))
+                                  + (km_applique * erreur_decote) ** 2)
+    return max(0, int(final - demi)), int(final + demi)
+
+
+def intervalle_prix_vectorise(final, adj, coef, volume, ecart_prix, erreur_decote):
+    """Version tableau de intervalle_prix : tableaux objet (int ou None)."""
+    final = np.asarray(final, dtype=np.float64)
+    coef = np.asarray(coef, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        km_applique = np.where(coef != 0, np.asarray(adj, dtype=np.float64) / coef, 0.0)
+        demi = Z_INTERVALLE * np.sqrt(ecart_prix * ecart_prix * (1 + 1 / np.maximum(volume, 1))
+                                      + (km_applique * erreur_decote) ** 2)
+    connu = np.isfinite(demi)
+    bas = np.full(len(final), None, dtype=object)
+    haut = np.full(len(final), None, dtype=object)
+    bas[connu] = np.maximum(0, np.trunc(final[connu] - demi[connu])).astype(np.int64).tolist()
+    haut[connu] = np.trunc(final[connu] + demi[connu]).astype(np.int64).tolist()
+    return bas, haut
+
+
+def _premier_champ(data, alias):
+    for nom in alias:
+        valeur = data.get(nom)
+        if valeur is not None and valeur != "":
+            return valeur
+    return None
+
+
+def normaliser_cle(data, optionnels=()):
+    """
+    Construit la clé de segment (mêmes normalisations que ArgusEngine.charger_donnees).
+    Les champs listés dans `optionnels` peuvent manquer : ils valent alors None.
+    """
+    cle = []
+    for col in SEGMENT_COLS:
+        valeur = _premier_champ(data, ALIAS_CHAMPS[col])
+        if valeur is None:
+            if col in optionnels:
+                cle.append(None)
+                continue
+            raise SegmentInvalide(f"Champ manquant : {col}")
+        if col in ('Année', 'Puissance'):
+            try:
+                valeur = int(valeur)
+            except (TypeError, ValueError):
+                raise SegmentInvalide(f"Champ numérique invalide : {col}={valeur!r}")
+        else:
+            valeur = str(valeur).upper().strip()
+        cle.append(valeur)
+    return tuple(cle)
+
+
+def lire_km(data):
+    valeur = _premier_champ(data, ALIAS_KM)
+    if valeur is None:
+        return None
+    try:
+        km = int(valeur)
+    except (TypeError, ValueError, OverflowError):  # NaN : ValueError, infini : OverflowError
+        raise SegmentInvalide(f"Kilométrage invalide : {valeur!r}")
+    if km < 0:
+        raise SegmentInvalide(f"Kilométrage négatif : {km}")
+    if km > KM_MAX:
+        raise SegmentInvalide(f"Kilométrage hors limites : {km} (max {KM_MAX})")
+    return km
+
+
+def charger_colonnes_referentiel(path):
+    """Colonnes du référentiel en tableaux NumPy, depuis un .cols ou un CSV."""
+    if path.endswith(argus_store.COLUMNAR_EXT):
+        table = argus_store.charger_colonnes(path)
+        return {nom: table[nom] for nom in table.noms}
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f, delimiter=';')
+        header = next(reader)
+        lignes = list(reader)
+    colonnes = {}
+    for i, nom in enumerate(header):
+        valeurs = [ligne[i] for ligne in lignes]
+        if nom in INT_COLS:
+            colonnes[nom] = np.array(valeurs, dtype=np.int64)
+        elif nom in FLOAT_COLS:
+            colonnes[nom] = np.array(valeurs, dtype=np.float64)
+        else:
+            colonnes[nom] = np.array(valeurs, dtype=str)
+    return colonnes
+
+
+class SegmentIndex:
+    """
+    Table de hachage clé de segment -> ligne du référentiel.
+    Par défaut la clé est le segment complet ; `key_cols` permet d'indexer une table agrégée.
+    """
+
+    def __init__(self, colonnes, source=None, key_cols=SEGMENT_COLS):
+        self.source = source
+        self.key_cols = list(key_cols)
+        self.colonnes = colonnes
+        self.cote = colonnes['Cote_Reference'].astype(np.int64)
+        self.km_ref = colonnes['Km_Reference'].astype(np.int64)
+        self.decote = colonnes['Decote_par_Km'].astype(np.float64)
+        self.volume = colonnes['Volume_Annonces'].astype(np.int64)
+        if 'Qualite_Cote' in colonnes:
+            self.qualite = np.asarray(colonnes['Qualite_Cote']).astype(str)
+        else:
+            self.qualite = qualite_depuis_volume(self.volume)
+        if all(c in colonnes for c in INCERTITUDE_COLS):
+            self.ecart_prix = colonnes['Ecart_Type_Prix'].astype(np.float64)
+            self.erreur_decote = colonnes['Erreur_Type_Decote'].astype(np.float64)
+        else:
+            self.ecart_prix = self.erreur_decote = None
+        # Courbes prix / km de chaque ligne : cotation en lot sans recalcul des paliers
+        self.courbes = courbes_prix(self.cote, self.km_ref, self.decote)
+        cles = zip(*(np.asarray(colonnes[c]).tolist() for c in self.key_cols))
+        self.index = {cle: i for i, cle in enumerate(cles)}
+
+    @classmethod
+    def depuis_fichier(cls, path):
+        return cls(charger_colonnes_referentiel(path), source=os.path.basename(path))
+
+    def __len__(self):
+        return len(self.index)
+
+    def chercher(self, cle):
+        return self.index.get(cle)
+
+    def estimer(self, cle, reel_km=None):
+        """CoteResult du segment, ou None si le segment est absent du référentiel."""
+        i = self.index.get(cle)
+        if i is None:
+            return None
+        ref_prix = int(self.cote[i])
+        ref_km = int(self.km_ref[i])
+        km = ref_km if reel_km is None else reel_km
+        coef = float(self.decote[i])
+        final, adj, floored = calculer_prix_final(ref_prix, ref_km, km, coef)
+        bas, haut = self.intervalle(i, final, adj, coef)
+        return CoteResult(
+            cote_affinee=final, cote_brute=ref_prix, confiance=str(self.qualite[i]),
+            volume_source=int(self.volume[i]), kilometrage_reference=ref_km,
+            ajustement_km=adj, prix_plancher_atteint=floored,
+            intervalle_bas=bas, intervalle_haut=haut
+        )
+
+    def intervalle(self, i, final, adj, coef):
+        """(bas, haut) de la ligne i, (None, None) sans colonnes d'incertitude."""
+        if self.ecart_prix is None:
+            return None, None
+        return intervalle_prix(final, adj, coef, int(self.volume[i]), float(self.ecart_prix[i]), float(self.erreur_decote[i]))
+
+    def resoudre(self, cles):
+        """Lignes du référentiel pour une liste de clés (-1 si absente ou clé None)."""
+        get = self.index.get
+        return np.fromiter((-1 if cle is None else get(cle, -1) for cle in cles), dtype=np.int64, count=len(cles))
+
+    def estimer_lot(self, lignes, kms):
+        """
+        Cotation vectorisée de lignes déjà résolues (toutes >= 0).
+        `kms` : kilométrages réels, -1 pour utiliser le km de référence du segment.
+        """
+        km_ref = self.km_ref[lignes]
+        kms = np.where(kms < 0, km_ref, kms)
+        coef = self.decote[lignes]
+        final, adj, floored = evaluer_courbes(self.courbes, lignes, kms)
+        if self.ecart_prix is None:
+            bas = haut = np.full(len(lignes), None, dtype=object)
+        else:
+            bas, haut = intervalle_prix_vectorise(final, adj, coef, self.volume[lignes],
+                                                  self.ecart_prix[lignes], self.erreur_decote[lignes])
+        return {
+            'cote_affinee': final, 'cote_brute': self.cote[lignes], 'confiance': self.qualite[lignes],
+            'volume_source': self.volume[lignes], 'kilometrage_reference': km_ref,
+            'ajustement_km': adj, 'prix_plancher_atteint': floored,
+            'intervalle_bas': bas, 'intervalle_haut': haut
+        }
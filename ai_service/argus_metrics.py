@@ -0,0 +1,180 @@
+# Fichier: argus_metrics.py
+# Instrumentation : étapes du build (durée, lignes en entrée/sortie, mémoire) et métriques du
+# service au format texte Prometheus (compteurs, histogrammes de latence, jauges calculées).
+#
+# Bibliothèque standard uniquement : importable par le build comme par le service sans ajouter
+# de dépendance. Les métriques du service sont propres au processus : derrière gunicorn, chaque
+# worker a les siennes (label `pid` de argus_process_info pour distinguer les séries scrapées).
+
+import os
+import sys
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bornes (secondes) des histogrammes de latence : de 0,25 ms (lookup en cache) à 5 s (gros lots)
+BUCKETS_LATENCE = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+# --- MÉMOIRE ---
+
+def rss_mo():
+    """RSS courante du processus en Mo (None hors Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def pic_rss_mo():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+# --- ÉTAPES DU BUILD ---
+
+class SuiviEtapes:
+    """
+    Mesures des étapes d'un build, dans l'ordre d'exécution. Chaque étape est un bloc `with` :
+        with etapes.etape('imputation', lignes_entree=len(df)) as m:
+            ...
+            m['lignes_sortie'] = len(resultat)
+    """
+
+    def __init__(self):
+        self.mesures = []
+
+    @contextmanager
+    def etape(self, nom, lignes_entree=None):
+        mesure = {'etape': nom, 'lignes_entree': lignes_entree, 'lignes_sortie': None}
+        rss_avant, pic_avant = rss_mo(), pic_rss_mo()
+        start = time.perf_counter()
+        try:
+            yield mesure
+        finally:
+            mesure['duree_s'] = round(time.perf_counter() - start, 4)
+            rss_apres = rss_mo()
+            # Delta de RSS : mémoire conservée après l'étape ; delta du pic : hausse du maximum atteint
+            mesure['memoire_delta_mo'] = round(rss_apres - rss_avant, 1) if rss_avant is not None else None
+            mesure['pic_delta_mo'] = round(pic_rss_mo() - pic_avant, 1)
+            mesure['rss_mo'] = round(rss_apres, 1) if rss_apres is not None else None
+            self.mesures.append(mesure)
+            logger.info("⏱️  %s : %.3fs, lignes %s -> %s, mémoire %+.1f Mo (pic %+.1f Mo)",
+                        nom, mesure['duree_s'], mesure['lignes_entree'], mesure['lignes_sortie'],
+                        mesure['memoire_delta_mo'] or 0.0, mesure['pic_delta_mo'])
+
+    def total_s(self):
+        return round(sum(m['duree_s'] for m in self.mesures), 4)
+
+    def rapport(self):
+        return {'total_s': self.total_s(), 'pic_rss_mo': round(pic_rss_mo(), 1), 'etapes': self.mesures}
+
+
+# --- MÉTRIQUES PROMETHEUS ---
+
+def _labels(noms, valeurs, extra=()):
+    paires = list(zip(noms, valeurs)) + list(extra)
+    if not paires:
+        return ""
+    echappe = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in paires)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(paires, echappe)) + "}"
+
+
+def _nombre(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Compteur:
+    def __init__(self, nom, aide, labels=()):
+        self.nom, self.aide, self.labels = nom, aide, tuple(labels)
+        self._valeurs = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valeurs, n=1):
+        with self._lock:
+            self._valeurs[valeurs] = self._valeurs.get(valeurs, 0) + n
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        with self._lock:
+            for valeurs, v in sorted(self._valeurs.items()):
+                lignes.append(f"{self.nom}{_labels(self.labels, valeurs)} {_nombre(v)}")
+        return lignes
+
+
+class Histogramme:
+    """Histogramme cumulatif Prometheus : un tableau de comptes par combinaison de labels."""
+
+    def __init__(self, nom, aide, labels=(), buckets=BUCKETS_LATENCE):
+        self.nom, self.aide, self.labels = nom, aide, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs de labels -> [comptes par bucket (+Inf en dernier), somme]
+        self._lock = threading.Lock()
+
+    def observer(self, valeur, *valeurs):
+        i = bisect.bisect_left(self.buckets, valeur)
+        with self._lock:
+            serie = self._series.get(valeurs)
+            if serie is None:
+                serie = self._series[valeurs] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valeur
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        with self._lock:
+            series = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        for valeurs, (comptes, somme) in series:
+            cumul = 0
+            for borne, c in zip(self.buckets + (float('inf'),), comptes):
+                cumul += c
+                le = "+Inf" if borne == float('inf') else repr(borne)
+                lignes.append(f"{self.nom}_bucket{_labels(self.labels, valeurs, [('le', le)])} {cumul}")
+            lignes.append(f"{self.nom}_sum{_labels(self.labels, valeurs)} {repr(somme)}")
+            lignes.append(f"{self.nom}_count{_labels(self.labels, valeurs)} {cumul}")
+        return lignes
+
+
+class Registre:
+    """
+    Métriques d'un processus. `collecteur(fn)` ajoute des séries calculées à l'exposition
+    (statistiques du cache...) : fn renvoie des tuples (nom, type, aide, [(labels dict, valeur)]).
+    """
+
+    def __init__(self):
+        self.metriques = []
+        self.collecteurs = []
+
+    def compteur(self, nom, aide, labels=()):
+        m = Compteur(nom, aide, labels)
+        self.metriques.append(m)
+        return m
+
+    def histogramme(self, nom, aide, labels=(), buckets=BUCKETS_LATENCE):
+        m = Histogramme(nom, aide, labels, buckets)
+        self.metriques.append(m)
+        return m
+
+    def collecteur(self, fn):
+        self.collecteurs.append(fn)
+        return fn
+
+    def exposer(self):
+        """Corps de /metrics (text/plain; version=0.0.4)."""
+        lignes = []
+        for m in self.metriques:
+            lignes.extend(m.exposer())
+        for fn in self.collecteurs:
+            for nom, type_, aide, series in fn():
+                lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} {type_}"]
+                for labels, v in series:
+                    if v is not None:
+                        lignes.append(f"{nom}{_labels(labels.keys(), labels.values())} {_nombre(v)}")
+        return "\n".join(lignes) + "\n"
@@ -0,0 +1,99 @@
+# Fichier: argus_profiler.py
+# Profileur par échantillonnage optionnel des requêtes lentes du service.
+#
+# Désactivé par défaut (aucun thread, aucun coût). Avec ARGUS_PROFILE_SLOW_MS, un thread
+# d'arrière-plan relève toutes les ARGUS_PROFILE_INTERVAL_MS la pile Python de chaque requête en
+# cours (sys._current_frames) ; à la fin d'une requête plus lente que le seuil, ses piles sont
+# écrites au format « collapsed » (une ligne « racine;...;feuille nombre » par pile), directement
+# lisible par flamegraph.pl, speedscope ou inferno. Les requêtes rapides sont jetées sans écriture.
+#
+# Variables : ARGUS_PROFILE_SLOW_MS (seuil, active le profileur), ARGUS_PROFILE_DIR,
+#             ARGUS_PROFILE_INTERVAL_MS (5 par défaut), ARGUS_PROFILE_MAX_DUMPS (100 par défaut)
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+INTERVALLE_MS = 5
+MAX_DUMPS = 100
+
+
+def pile_repliee(frame):
+    """Pile d'appels racine -> feuille, une entrée « fonction (fichier:ligne de définition) » par frame."""
+    noms = []
+    while frame is not None:
+        code = frame.f_code
+        noms.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(noms))
+
+
+class ProfileurRequetesLentes:
+    def __init__(self, seuil_s, dossier, intervalle_s=INTERVALLE_MS / 1000, max_dumps=MAX_DUMPS):
+        self.seuil_s = seuil_s
+        self.dossier = dossier
+        self.intervalle_s = intervalle_s
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._actifs = {}  # identifiant de thread -> Counter des piles échantillonnées
+        self._lock = threading.Lock()
+        self._pid_thread = None
+
+    @classmethod
+    def depuis_env(cls):
+        """None si ARGUS_PROFILE_SLOW_MS n'est pas défini (ou <= 0)."""
+        seuil_ms = float(os.environ.get("ARGUS_PROFILE_SLOW_MS") or 0)
+        if seuil_ms <= 0:
+            return None
+        dossier = os.environ.get("ARGUS_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "argus_profiles")
+        os.makedirs(dossier, exist_ok=True)
+        intervalle_ms = float(os.environ.get("ARGUS_PROFILE_INTERVAL_MS", INTERVALLE_MS))
+        max_dumps = int(os.environ.get("ARGUS_PROFILE_MAX_DUMPS", MAX_DUMPS))
+        logger.info("🔬 Profileur actif : requêtes > %.0f ms, échantillon toutes les %.1f ms -> %s",
+                    seuil_ms, intervalle_ms, dossier)
+        return cls(seuil_ms / 1000, dossier, intervalle_ms / 1000, max_dumps)
+
+    def _demarrer(self):
+        # Un thread par processus : celui du maître gunicorn ne survit pas au fork des workers
+        if self._pid_thread != os.getpid():
+            self._pid_thread = os.getpid()
+            threading.Thread(target=self._boucle, name="argus-profiler", daemon=True).start()
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.intervalle_s)
+            with self._lock:
+                if not self._actifs:
+                    continue
+                frames = sys._current_frames()
+                for tid, piles in self._actifs.items():
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        piles[pile_repliee(frame)] += 1
+
+    def debut(self):
+        with self._lock:
+            self._demarrer()
+            self._actifs[threading.get_ident()] = Counter()
+
+    def fin(self, duree_s, nom):
+        """Termine l'échantillonnage de la requête du thread courant ; chemin du fichier écrit ou None."""
+        with self._lock:
+            piles = self._actifs.pop(threading.get_ident(), None)
+        if not piles or duree_s < self.seuil_s or self.dumps >= self.max_dumps:
+            return None
+        self.dumps += 1
+        nom_fichier = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{nom.strip('/').replace('/', '_') or 'racine'}_{int(duree_s * 1000)}ms.folded"
+        path = os.path.join(self.dossier, nom_fichier)
+        with open(path, 'w', encoding='utf-8') as f:
+            for pile, n in piles.most_common():
+                f.write(f"{pile} {n}\n")
+        logger.warning("🐢 Requête lente %s (%.0f ms) : %d échantillons -> %s",
+                       nom, duree_s * 1000, sum(piles.values()), path)
+        return path
@@ -0,0 +1,137 @@
+# Fichier: argus_regression.py
+# Ajustement par lot de la pente km -> prix de tous les segments, avec incertitude.
+#
+# Moindres carrés en forme fermée à partir de statistiques suffisantes par segment (bincount,
+# aucune boucle Python), plus un mode robuste optionnel pour les petits segments bruités :
+# Theil-Sen (médiane des pentes de toutes les paires, calculée pour tout le lot en une passe)
+# ou Huber (moindres carrés repondérés, itérations vectorisées). incertitude() donne l'écart-type
+# résiduel des prix autour de la droite servie et l'erreur-type de la pente, stockés dans le
+# référentiel pour l'intervalle de prix renvoyé par /predict (argus_index.intervalle_prix).
+# Pas de pandas : tableaux NumPy, codes de segment 0..n_groups-1.
+
+import numpy as np
+
+ROBUST_MODES = ("theil_sen", "huber")
+ROBUSTE_MAX_N = 30     # Le mode robuste ne porte que sur les segments de taille <= ROBUSTE_MAX_N
+HUBER_DELTA = 1.345    # Seuil de Huber en unités d'échelle (95% d'efficacité sous loi normale)
+HUBER_ITERATIONS = 20
+MAD_NORMALE = 0.6745   # MAD -> écart-type sous loi normale
+
+
+def mediane_par_groupe(codes, valeurs, n_groups):
+    """Médiane de `valeurs` par code (NaN pour un groupe vide), par un seul tri lexicographique."""
+    if not len(valeurs):
+        return np.full(n_groups, np.nan)
+    triees = valeurs[np.lexsort((valeurs, codes))]
+    count = np.bincount(codes, minlength=n_groups)
+    offset = np.cumsum(count) - count
+    dernier = len(triees) - 1
+    bas = np.minimum(offset + np.maximum(count - 1, 0) // 2, dernier)
+    haut = np.minimum(offset + count // 2, dernier)
+    return np.where(count > 0, (triees[bas] + triees[haut]) / 2, np.nan)
+
+
+def incertitude(n, sxx, sxy, syy, pente):
+    """
+    (écart-type résiduel, erreur-type de la pente) depuis les sommes centrées, pour une pente
+    quelconque : SCR = syy - 2·b·sxy + b²·sxx (= syy - sxy²/sxx pour la pente des moindres carrés).
+    Sans dispersion des km (sxx = 0), pas de pente : écart-type des prix et erreur-type nulle.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scr = np.where(sxx > 0, syy - 2 * pente * sxy + pente * pente * sxx, syy)
+        ddl = np.where(sxx > 0, n - 2, n - 1)
+        ecart = np.sqrt(np.where(ddl > 0, np.maximum(scr, 0) / ddl, 0.0))
+        erreur = np.where(sxx > 0, ecart / np.sqrt(sxx), 0.0)
+    return ecart, erreur
+
+
+def moindres_carres(codes, x, y, n_groups):
+    """
+    Pente des moindres carrés par segment (équivalent fermé de LinearRegression sur données
+    centrées) et sommes centrées. Retourne un dict de tableaux de taille n_groups.
+    """
+    count = np.bincount(codes, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_moyen = np.bincount(codes, weights=x, minlength=n_groups) / count
+        y_moyen = np.bincount(codes, weights=y, minlength=n_groups) / count
+    dx = x - x_moyen[codes]
+    dy = y - y_moyen[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pente = np.where(sxx > 0, sxy / sxx, 0.0)
+    return {'n': count, 'x_moyen': x_moyen, 'y_moyen': y_moyen,
+            'sxx': sxx, 'sxy': sxy, 'syy': syy, 'pente': pente}
+
+
+def _paires(codes_tries, count, groupes):
+    """Indices (i, j), i < j, de toutes les paires à l'intérieur des groupes sélectionnés (codes triés)."""
+    offset = np.cumsum(count) - count
+    membres = np.flatnonzero(groupes[codes_tries])
+    fin = (offset + count)[codes_tries[membres]]
+    nb = fin - membres - 1
+    gauche = np.repeat(membres, nb)
+    debut = np.cumsum(nb) - nb
+    droite = gauche + 1 + (np.arange(len(gauche)) - np.repeat(debut, nb))
+    return gauche, droite
+
+
+def theil_sen(codes, x, y, n_groups, groupes):
+    """Médiane des pentes de toutes les paires (km distincts) pour les groupes sélectionnés, NaN ailleurs."""
+    ordre = np.argsort(codes, kind='stable')
+    codes_tries, xs, ys = codes[ordre], x[ordre], y[ordre]
+    count = np.bincount(codes_tries, minlength=n_groups)
+    i, j = _paires(codes_tries, count, groupes)
+    dx = xs[j] - xs[i]
+    valide = dx != 0
+    pentes = (ys[j] - ys[i])[valide] / dx[valide]
+    return mediane_par_groupe(codes_tries[i][valide], pentes, n_groups)
+
+
+def huber(codes, x, y, n_groups, groupes, pente_initiale, iterations=HUBER_ITERATIONS):
+    """Régression de Huber (moindres carrés repondérés, échelle MAD) pour les groupes sélectionnés, NaN ailleurs."""
+    sel = groupes[codes]
+    codes, x, y = codes[sel], x[sel], y[sel]
+    pente = pente_initiale.copy()
+    w = np.ones(len(x))
+    for _ in range(iterations):
+        sw = np.bincount(codes, weights=w, minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_moyen = np.bincount(codes, weights=w * x, minlength=n_groups) / sw
+            y_moyen = np.bincount(codes, weights=w * y, minlength=n_groups) / sw
+        residu = y - y_moyen[codes] - pente[codes] * (x - x_moyen[codes])
+        echelle = mediane_par_groupe(codes, np.abs(residu), n_groups) / MAD_NORMALE
+        seuil = HUBER_DELTA * echelle[codes]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.where(np.abs(residu) <= seuil, 1.0, seuil / np.abs(residu))
+        w = np.where(np.isfinite(w), w, 1.0)
+        dx = x - x_moyen[codes]
+        sxx = np.bincount(codes, weights=w * dx * dx, minlength=n_groups)
+        sxy = np.bincount(codes, weights=w * dx * (y - y_moyen[codes]), minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pente = np.where(sxx > 0, sxy / sxx, pente)
+    return np.where(groupes, pente, np.nan)
+
+
+def ajuster(codes, x, y, n_groups, robuste=None, robuste_max_n=ROBUSTE_MAX_N):
+    """
+    Ajustement de tous les segments. `robuste` (None, 'theil_sen' ou 'huber') remplace la pente
+    des segments de 2 à `robuste_max_n` points. Retourne le dict de moindres_carres ; l'incertitude
+    se calcule ensuite avec incertitude() pour la pente réellement servie (après bornage).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    fit = moindres_carres(codes, x, y, n_groups)
+    if robuste is not None:
+        if robuste not in ROBUST_MODES:
+            raise ValueError(f"Mode robuste inconnu : {robuste!r} (attendu : {', '.join(ROBUST_MODES)})")
+        groupes = (fit['n'] >= 2) & (fit['n'] <= robuste_max_n) & (fit['sxx'] > 0)
+        if robuste == "theil_sen":
+            pente = theil_sen(codes, x, y, n_groups, groupes)
+        else:
+            pente = huber(codes, x, y, n_groups, groupes, fit['pente'])
+        fit['pente'] = np.where(groupes & np.isfinite(pente), pente, fit['pente'])
+    return fit
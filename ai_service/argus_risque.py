@@ -0,0 +1,291 @@
+# Fichier: argus_risque.py
+# Score de risque des descriptions d'annonces : signatures d'arnaque, mots-clés suspects et
+# préfixes de numéros virtuels, en une passe par lot.
+#
+# Règles : phrases et préfixes téléphoniques de backend/patterns.json (la base partagée avec
+# analyzer.js) + groupes de mots-clés de argus_risque_regles.json (ceux de RISK_PATTERNS dans
+# server.js). Textes et motifs sont normalisés de la même façon (minuscules, sans accents,
+# apostrophes typographiques, espaces fusionnés) : « à l'Étranger » et « a l’etranger » se valent.
+#
+# Tous les motifs sont compilés en UNE expression régulière factorisée en trie (préfixes communs
+# mis en facteur, pas d'alternation plate de N motifs) : c'est l'automate d'Aho–Corasick au sens
+# pratique, sans dépendance. L'expression est dans un lookahead pour trouver aussi les motifs
+# imbriqués (« mandat cash » dans « paiement uniquement par mandat cash ») ; les motifs qui sont
+# un préfixe-mot d'un autre sont déduits de la correspondance la plus longue (`implique`). Un lot
+# est joint en un seul texte et parcouru une seule fois. Résultat identique à la boucle naïve
+# motif par motif (vérifié par benchmarks/bench_risque.py).
+#
+# Rechargement à chaud : les fichiers de règles sont re-stat()és au plus toutes les
+# ARGUS_RISQUE_RELOAD_S secondes ; s'ils ont changé, le jeu est recompilé puis substitué d'un bloc
+# (un lot en cours garde l'ancien). Un fichier invalide est ignoré et l'ancien jeu conservé.
+#
+# Variables : ARGUS_PATTERNS, ARGUS_RISQUE_REGLES (chemins), ARGUS_RISQUE_RELOAD_S (2 par défaut, 0 = jamais)
+
+import os
+import re
+import json
+import time
+import bisect
+import hashlib
+import logging
+import threading
+import unicodedata
+from itertools import accumulate
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PATTERNS_FILE = os.path.join(BASE_DIR, "..", "backend", "patterns.json")
+REGLES_FILE = os.path.join(BASE_DIR, "argus_risque_regles.json")
+RELOAD_S = 2.0
+
+# Barème d'analyzer.js : une signature connue suffit, un numéro virtuel ajoute 40
+SCORE_PHRASE = 100
+SCORE_TELEPHONE = 40
+SCORE_MAX = 100
+LABEL_PHRASE = "Signature Textuelle (Database)"
+LABEL_TELEPHONE = "Numéro Virtuel Suspect"
+
+# Séparateur des textes d'un lot : ni espace ni caractère de mot, donc une frontière pour \w
+SEPARATEUR = "\x00"
+# Numéros français dans le texte normalisé : 06 44 12 34 56, 06.44.12.34.56, +33 6 44 12 34 56...
+TELEPHONE_RE = re.compile(r"(?<!\d)(?:\+33 ?|0033 ?|0)([1-9](?:[ .\-]?\d\d){4})(?!\d)")
+
+
+# --- NORMALISATION ---
+
+# Marques diacritiques isolées par NFKD (é -> e + accent aigu), supprimées
+DIACRITIQUES_RE = re.compile("[\u0300-\u036f]+")
+# Caractères sans décomposition NFKD : apostrophes typographiques et ligatures
+REMPLACEMENTS = (("\u2019", "'"), ("\u2018", "'"), ("\u02bc", "'"),
+                 ("œ", "oe"), ("æ", "ae"), ("ß", "ss"), (SEPARATEUR, " "))
+
+
+def normaliser_texte(texte):
+    """Minuscules, sans diacritiques (NFKD), apostrophes droites, espaces fusionnés."""
+    texte = unicodedata.normalize("NFKD", texte.lower())
+    if not texte.isascii():
+        texte = DIACRITIQUES_RE.sub("", texte)
+        for avant, apres in REMPLACEMENTS:
+            if avant in texte:
+                texte = texte.replace(avant, apres)
+    elif SEPARATEUR in texte:
+        texte = texte.replace(SEPARATEUR, " ")
+    return " ".join(texte.split())
+
+
+def chiffres_telephone(brut):
+    """Numéro au format national (0XXXXXXXXX) depuis une saisie libre ; chaîne vide si illisible."""
+    chiffres = re.sub(r"\D", "", str(brut))
+    if chiffres.startswith("33") and len(chiffres) == 11:
+        chiffres = "0" + chiffres[2:]
+    elif chiffres.startswith("0033"):
+        chiffres = "0" + chiffres[4:]
+    return chiffres
+
+
+# --- COMPILATION ---
+
+def regex_trie(motifs):
+    """Alternation des motifs factorisée par préfixes communs ; la plus longue d'abord (quantificateurs gourmands)."""
+    trie = {}
+    for motif in motifs:
+        noeud = trie
+        for c in motif:
+            noeud = noeud.setdefault(c, {})
+        noeud[""] = None
+
+    def rendre(noeud):
+        branches = [re.escape(c) + rendre(suite) for c, suite in sorted(noeud.items()) if c != ""]
+        if not branches:
+            return ""
+        corps = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{corps})?" if "" in noeud else corps
+
+    return rendre(trie)
+
+
+def _charger_json(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} : objet JSON attendu")
+    return data
+
+
+class JeuRegles:
+    """
+    Règles compilées, immuables (partagées sans verrou entre threads). Une règle = (label, type,
+    score, motifs) comptée une fois par texte ; son indice est le premier motif de la règle trouvé.
+    """
+
+    def __init__(self, phrases=(), groupes=(), prefixes=(), version=None):
+        self.version = version
+        self.regles = []
+        self.motifs = {}  # motif normalisé -> indices des règles qui le contiennent
+        for phrase in phrases:
+            self._ajouter(LABEL_PHRASE, "danger", SCORE_PHRASE, [phrase])
+        for groupe in groupes:
+            self._ajouter(groupe["label"], groupe.get("type", "warning"), int(groupe["score"]), groupe["mots"])
+        self.prefixes = tuple(sorted({chiffres_telephone(p) for p in prefixes} - {""}))
+
+        # Motifs préfixes-mots d'un autre : trouvés à la même position que lui, la regex n'en rend qu'un
+        self.implique = {m: [p for p in self.motifs if p != m and m.startswith(p)
+                             and not re.match(r"\w", m[len(p)])] for m in self.motifs}
+        # Premier caractère testé avant le lookahead : rejet immédiat des positions sans motif possible
+        premiers = "".join(sorted({re.escape(m[0]) for m in self.motifs}))
+        self.regex = (re.compile(f"(?=[{premiers}])(?<!\\w)(?=(" + regex_trie(self.motifs) + r")(?!\w))")
+                      if self.motifs else None)
+
+    def _ajouter(self, label, type_, score, mots):
+        motifs = [m for m in dict.fromkeys(normaliser_texte(str(mot)) for mot in mots) if m]
+        if not motifs:
+            return
+        i = len(self.regles)
+        self.regles.append((label, type_, score, motifs))
+        for m in motifs:
+            self.motifs.setdefault(m, []).append(i)
+
+    @classmethod
+    def depuis_fichiers(cls, patterns_path, regles_path):
+        patterns, regles = _charger_json(patterns_path), _charger_json(regles_path)
+        empreinte = hashlib.sha1(json.dumps([patterns, regles], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return cls(patterns.get("phrases", []), regles.get("mots_cles", []), patterns.get("phones", []),
+                   version=empreinte.hexdigest()[:12])
+
+    def __len__(self):
+        return len(self.regles) + len(self.prefixes)
+
+    # --- SCORE ---
+
+    def _resultat(self, trouves, telephones):
+        """Score et détails d'un texte depuis ses motifs trouvés (set) et ses numéros (liste ordonnée)."""
+        regles = sorted({i for m in trouves for i in self.motifs[m]})
+        details, score = [], 0
+        for i in regles:
+            label, type_, points, motifs = self.regles[i]
+            indice = next(m for m in motifs if m in trouves)
+            score += points
+            details.append({"label": label, "type": type_, "score": points, "evidence": indice})
+        for numero in dict.fromkeys(telephones):
+            if self.prefixes and numero.startswith(self.prefixes):
+                score += SCORE_TELEPHONE
+                details.append({"label": LABEL_TELEPHONE, "type": "warning", "score": SCORE_TELEPHONE,
+                                "evidence": next(p for p in self.prefixes if numero.startswith(p))})
+        return {"score": min(score, SCORE_MAX), "details": details}
+
+    def scorer_lot(self, descriptions, telephones=None):
+        """
+        Scores d'une liste de descriptions (None = vide), dans l'ordre. `telephones` : numéro saisi
+        par annonce (ou None), vérifié en plus de ceux trouvés dans le texte.
+        """
+        textes = [normaliser_texte(d) if d else "" for d in descriptions]
+        n = len(textes)
+        # Un seul texte pour tout le lot, une seule passe de chaque expression ; l'offset d'une
+        # correspondance donne son texte (bisect sur les débuts)
+        joint = SEPARATEUR.join(textes)
+        debuts = [0, *accumulate(len(t) + 1 for t in textes)][:n]
+        trouves = [set() for _ in range(n)]
+        if self.regex is not None:
+            for m in self.regex.finditer(joint):
+                motif = m.group(1)
+                cible = trouves[bisect.bisect_right(debuts, m.start()) - 1]
+                cible.add(motif)
+                cible.update(self.implique[motif])
+        numeros = [[] for _ in range(n)]
+        if self.prefixes:
+            for m in TELEPHONE_RE.finditer(joint):
+                numeros[bisect.bisect_right(debuts, m.start()) - 1].append("0" + re.sub(r"\D", "", m.group(1)))
+            for i, tel in enumerate(telephones or ()):
+                if tel:
+                    numeros[i].append(chiffres_telephone(tel))
+        return [self._resultat(t, num) for t, num in zip(trouves, numeros)]
+
+    def scorer(self, description, telephone=None):
+        return self.scorer_lot([description], [telephone])[0]
+
+
+def scorer_naif(jeu, descriptions, telephones=None):
+    """Référence : chaque motif cherché séparément dans chaque texte (ce que fait le backend Node)."""
+    recherches = {m: re.compile(r"(?<!\w)" + re.escape(m) + r"(?!\w)") for m in jeu.motifs}
+    resultats = []
+    for i, d in enumerate(descriptions):
+        texte = normaliser_texte(d) if d else ""
+        trouves = {m for m, rx in recherches.items() if rx.search(texte)}
+        numeros = ["0" + re.sub(r"\D", "", m.group(1)) for m in TELEPHONE_RE.finditer(texte)] if jeu.prefixes else []
+        tel = telephones[i] if telephones else None
+        if tel and jeu.prefixes:
+            numeros.append(chiffres_telephone(tel))
+        resultats.append(jeu._resultat(trouves, numeros))
+    return resultats
+
+
+# --- RECHARGEMENT À CHAUD ---
+
+class MoteurRisque:
+    """Jeu de règles courant + surveillance des fichiers sources (mtime, taille)."""
+
+    def __init__(self, patterns_path=PATTERNS_FILE, regles_path=REGLES_FILE, reload_s=RELOAD_S):
+        self.chemins = (patterns_path, regles_path)
+        self.reload_s = reload_s
+        self.rechargements = 0
+        self.erreurs = 0
+        self._prochaine_verif = 0.0
+        self._lock = threading.Lock()
+        self._signature = self._stat()
+        self.jeu = JeuRegles.depuis_fichiers(*self.chemins)
+        logger.info("🚩 Règles de risque %s : %d règles, %d motifs, %d préfixes téléphoniques",
+                    self.jeu.version, len(self.jeu.regles), len(self.jeu.motifs), len(self.jeu.prefixes))
+
+    @classmethod
+    def depuis_env(cls):
+        return cls(os.environ.get("ARGUS_PATTERNS") or PATTERNS_FILE,
+                   os.environ.get("ARGUS_RISQUE_REGLES") or REGLES_FILE,
+                   float(os.environ.get("ARGUS_RISQUE_RELOAD_S", RELOAD_S)))
+
+    def _stat(self):
+        signature = []
+        for path in self.chemins:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def actuel(self):
+        """Jeu de règles à utiliser, recompilé d'abord si un fichier source a changé."""
+        if self.reload_s > 0 and time.monotonic() >= self._prochaine_verif:
+            self.recharger()
+        return self.jeu
+
+    def recharger(self, force=False):
+        # Un seul thread recompile ; les autres continuent avec le jeu courant
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._prochaine_verif = time.monotonic() + self.reload_s
+            signature = self._stat()
+            if signature == self._signature and not force:
+                return False
+            try:
+                jeu = JeuRegles.depuis_fichiers(*self.chemins)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.erreurs += 1
+                logger.warning("Règles de risque invalides (%s) : jeu %s conservé", e, self.jeu.version)
+                self._signature = signature  # Pas de nouvel essai avant la prochaine modification
+                return False
+            self._signature = signature
+            ancienne, self.jeu = self.jeu.version, jeu
+            self.rechargements += 1
+            logger.info("🔄 Règles de risque rechargées : %s -> %s (%d règles)", ancienne, jeu.version, len(jeu.regles))
+            return True
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        jeu = self.jeu
+        return {"version": jeu.version, "regles": len(jeu.regles), "motifs": len(jeu.motifs),
+                "prefixes": len(jeu.prefixes), "rechargements": self.rechargements, "erreurs": self.erreurs}
@@ -0,0 +1,436 @@
+# Fichier: argus_snapshot.py
+# Instantané binaire du référentiel prêt à servir : index de segments, tables de repli et
+# facettes, construits une fois (au build) puis rechargés tels quels au démarrage du service.
+#
+# Le démarrage à froid ne relit plus le CSV et ne reconstruit plus les dictionnaires : un seul
+# pickle (ramasse-miettes suspendu pendant le chargement). L'instantané porte l'empreinte de ses
+# fichiers sources : s'il est périmé ou écrit par une autre version de Python/NumPy, le service
+# reconstruit depuis les fichiers, comme avant. Ne charger que des instantanés produits localement.
+#
+# Remplacement à chaud (ReferentielServi) : toutes les ARGUS_REFERENTIEL_RELOAD_S secondes, une
+# requête compare mtime/taille des fichiers servis ; s'ils ont changé, le nouveau bundle est
+# construit dans un thread d'arrière-plan pendant que les requêtes continuent sur l'ancien, puis
+# remplace l'ancien d'une seule affectation. Publication par marqueur de version : quand le fichier
+# de métadonnées existe (écrit en dernier par le build), seul un changement de sa version déclenche
+# la reconstruction, et la bascule n'a lieu que si l'empreinte des fichiers chargés est celle du
+# marqueur ; sinon (build en cours, fichier republié seul) l'ancien bundle reste servi. Sans
+# marqueur, tout changement des fichiers servis déclenche la reconstruction.
+# Publient par la chaîne complète (marqueur en dernier) : ArgusBuilder, argus_incremental init /
+# update et argus_streaming (argus_incremental.publier_referentiel). Les CLI argus_store et
+# argus_snapshot ne produisent qu'un fichier dérivé et ne publient pas de nouvelle version. Chaque requête lit le bundle une fois et l'utilise
+# jusqu'au bout : jamais d'index d'une version avec le repli d'une autre. Sous gunicorn, chaque
+# worker recharge de son côté (le nouveau bundle n'est plus partagé en copie-sur-écriture).
+#
+# Usage : python argus_snapshot.py [--referentiel P] [--backoff P] [--output argus_snapshot_v21.pkl]
+
+import os
+import gc
+import sys
+import time
+import json
+import pickle
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+import argus_store
+import argus_backoff
+import argus_cache
+from argus_index import SegmentIndex, charger_colonnes_referentiel
+from argus_backoff import BackoffIndex
+from argus_facettes import FacetIndex
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_SNAPSHOT = "argus_snapshot_v21.pkl"
+SNAPSHOT_FORMAT = 3  # À incrémenter dès que la structure des index change (3 : courbes prix / km)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Ordre de recherche des fichiers servis : variable d'environnement, export colonnaire local, CSV du backend
+REFERENTIEL_CANDIDATS = (
+    os.path.join(BASE_DIR, argus_store.OUTPUT_COLUMNAR),
+    os.path.join(BASE_DIR, "argus_referentiel_v21.csv"),
+    os.path.join(BASE_DIR, "..", "backend", "argus_referentiel_v21.csv"),
+)
+BACKOFF_CANDIDATS = (os.path.join(BASE_DIR, argus_backoff.OUTPUT_BACKOFF),)
+SNAPSHOT_CANDIDATS = (os.path.join(BASE_DIR, OUTPUT_SNAPSHOT),)
+# Métadonnées de build (ArgusBuilder.sauvegarder_metadata), affichées par /health si elles
+# décrivent la version servie
+OUTPUT_METADATA = "argus_metadata_v21.json"
+METADATA_CANDIDATS = (os.path.join(BASE_DIR, OUTPUT_METADATA),
+                      os.path.join(BASE_DIR, "..", "backend", OUTPUT_METADATA))
+# Intervalle de vérification des fichiers servis (0 : pas de remplacement à chaud)
+RELOAD_S = 10.0
+
+
+def _plus_ancien(path, autre):
+    try:
+        return os.stat(path).st_mtime_ns < os.stat(autre).st_mtime_ns
+    except OSError:
+        return False
+
+
+def trouver_referentiel():
+    env_path = os.environ.get("ARGUS_REFERENTIEL")
+    if env_path:
+        return env_path
+    colonnaire, csv_local = REFERENTIEL_CANDIDATS[:2]
+    # Export colonnaire plus ancien que le CSV dont il est tiré : périmé, le CSV republié est servi
+    candidats = REFERENTIEL_CANDIDATS[1:] if _plus_ancien(colonnaire, csv_local) else REFERENTIEL_CANDIDATS
+    return next((p for p in candidats if os.path.exists(p)), None)
+
+
+def trouver_backoff():
+    return os.environ.get("ARGUS_BACKOFF") or next((p for p in BACKOFF_CANDIDATS if os.path.exists(p)), None)
+
+
+def trouver_snapshot():
+    return os.environ.get("ARGUS_SNAPSHOT") or next((p for p in SNAPSHOT_CANDIDATS if os.path.exists(p)), None)
+
+
+def trouver_metadata():
+    return os.environ.get("ARGUS_METADATA") or next((p for p in METADATA_CANDIDATS if os.path.exists(p)), None)
+
+
+def sources_referentiel(referentiel_path=None, backoff_path=None):
+    """
+    Fichiers dont dépend le référentiel servi : référentiel + tables de repli précalculées,
+    ou cote officielle quand les tables sont reconstruites au chargement.
+    """
+    referentiel_path = referentiel_path or trouver_referentiel()
+    backoff_path = backoff_path or trouver_backoff()
+    if backoff_path and os.path.exists(backoff_path):
+        return referentiel_path, backoff_path, None
+    return referentiel_path, None, argus_backoff.trouver_cote_officielle(BASE_DIR)
+
+
+def empreinte_sources(referentiel_path, backoff_path=None, officielle_path=None):
+    """Version du référentiel servi : toute modification d'un fichier source la change (et invalide le cache)."""
+    paths = [p for p in (referentiel_path, backoff_path, officielle_path) if p and os.path.exists(p)]
+    return argus_cache.empreinte_fichiers(*paths) if paths else None
+
+
+class BundleReferentiel:
+    """Tout ce que le service interroge, construit ensemble et remplacé d'un bloc."""
+
+    def __init__(self, index, backoff, facettes, version, source):
+        self.index = index
+        self.backoff = backoff
+        self.facettes = facettes
+        self.version = version
+        self.source = source
+
+    @classmethod
+    def construire(cls, referentiel_path, backoff_path=None, officielle_path=None, timings=None):
+        """Construction depuis les fichiers. `timings` (dict) reçoit chargement_s et construction_index_s."""
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        colonnes = charger_colonnes_referentiel(referentiel_path)
+        tables = argus_backoff.charger_tables(backoff_path) if backoff_path else None
+        timings['chargement_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = SegmentIndex(colonnes, source=os.path.basename(referentiel_path))
+        if tables is None:
+            tables = argus_backoff.construire_tables(index.colonnes, officielle_path)
+        backoff = BackoffIndex(index, tables)
+        facettes = FacetIndex(index.colonnes)
+        timings['construction_index_s'] = time.perf_counter() - start
+        version = empreinte_sources(referentiel_path, backoff_path, officielle_path)
+        return cls(index, backoff, facettes, version, index.source)
+
+
+def metadata_build(version, sources, **extra):
+    """Métadonnées d'une version du référentiel : empreinte du contenu, date, fichiers et format."""
+    return {
+        'version': version,
+        'construit_le': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'sources': {os.path.basename(p): os.path.getsize(p) for p in sources if p and os.path.exists(p)},
+        'snapshot_format': SNAPSHOT_FORMAT,
+        **extra,
+    }
+
+
+def ecrire_metadata(metadata, path=OUTPUT_METADATA):
+    """Écriture atomique du marqueur de version : à faire en dernier, une fois tous les fichiers en place."""
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _lire_marqueur(path=None):
+    path = path or trouver_metadata()
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return metadata if isinstance(metadata, dict) and metadata.get('version') else None
+
+
+def version_publiee(path=None):
+    """Version annoncée par le marqueur (fichier de métadonnées), ou None : pas de publication par marqueur."""
+    metadata = _lire_marqueur(path)
+    return metadata['version'] if metadata is not None else None
+
+
+def lire_metadata(version, path=None):
+    """Métadonnées de build de `version`, ou None (fichier absent, illisible ou d'une autre version)."""
+    metadata = _lire_marqueur(path)
+    return metadata if metadata is not None and metadata['version'] == version else None
+
+
+def _entete():
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'python': list(sys.version_info[:2]),
+        'numpy': np.__version__,
+    }
+
+
+def ecrire_snapshot(bundle, path=OUTPUT_SNAPSHOT):
+    """Écriture atomique (fichier temporaire puis os.replace) : un lecteur ne voit jamais un fichier partiel."""
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        pickle.dump({**_entete(), 'version': bundle.version}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def charger_snapshot(path, version=None, timings=None):
+    """
+    Bundle de l'instantané, ou None s'il est incompatible (format, Python, NumPy) ou périmé
+    (`version` différente de celle des sources ; None = pas de vérification).
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            entete = pickle.load(f)
+            attendu = _entete()
+            if {k: entete.get(k) for k in attendu} != attendu:
+                logger.warning("Instantané %s incompatible (%s), reconstruction depuis les fichiers",
+                               path, {k: entete.get(k) for k in attendu})
+                return None
+            if version is not None and entete.get('version') != version:
+                logger.warning("Instantané %s périmé (version %s, sources %s), reconstruction depuis les fichiers",
+                               path, entete.get('version'), version)
+                return None
+            # Des centaines de milliers de petits objets (clés de dictionnaires) : le ramasse-miettes
+            # n'a rien à libérer pendant le chargement, il ne ferait que le ralentir
+            gc_actif = gc.isenabled()
+            gc.disable()
+            try:
+                bundle = pickle.load(f)
+            finally:
+                if gc_actif:
+                    gc.enable()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        logger.warning("Instantané %s illisible (%s), reconstruction depuis les fichiers", path, e)
+        return None
+    timings['chargement_s'] = time.perf_counter() - start
+    timings['construction_index_s'] = 0.0
+    return bundle
+
+
+
+def charger_bundle(demarrage=None):
+    """
+    Index, repli et facettes : instantané binaire s'il correspond aux fichiers sources,
+    sinon construction depuis les fichiers. `demarrage` reçoit la source et les durées.
+    """
+    demarrage = {} if demarrage is None else demarrage
+    referentiel, backoff, officielle = sources_referentiel()
+    snapshot = trouver_snapshot()
+    if referentiel is None or not os.path.exists(referentiel):
+        if snapshot is None:
+            logger.critical("❌ Référentiel V21 introuvable (%s). /predict indisponible.", referentiel or 'aucun candidat')
+            return None
+        version = None  # Instantané seul déployé : servi sans vérification de fraîcheur
+    else:
+        start = time.perf_counter()
+        version = empreinte_sources(referentiel, backoff, officielle)
+        demarrage['empreinte_s'] = time.perf_counter() - start
+
+    if snapshot is not None:
+        bundle = charger_snapshot(snapshot, version, demarrage)
+        if bundle is not None:
+            demarrage['source'] = 'snapshot'
+            logger.info("📦 Instantané chargé : %d segments (%s, version %s) en %.2fs",
+                        len(bundle.index), bundle.source, bundle.version, demarrage['chargement_s'])
+            return bundle
+        if version is None:
+            return None
+
+    bundle = BundleReferentiel.construire(referentiel, backoff, officielle, demarrage)
+    demarrage['source'] = 'fichiers'
+    logger.info("📚 Référentiel chargé : %d segments (%s) en %.2fs", len(bundle.index), bundle.source,
+                demarrage['chargement_s'] + demarrage['construction_index_s'])
+    return bundle
+
+
+class ReferentielServi:
+    """Bundle courant + remplacement à chaud quand les fichiers servis changent."""
+
+    def __init__(self, reload_s=RELOAD_S):
+        self.reload_s = reload_s
+        self.demarrage = {}
+        self.bundle = charger_bundle(self.demarrage)
+        self.chargement = self.demarrage.get('source')  # snapshot ou fichiers
+        self.metadata = lire_metadata(self.bundle.version) if self.bundle is not None else None
+        publiee = version_publiee()
+        if self.bundle is not None and publiee is not None and publiee != self.bundle.version:
+            logger.warning("Référentiel servi en version %s, marqueur en version %s : publication incomplète ?",
+                           self.bundle.version, publiee)
+        self.bascules = 0
+        self.erreurs = 0
+        self.precedente = None
+        self.derniere_bascule = None
+        self._lock = threading.Lock()
+        self._signature = self._stat()
+        self._prochaine_verif = time.monotonic() + reload_s
+
+    @classmethod
+    def depuis_env(cls):
+        return cls(float(os.environ.get("ARGUS_REFERENTIEL_RELOAD_S", RELOAD_S)))
+
+    @staticmethod
+    def _stat():
+        """
+        (chemin, mtime, taille) des fichiers qui seraient chargés maintenant, des CSV candidats (un CSV
+        republié seul est détecté même si l'export colonnaire est servi), de l'instantané et du marqueur.
+        """
+        signature = []
+        candidats = tuple(p for p in REFERENTIEL_CANDIDATS if p.endswith('.csv'))
+        for path in (*sources_referentiel(), *candidats, trouver_snapshot(), trouver_metadata()):
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except (OSError, TypeError):
+                signature.append((path, None))
+        return tuple(signature)
+
+    @property
+    def en_cours(self):
+        return self._lock.locked()
+
+    def actuel(self):
+        """Bundle à utiliser pour toute la requête ; lance la reconstruction si les fichiers ont changé."""
+        if self.reload_s > 0 and time.monotonic() >= self._prochaine_verif:
+            self.verifier()
+        return self.bundle
+
+    def verifier(self, force=False, attendre=False):
+        """True si une reconstruction est lancée (`attendre` : terminée au retour)."""
+        # Une seule reconstruction à la fois, libérée par le thread qui la mène
+        if not self._lock.acquire(blocking=False):
+            return False
+        self._prochaine_verif = time.monotonic() + self.reload_s
+        signature = self._stat()
+        if signature == self._signature and not force:
+            self._lock.release()
+            return False
+        publiee = version_publiee()
+        if publiee is not None and self.bundle is not None and publiee == self.bundle.version and not force:
+            # Marqueur inchangé : build en cours ou fichier republié sans nouvelle version, rien à basculer
+            if signature[:-1] != self._signature[:-1]:
+                logger.info("Fichiers du référentiel modifiés sans nouveau marqueur de version : version %s conservée",
+                            publiee)
+            self.metadata = lire_metadata(publiee)
+            self._signature = signature
+            self._lock.release()
+            return False
+        if publiee is None and signature[:-1] == self._signature[:-1] and not force:
+            self._signature = signature  # Sans marqueur : métadonnées seules, pas de reconstruction
+            self._lock.release()
+            return False
+        thread = threading.Thread(target=self._reconstruire, args=(signature, time.perf_counter()),
+                                  name="argus-referentiel", daemon=True)
+        thread.start()
+        if attendre:
+            thread.join()
+        return True
+
+    def _reconstruire(self, signature, detection):
+        try:
+            demarrage = {}
+            try:
+                bundle = charger_bundle(demarrage)
+                if bundle is None:
+                    raise FileNotFoundError("référentiel introuvable")
+            except Exception as e:  # Fichier en cours d'écriture, CSV tronqué... : l'ancien bundle reste servi
+                self.erreurs += 1
+                self._signature = signature  # Pas de nouvel essai avant la prochaine modification
+                logger.warning("Rechargement du référentiel impossible (%s) : version %s conservée",
+                               e, self.bundle.version if self.bundle is not None else None)
+                return
+            if self._stat() != signature:
+                # Fichiers encore modifiés pendant la construction : nouvel essai à la prochaine vérification
+                logger.info("Fichiers du référentiel modifiés pendant le rechargement, nouvel essai")
+                return
+            self._signature = signature
+            publiee = version_publiee()
+            if publiee is not None and bundle.version != publiee:
+                # Fichiers d'une autre version que le marqueur (publication incomplète) : jamais de bundle mélangé
+                self.erreurs += 1
+                logger.warning("Référentiel chargé en version %s, marqueur en version %s : version %s conservée",
+                               bundle.version, publiee, self.bundle.version if self.bundle is not None else None)
+                return
+            ancien = self.bundle
+            metadata = lire_metadata(bundle.version)
+            if ancien is not None and bundle.version == ancien.version:
+                self.metadata = metadata  # Fichiers touchés, contenu identique
+                return
+            start = time.perf_counter()
+            self.bundle, self.metadata, self.chargement = bundle, metadata, demarrage.get('source')
+            bascule_s = time.perf_counter() - start
+            self.bascules += 1
+            self.precedente = {"version": ancien.version, "source": ancien.source,
+                               "segments": len(ancien.index)} if ancien is not None else None
+            self.derniere_bascule = {
+                "de": self.precedente['version'] if self.precedente else None, "vers": bundle.version,
+                "date": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                "chargement": demarrage.get('source'),
+                "construction_s": round(demarrage.get('chargement_s', 0.0) + demarrage.get('construction_index_s', 0.0)
+                                        + demarrage.get('empreinte_s', 0.0), 4),
+                "detection_a_bascule_s": round(time.perf_counter() - detection, 4),
+                "bascule_us": round(bascule_s * 1e6, 2),
+            }
+            logger.info("🔁 Référentiel remplacé à chaud : %s -> %s (%d segments, construit en %.2fs)",
+                        self.derniere_bascule['de'], bundle.version, len(bundle.index),
+                        self.derniere_bascule['construction_s'])
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return {"intervalle_s": self.reload_s, "en_cours": self.en_cours, "bascules": self.bascules,
+                "erreurs": self.erreurs, "precedente": self.precedente, "derniere_bascule": self.derniere_bascule}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [%(levelname)s] - %(message)s')
+    parser = argparse.ArgumentParser(description="Construit l'instantané binaire chargé au démarrage par api_ia")
+    parser.add_argument("--referentiel", default=None, help="Défaut : même recherche que api_ia")
+    parser.add_argument("--backoff", default=None, help="Défaut : même recherche que api_ia")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, OUTPUT_SNAPSHOT))
+    args = parser.parse_args()
+
+    referentiel, backoff, officielle = sources_referentiel(args.referentiel, args.backoff)
+    if referentiel is None or not os.path.exists(referentiel):
+        logger.critical("Référentiel V21 introuvable (%s)", referentiel or 'aucun candidat')
+        sys.exit(1)
+    timings = {}
+    # Classe référencée par son module (et non __main__) pour que le service puisse la dépickler
+    import argus_snapshot
+    bundle = argus_snapshot.BundleReferentiel.construire(referentiel, backoff, officielle, timings)
+    taille = ecrire_snapshot(bundle, args.output)
+    logger.info("Instantané écrit : %s (%.1f Mo, %d segments, version %s, construction %.2fs)",
+                args.output, taille / 1e6, len(bundle.index), bundle.version,
+                timings['chargement_s'] + timings['construction_index_s'])
@@ -0,0 +1,187 @@
+# Fichier: argus_store.py
+# Format colonnaire binaire du référentiel (export + chargement memory-mappé).
+#
+# Un seul fichier : en-tête JSON + blocs de données alignés (un tableau NumPy par colonne).
+# Les colonnes texte sont encodées en dictionnaire (codes entiers + table des valeurs).
+# Le chargement ne parse rien : np.memmap en lecture seule, les pages sont partagées
+# entre les workers gunicorn via le cache du système.
+# Aucune dépendance à pandas ici (seul l'export/conversion depuis un DataFrame l'utilise).
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+
+import numpy as np
+
+MAGIC = b"ARGUSCOL"
+FORMAT_VERSION = 1
+ALIGNEMENT = 64
+COLUMNAR_EXT = ".cols"
+OUTPUT_COLUMNAR = "argus_referentiel_v21" + COLUMNAR_EXT
+
+
+def _code_dtype(n_categories):
+    if n_categories < 2 ** 15: return np.int16
+    return np.int32
+
+
+def _aligner(offset):
+    return (offset + ALIGNEMENT - 1) // ALIGNEMENT * ALIGNEMENT
+
+
+def ecrire_colonnes(colonnes, path, meta=None):
+    """
+    Écrit un dict {nom: tableau 1D} au format colonnaire.
+    Les tableaux texte (dtype objet / unicode) sont encodés en dictionnaire.
+    L'écriture passe par un fichier temporaire puis os.replace (remplacement atomique).
+    """
+    blocs = []
+    entetes = []
+    n_rows = None
+    for nom, valeurs in colonnes.items():
+        valeurs = np.asarray(valeurs)
+        if n_rows is None: n_rows = len(valeurs)
+        if len(valeurs) != n_rows:
+            raise ValueError(f"Colonne {nom} : {len(valeurs)} lignes au lieu de {n_rows}")
+
+        if valeurs.dtype.kind in ('O', 'U', 'S'):
+            categories, codes = np.unique(valeurs.astype(str), return_inverse=True)
+            codes = codes.astype(_code_dtype(len(categories)))
+            entetes.append({'nom': nom, 'type': 'dict', 'codes': len(blocs), 'categories': len(blocs) + 1})
+            blocs += [codes, categories]
+        else:
+            entetes.append({'nom': nom, 'type': 'num', 'valeurs': len(blocs)})
+            blocs.append(np.ascontiguousarray(valeurs))
+
+    descripteurs = []
+    offset = 0
+    for bloc in blocs:
+        offset = _aligner(offset)
+        descripteurs.append({'dtype': bloc.dtype.str, 'count': int(bloc.size), 'offset': offset})
+        offset += bloc.nbytes
+
+    header = json.dumps({
+        'version': FORMAT_VERSION, 'n_rows': n_rows or 0, 'colonnes': entetes,
+        'blocs': descripteurs, 'meta': meta or {}
+    }, ensure_ascii=False).encode('utf-8')
+    debut_donnees = _aligner(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for bloc, desc in zip(blocs, descripteurs):
+            f.seek(debut_donnees + desc['offset'])
+            f.write(bloc.tobytes())
+    os.replace(tmp_path, path)
+
+
+def ecrire_dataframe(df, path, meta=None):
+    """Export d'un DataFrame (colonnes dans l'ordre du DataFrame)."""
+    colonnes = {}
+    for col in df.columns:
+        serie = df[col]
+        colonnes[col] = serie.to_numpy(dtype=str) if serie.dtype.kind not in 'biuf' else serie.to_numpy()
+    ecrire_colonnes(colonnes, path, meta)
+
+
+class TableColonnes:
+    """Référentiel colonnaire memory-mappé (lecture seule)."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} n'est pas un fichier colonnaire Argus")
+            (taille_header,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(taille_header).decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Version de format colonnaire non supportée : {header['version']}")
+
+        debut_donnees = _aligner(len(MAGIC) + 8 + taille_header)
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        self._blocs = [
+            np.frombuffer(self._mmap, dtype=np.dtype(d['dtype']), count=d['count'], offset=debut_donnees + d['offset'])
+            for d in header['blocs']
+        ]
+        self._colonnes = {c['nom']: c for c in header['colonnes']}
+        self.noms = [c['nom'] for c in header['colonnes']]
+        self.n_rows = header['n_rows']
+        self.meta = header['meta']
+
+    def __len__(self):
+        return self.n_rows
+
+    def est_dictionnaire(self, nom):
+        return self._colonnes[nom]['type'] == 'dict'
+
+    def codes(self, nom):
+        return self._blocs[self._colonnes[nom]['codes']]
+
+    def categories(self, nom):
+        return self._blocs[self._colonnes[nom]['categories']]
+
+    def __getitem__(self, nom):
+        """Valeurs de la colonne (les colonnes texte sont décodées, donc copiées)."""
+        col = self._colonnes[nom]
+        if col['type'] == 'dict':
+            return self.categories(nom)[self.codes(nom)]
+        return self._blocs[col['valeurs']]
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({nom: self[nom] for nom in self.noms})
+
+
+def charger_colonnes(path=OUTPUT_COLUMNAR):
+    return TableColonnes(path)
+
+
+def convertir_csv(csv_path, out_path=None):
+    """Conversion CSV (format d'échange) -> colonnaire."""
+    import pandas as pd
+    out_path = out_path or os.path.splitext(csv_path)[0] + COLUMNAR_EXT
+    df = pd.read_csv(csv_path, sep=';', keep_default_na=False)
+    ecrire_dataframe(df, out_path, meta={'source': os.path.basename(csv_path)})
+    return out_path
+
+
+def comparer_chargements(csv_path, cols_path, repetitions=5):
+    """Temps de chargement CSV (pandas) vs colonnaire (mmap), en millisecondes (meilleur essai)."""
+    import pandas as pd
+
+    def mesurer(fn):
+        best = float('inf')
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return round(best * 1000, 3)
+
+    def csv_load():
+        pd.read_csv(csv_path, sep=';')
+
+    def cols_load():
+        table = charger_colonnes(cols_path)
+        for nom in table.noms:
+            table.codes(nom) if table.est_dictionnaire(nom) else table[nom]
+
+    return {'csv_ms': mesurer(csv_load), 'colonnaire_ms': mesurer(cols_load)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / chargement colonnaire du référentiel Argus")
+    parser.add_argument("csv", help="Référentiel CSV (séparateur ;)")
+    parser.add_argument("-o", "--output", help="Fichier colonnaire de sortie (défaut : même nom en .cols)")
+    parser.add_argument("--bench", action="store_true", help="Compare les temps de chargement CSV vs colonnaire")
+    args = parser.parse_args()
+
+    out = convertir_csv(args.csv, args.output)
+    print(f"✅ Export colonnaire : {out} ({os.path.getsize(out)} octets)")
+    if args.bench:
+        print(json.dumps(comparer_chargements(args.csv, out), indent=2))
+    sys.exit(0)
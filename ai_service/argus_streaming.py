@@ -0,0 +1,270 @@
+# Fichier: argus_streaming.py
+# Ingestion en flux du dataset LeBonCoin brut : lecture par morceaux, sans jamais
+# matérialiser la table complète.
+#
+# Chaque morceau est lu avec des types explicites (catégories pour le texte, entiers pour
+# les numériques, colonne Titre ignorée), normalisé une seule fois (upper/strip appliqués aux
+# catégories, pas aux lignes), encodé en codes numériques (Vocabulaire), puis agrégé en
+# statistiques suffisantes par (segment, prix) (voir argus_incremental.StatsSegments). L'imputation des puissances est différée à la fin :
+# elle ne dépend que des comptages globaux, le résultat est donc identique au chemin en mémoire
+# tant qu'aucun segment ne dépasse la capacité du sketch.
+
+import os
+import sys
+import json
+import time
+import io
+import hashlib
+import logging
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import argus_metrics
+from ArgusBuilder import ArgusEngine, INPUT_FILE, SEGMENT_COLS
+from argus_incremental import StatsSegments, CELL_COLS, STATS_FILE, comparer_referentiels, publier_referentiel
+
+logger = logging.getLogger("ArgusStreaming")
+
+# --- CONFIGURATION ---
+CHUNKSIZE = 50_000
+MORCEAUX_PAR_FUSION = 8  # Nb de morceaux agrégés avant fusion dans les statistiques
+
+STRING_COLS = ['Marque', 'Modèle', 'Énergie', 'Boîte', 'Finition']
+# Année/Puissance tiennent en int32 ; Kilométrage/Prix restent en int64 (valeurs aberrantes du scrape)
+NUM_DTYPES = {'Année': np.int32, 'Puissance': np.int32, 'Kilométrage': np.int64, 'Prix': np.int64}
+
+# Valeur produite par astype(str).str.upper().str.strip() sur un NaN : 'NAN' avant pandas 3,
+# NaN conservé ensuite. On la reproduit pour rester aligné sur ArgusEngine.charger_donnees.
+_NAN_NORMALISE = pd.Series([np.nan], dtype=object).astype(str).str.upper().str.strip().iloc[0]
+
+
+class Vocabulaire:
+    """
+    Codes globaux des chaînes normalisées (une table par colonne texte) et des segments complets.
+    Les statistiques s'accumulent sur un identifiant de segment numérique, bien plus compact que
+    sept colonnes dont cinq de chaînes Python ; le décodage n'a lieu que sur le référentiel final.
+    """
+
+    def __init__(self):
+        self.codes = {col: {} for col in STRING_COLS}
+        self.segments = {}
+
+    def _table(self, col, categories):
+        codes = self.codes[col]
+        normalise = categories.astype(str).str.upper().str.strip()
+        table = [codes.setdefault(v, len(codes)) for v in normalise]
+        # Dernière entrée : code des valeurs manquantes (cat.codes == -1)
+        if isinstance(_NAN_NORMALISE, str):
+            table.append(codes.setdefault(_NAN_NORMALISE, len(codes)))
+        else:
+            table.append(np.nan)
+        return np.array(table, dtype=np.float64)
+
+    def identifiants(self, cles):
+        """Identifiant de chaque tuple de clé (créé à la première rencontre)."""
+        segments = self.segments
+        return np.array([segments.setdefault(cle, len(segments)) for cle in cles], dtype=np.float64)
+
+    def encoder(self, chunk):
+        for col in STRING_COLS:
+            cat = chunk[col].cat
+            chunk[col] = self._table(col, cat.categories)[cat.codes.to_numpy()]
+        # Segment brut (puissance non imputée) ; NaN si une composante manque, comme dropna
+        groupes = chunk.groupby(SEGMENT_COLS, sort=False)
+        local = groupes.ngroup().to_numpy(dtype=np.float64)
+        ids = self.identifiants(groupes.size().index)
+        connu = ~np.isnan(local)
+        segment = np.full(len(chunk), np.nan)
+        segment[connu] = ids[local[connu].astype(np.int64)]
+        chunk['Segment'] = segment
+        return chunk
+
+    def table_segments(self):
+        """Composantes (codées) de chaque segment, indexées par identifiant."""
+        return pd.DataFrame(list(self.segments), columns=SEGMENT_COLS)
+
+    def decoder(self, df):
+        """Codes -> chaînes normalisées pour les colonnes texte présentes."""
+        df = df.copy()
+        for col in STRING_COLS:
+            if col not in df.columns:
+                continue
+            valeurs = np.array(list(self.codes[col]), dtype=object)
+            codes = df[col].to_numpy(dtype=np.float64)
+            connu = ~np.isnan(codes)
+            out = np.full(len(codes), np.nan, dtype=object)
+            out[connu] = valeurs[codes[connu].astype(np.int64)]
+            df[col] = out
+        return df
+
+
+class StatsFlux(StatsSegments):
+    """StatsSegments indexées par identifiant de segment (Vocabulaire) plutôt que par SEGMENT_COLS."""
+
+    CLES = ['Segment']
+
+    def __init__(self, vocabulaire):
+        super().__init__()
+        self.vocabulaire = vocabulaire
+
+    def imputer_cellules(self):
+        """Imputation différée : chaque segment à puissance 0 est renommé vers celui de la puissance modale."""
+        table = self.vocabulaire.table_segments()
+        imputee = self.imputer(table)
+        changes = (imputee['Puissance'] != table['Puissance']).to_numpy()
+        if not changes.any():
+            return
+        cibles = np.arange(len(table), dtype=np.float64)
+        cibles[changes] = self.vocabulaire.identifiants(imputee.loc[changes, SEGMENT_COLS].itertuples(index=False, name=None))
+        cells = self.cellules.assign(Segment=cibles[self.cellules['Segment'].to_numpy(dtype=np.int64)])
+        cells = cells.groupby(self.CLES + ['Prix'], as_index=False, sort=True)[CELL_COLS].sum()
+        self.cellules = self._compresser(cells)
+
+    def _decoder_cles(self, keys):
+        table = self.vocabulaire.table_segments()
+        composantes = table.iloc[keys['Segment'].to_numpy(dtype=np.int64)].reset_index(drop=True)
+        return self.vocabulaire.decoder(composantes)
+
+    def calculer_referentiel(self, segments=None):
+        ref = super().calculer_referentiel(segments)
+        return ref.sort_values(SEGMENT_COLS, kind='mergesort').reset_index(drop=True)
+
+    def vers_stats_segments(self):
+        """StatsSegments classiques (clés en clair), pour argus_incremental update/check."""
+        cells = self.cellules
+        composantes = self._decoder_cles(cells[self.CLES])
+        cells = pd.concat([composantes, cells[['Prix'] + CELL_COLS].reset_index(drop=True)], axis=1)
+        cells = cells.sort_values(SEGMENT_COLS + ['Prix'], kind='mergesort').reset_index(drop=True)
+        return StatsSegments(cells, self.vocabulaire.decoder(self.puissances))
+
+
+def normaliser_morceau(chunk, vocabulaire):
+    """Normalisation d'un morceau (mêmes règles que ArgusEngine.charger_donnees), clés encodées."""
+    for col, dtype in NUM_DTYPES.items():
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).astype(dtype)
+    return vocabulaire.encoder(chunk)
+
+
+def lire_par_morceaux(path, vocabulaire, chunksize=CHUNKSIZE):
+    reader = pd.read_csv(
+        path, sep=';', usecols=STRING_COLS + list(NUM_DTYPES),
+        dtype={col: 'category' for col in STRING_COLS}, chunksize=chunksize
+    )
+    for chunk in reader:
+        yield normaliser_morceau(chunk, vocabulaire)
+
+
+def construire_stats_streaming(path, chunksize=CHUNKSIZE, etapes=None):
+    """Statistiques suffisantes complètes (imputation incluse) en un seul passage sur le fichier."""
+    if not os.path.exists(path):
+        logger.critical(f"Fichier {path} introuvable.")
+        sys.exit(1)
+    etapes = etapes if etapes is not None else argus_metrics.SuiviEtapes()
+    stats = StatsFlux(Vocabulaire())
+    tampon = []
+    lignes = 0
+    # Lecture, normalisation et agrégation sont entrelacées par morceau : une seule étape mesurée
+    with etapes.etape('lecture_agregation_flux') as m:
+        for chunk in lire_par_morceaux(path, stats.vocabulaire, chunksize):
+            lignes += len(chunk)
+            tampon.append(chunk)
+            if len(tampon) >= MORCEAUX_PAR_FUSION:
+                stats.accumuler(tampon)
+                tampon = []
+                logger.info(f"   -> {lignes} lignes lues, {len(stats.cellules)} cellules")
+        stats.accumuler(tampon)
+        m['lignes_entree'], m['lignes_sortie'] = lignes, len(stats.cellules)
+    with etapes.etape('imputation', len(stats.cellules)) as m:
+        stats.imputer_cellules()
+        m['lignes_sortie'] = len(stats.cellules)
+    logger.info(f"Flux terminé : {lignes} lignes, {len(stats.cellules)} cellules.")
+    return stats
+
+
+def construire_referentiel_streaming(path=INPUT_FILE, chunksize=CHUNKSIZE, etapes=None):
+    """Référentiel V21 construit en flux. Retourne (referentiel, stats) ; `etapes` : SuiviEtapes optionnel."""
+    etapes = etapes if etapes is not None else argus_metrics.SuiviEtapes()
+    stats = construire_stats_streaming(path, chunksize, etapes)
+    with etapes.etape('filtre_et_ajustement', len(stats.cellules)) as m:
+        referentiel = stats.calculer_referentiel()
+        m['lignes_sortie'] = len(referentiel)
+    logger.info(f"Référentiel V21 (flux) : {len(referentiel)} cotes uniques.")
+    return referentiel, stats
+
+
+# --- RAPPORT MÉMOIRE ---
+
+def _pic_rss_mo():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _executer_chemin(chemin, path, chunksize, queue):
+    logging.getLogger().setLevel(logging.WARNING)
+    rss_depart = _pic_rss_mo()
+    start = time.perf_counter()
+    if chemin == "memoire":
+        engine = ArgusEngine(path)
+        engine.construire_referentiel()
+        referentiel = engine.referentiel
+    else:
+        referentiel, _ = construire_referentiel_streaming(path, chunksize)
+    csv_out = referentiel.to_csv(sep=';', index=False)
+    queue.put({
+        'chemin': chemin,
+        'secondes': round(time.perf_counter() - start, 2),
+        'pic_rss_mo': round(_pic_rss_mo(), 1),
+        'rss_apres_imports_mo': round(rss_depart, 1),
+        'cotes': len(referentiel),
+        'sha256': hashlib.sha256(csv_out.encode('utf-8')).hexdigest(),
+        'csv': csv_out,
+    })
+
+
+def rapport_memoire(path=INPUT_FILE, chunksize=CHUNKSIZE):
+    """Pic de RSS des chemins en mémoire et en flux, chacun dans un processus neuf."""
+    ctx = multiprocessing.get_context("spawn")
+    resultats = []
+    for chemin in ("memoire", "flux"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_executer_chemin, args=(chemin, path, chunksize, queue))
+        proc.start()
+        resultats.append(queue.get())
+        proc.join()
+    # Identité octet à octet tant qu'aucun segment ne dépasse SKETCH_CAPACITY, tolérances au-delà
+    memoire, flux = (pd.read_csv(io.StringIO(r.pop('csv')), sep=';', keep_default_na=False) for r in resultats)
+    return {
+        'fichier': path,
+        'taille_fichier_mo': round(os.path.getsize(path) / (1024 * 1024), 1),
+        'chemins': resultats,
+        'identique': resultats[0]['sha256'] == resultats[1]['sha256'],
+        'ecarts': comparer_referentiels(flux, memoire),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construction du référentiel V21 en flux (par morceaux)")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--memory-report", action="store_true",
+                        help="Compare le pic de RSS des chemins en mémoire et en flux puis quitte")
+    parser.add_argument("--save-stats", nargs='?', const=STATS_FILE, metavar="NPZ",
+                        help=f"Écrit aussi les statistiques suffisantes (défaut : {STATS_FILE}) pour argus_incremental update")
+    args = parser.parse_args()
+
+    if args.memory_report:
+        print(json.dumps(rapport_memoire(args.input, args.chunksize), indent=2))
+        sys.exit(0)
+
+    engine = ArgusEngine(args.input)
+    engine.referentiel, stats = construire_referentiel_streaming(args.input, args.chunksize, engine.etapes)
+    if args.save_stats:
+        stats.vers_stats_segments().sauvegarder(args.save_stats)
+    # Même chaîne que le build complet, marqueur de version en dernier (sans l'index des
+    # comparables : le flux ne conserve pas les annonces)
+    publier_referentiel(engine)
@@ -0,0 +1,82 @@
+# Fichier: benchmarks/bench_backoff.py
+# Taux de réponse et coût du repli hiérarchique sur un échantillon de segments mis de côté.
+#
+# On retire une fraction des segments du référentiel, on reconstruit les tables de repli sur
+# le reste, puis on cote chaque segment retiré (au km de référence) : quel niveau répond,
+# avec quelle erreur relative vs la vraie cote, et en combien de temps.
+#
+# Usage : python benchmarks/bench_backoff.py [--holdout 0.1] [--seed 0]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import argus_backoff
+from argus_index import SegmentIndex, SEGMENT_COLS, charger_colonnes_referentiel
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENTIEL = os.path.join(BASE_DIR, "..", "backend", "argus_referentiel_v21.csv")
+
+
+def bench(referentiel_path, holdout, seed):
+    colonnes = charger_colonnes_referentiel(referentiel_path)
+    n = len(colonnes['Cote_Reference'])
+    rng = np.random.default_rng(seed)
+    test = rng.random(n) < holdout
+    train = {k: v[~test] for k, v in colonnes.items()}
+    officielle = argus_backoff.trouver_cote_officielle(BASE_DIR)
+
+    start = time.perf_counter()
+    tables = argus_backoff.construire_tables(train, officielle)
+    backoff = argus_backoff.BackoffIndex(SegmentIndex(train), tables)
+    construction_ms = (time.perf_counter() - start) * 1000
+
+    idx_test = np.flatnonzero(test)
+    cles = list(zip(*(np.asarray(colonnes[c])[idx_test].tolist() for c in SEGMENT_COLS)))
+    km_ref = colonnes['Km_Reference'][idx_test]
+    vraie_cote = colonnes['Cote_Reference'][idx_test]
+
+    noms = [nom for nom, _, _ in backoff.niveaux]
+    par_niveau = {nom: {'n': 0, 'erreurs': []} for nom in noms}
+    latences = []
+    manques = 0
+    for cle, km, cote in zip(cles, km_ref.tolist(), vraie_cote.tolist()):
+        start = time.perf_counter()
+        result, niveau = backoff.estimer(cle, km)
+        latences.append(time.perf_counter() - start)
+        if result is None:
+            manques += 1
+            continue
+        par_niveau[niveau]['n'] += 1
+        par_niveau[niveau]['erreurs'].append(abs(result.cote_affinee - cote) / max(cote, 1))
+
+    total = len(cles)
+    lat_us = np.asarray(latences) * 1e6
+    return {
+        'segments_test': total,
+        'taux_reponse': round(1 - manques / total, 4) if total else 0.0,
+        'construction_tables_ms': round(construction_ms, 1),
+        'lookup_p50_us': round(float(np.percentile(lat_us, 50)), 2),
+        'lookup_p99_us': round(float(np.percentile(lat_us, 99)), 2),
+        'niveaux': {
+            nom: {
+                'part': round(v['n'] / total, 4) if total else 0.0,
+                'erreur_relative_mediane': round(float(np.median(v['erreurs'])), 4) if v['erreurs'] else None,
+            } for nom, v in par_niveau.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du repli hiérarchique")
+    parser.add_argument("--referentiel", default=REFERENTIEL)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.referentiel, args.holdout, args.seed), indent=2))
@@ -0,0 +1,222 @@
+# Fichier: benchmarks/bench_bascule.py
+# Remplacement à chaud du référentiel (argus_snapshot.ReferentielServi) sous trafic /predict.
+#
+# Le service sert une copie du référentiel dans --workdir (cache désactivé). Des threads
+# enchaînent des /predict pendant que le fichier est republié --swaps fois (cotes de référence
+# modifiées, écriture atomique) puis le marqueur de version écrit en dernier : le bundle est
+# reconstruit en arrière-plan puis basculé. Aucune bascule ne doit précéder le marqueur.
+# Latences (p50/p99/max) hors reconstruction et pendant, durée de construction et de bascule,
+# et contrôle que chaque réponse est cohérente avec la version qu'elle annonce
+# (meta.referentiel_version) : aucune erreur, aucune réponse mélangeant deux versions.
+#
+# --source flux : publication réelle par la CLI argus_streaming (chaîne complète, marqueur en
+# dernier) sur un jeu synthétique, pendant qu'un ReferentielServi surveille le dossier ; la version
+# servie doit devenir celle du marqueur.
+#
+# Usage : python benchmarks/bench_bascule.py [--swaps 3] [--threads 4] [--workdir /tmp/argus_bench]
+#                                            [--source instantane|fichiers|flux] [--annonces 20000]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import argus_snapshot
+from argus_index import SEGMENT_COLS, charger_colonnes_referentiel
+
+INTERVALLE_S = 0.1
+DELAI_MAX_S = 60.0
+STREAMING = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "argus_streaming.py")
+
+
+def _percentiles(secondes):
+    if not secondes:
+        return None
+    ms = np.asarray(secondes) * 1000
+    return {'requetes': len(ms), 'p50_ms': round(float(np.percentile(ms, 50)), 3),
+            'p99_ms': round(float(np.percentile(ms, 99)), 3), 'max_ms': round(float(ms.max()), 3)}
+
+
+def publier(source, facteur, path):
+    """Copie du référentiel aux cotes multipliées par `facteur` dans `path` (mise en place ensuite par os.replace)."""
+    with open(source, encoding='utf-8-sig') as f:
+        lignes = f.read().splitlines()
+    entete = lignes[0].split(';')
+    col = entete.index('Cote_Reference')
+    sortie = [lignes[0]]
+    for ligne in lignes[1:]:
+        champs = ligne.split(';')
+        champs[col] = str(int(int(champs[col]) * facteur))
+        sortie.append(';'.join(champs))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(sortie) + "\n")
+
+
+def bench(swaps, threads, workdir, source):
+    referentiel = os.path.join(workdir, "argus_referentiel_bascule.csv")
+    snapshot = os.path.join(workdir, "argus_snapshot_bascule.pkl")
+    metadata = os.path.join(workdir, "argus_metadata_bascule.json")
+    origine = argus_snapshot.trouver_referentiel()
+    shutil.copy(origine, referentiel)
+    preparation = os.path.join(workdir, "preparation")
+    os.makedirs(preparation, exist_ok=True)
+    os.environ.update({
+        "ARGUS_REFERENTIEL": referentiel, "ARGUS_SNAPSHOT": snapshot,
+        "ARGUS_BACKOFF": os.path.join(workdir, "absent_backoff.cols"),
+        "ARGUS_METADATA": metadata,
+        "ARGUS_REFERENTIEL_RELOAD_S": str(INTERVALLE_S),
+        "ARGUS_CACHE_MAX_ENTRIES": "0", "ARGUS_LOG_SAMPLE": "0", "ARGUS_LOG_LEVEL": "warning",
+    })
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    sources = argus_snapshot.sources_referentiel()
+    argus_snapshot.ecrire_metadata(argus_snapshot.metadata_build(argus_snapshot.empreinte_sources(*sources), sources),
+                                   metadata)
+    import api_ia
+
+    # Requêtes sur des segments exacts (km de référence) : la cote brute attendue ne dépend que
+    # de la version annoncée par la réponse (cotes d'origine x facteur de la publication)
+    index = api_ia.REFERENTIEL.bundle.index
+    cotes = charger_colonnes_referentiel(referentiel)['Cote_Reference'].astype(np.int64)
+    tirage = np.random.default_rng(0).choice(len(index), 2000)
+    cles = {i: cle for cle, i in index.index.items()}
+    requetes = [(dict(zip(SEGMENT_COLS, cles[i])), int(cotes[i])) for i in tirage.tolist()]
+    facteurs = {api_ia.REFERENTIEL.bundle.version: 1.0}
+
+    latences = {'stable': [], 'reconstruction': []}
+    erreurs, incoherences, versions_vues = [], [], set()
+    arret = threading.Event()
+
+    def client_http(k):
+        client = api_ia.app.test_client()
+        i = k
+        while not arret.is_set():
+            payload, cote = requetes[i % len(requetes)]
+            i += threads
+            phase = 'reconstruction' if api_ia.REFERENTIEL.en_cours else 'stable'
+            start = time.perf_counter()
+            r = client.post('/predict', json=payload)
+            latences[phase].append(time.perf_counter() - start)
+            if r.status_code != 200:
+                erreurs.append(r.status_code)
+                continue
+            corps = r.get_json()
+            version = corps['meta']['referentiel_version']
+            versions_vues.add(version)
+            facteur = facteurs.get(version)
+            if facteur is None or corps['details']['cote_brute'] != int(cote * facteur):
+                incoherences.append(version)
+
+    clients = [threading.Thread(target=client_http, args=(k,)) for k in range(threads)]
+    for t in clients:
+        t.start()
+    time.sleep(1.0)
+
+    bascules, bascules_avant_marqueur = [], 0
+    for n in range(1, swaps + 1):
+        facteur = 1 + n / 100
+        avant = api_ia.REFERENTIEL.bascules
+        # Version connue avant publication : aucune réponse ne peut l'annoncer plus tôt
+        contenu = os.path.join(preparation, os.path.basename(referentiel))
+        publier(origine, facteur, contenu)
+        sources = (contenu, *argus_snapshot.sources_referentiel()[1:])
+        version = argus_snapshot.empreinte_sources(*sources)
+        facteurs[version] = facteur
+        if source == 'instantane':
+            # Instantané de la nouvelle version publié d'abord : le service le charge au lieu du CSV
+            argus_snapshot.ecrire_snapshot(argus_snapshot.BundleReferentiel.construire(*sources), snapshot)
+        os.replace(contenu, referentiel)
+        # Fichiers publiés, marqueur pas encore : plusieurs vérifications sans bascule attendues
+        time.sleep(5 * INTERVALLE_S)
+        bascules_avant_marqueur += api_ia.REFERENTIEL.bascules - avant
+        argus_snapshot.ecrire_metadata(argus_snapshot.metadata_build(version, (referentiel,)), metadata)
+        while api_ia.REFERENTIEL.bascules == avant:
+            time.sleep(0.01)
+        bascules.append(api_ia.REFERENTIEL.derniere_bascule)
+        time.sleep(1.0)
+    arret.set()
+    for t in clients:
+        t.join()
+
+    client = api_ia.app.test_client()
+    return {
+        'source': source, 'threads': threads, 'segments': len(index),
+        'latence_stable': _percentiles(latences['stable']),
+        'latence_pendant_reconstruction': _percentiles(latences['reconstruction']),
+        'bascules': bascules, 'bascules_avant_marqueur': bascules_avant_marqueur, 'versions_servies': len(versions_vues), 'erreurs': len(erreurs),
+        'reponses_incoherentes': len(incoherences), 'health': client.get('/health').get_json()['rechargement'],
+    }
+
+
+def bench_flux(workdir, annonces):
+    """Build en flux publié (argus_streaming) sous un ReferentielServi actif : bascule vers la version du marqueur."""
+    from generer_dataset import generer
+    from ArgusBuilder import OUTPUT_DB
+    import argus_store
+    import argus_backoff
+
+    dossier = os.path.join(workdir, "flux")
+    os.makedirs(dossier, exist_ok=True)
+    jeux = [os.path.join(dossier, f"annonces_{seed}.csv") for seed in (0, 1)]
+    for seed, jeu in enumerate(jeux):
+        generer(annonces, jeu, seed)
+
+    def publier_flux(jeu):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, STREAMING, "--input", jeu], cwd=dossier, check=True, capture_output=True)
+        return round(time.perf_counter() - start, 3)
+
+    publier_flux(jeux[0])
+    os.environ.update({
+        "ARGUS_REFERENTIEL": os.path.join(dossier, argus_store.OUTPUT_COLUMNAR),
+        "ARGUS_BACKOFF": os.path.join(dossier, argus_backoff.OUTPUT_BACKOFF),
+        "ARGUS_SNAPSHOT": os.path.join(dossier, argus_snapshot.OUTPUT_SNAPSHOT),
+        "ARGUS_METADATA": os.path.join(dossier, argus_snapshot.OUTPUT_METADATA),
+    })
+    servi = argus_snapshot.ReferentielServi(INTERVALLE_S)
+    initiale = servi.bundle.version
+
+    publication_s = publier_flux(jeux[1])
+    limite = time.monotonic() + DELAI_MAX_S
+    while servi.bascules == 0 and time.monotonic() < limite:
+        servi.actuel()
+        time.sleep(INTERVALLE_S / 2)
+    with open(os.path.join(dossier, OUTPUT_DB), encoding='utf-8-sig') as f:
+        segments_publies = sum(1 for _ in f) - 1
+    publiee = argus_snapshot.version_publiee()
+    return {
+        'source': 'flux', 'annonces': annonces, 'publication_s': publication_s,
+        'version_initiale': initiale, 'version_publiee': publiee, 'version_servie': servi.bundle.version,
+        'segments_publies': segments_publies, 'segments_servis': len(servi.bundle.index),
+        'bascules': servi.bascules, 'erreurs': servi.erreurs, 'derniere_bascule': servi.derniere_bascule,
+        'a_jour': publiee == servi.bundle.version != initiale and segments_publies == len(servi.bundle.index),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du remplacement à chaud du référentiel")
+    parser.add_argument("--swaps", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--source", choices=("instantane", "fichiers", "flux"), default="fichiers",
+                        help="Nouveau référentiel chargé depuis un instantané republié, reconstruit depuis le CSV, "
+                             "ou publié par la CLI argus_streaming")
+    parser.add_argument("--annonces", type=int, default=20_000, help="Taille des jeux synthétiques (--source flux)")
+    parser.add_argument("--workdir", default=os.path.join(os.environ.get("TMPDIR", "/tmp"), "argus_bench"))
+    args = parser.parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+    if args.source == "flux":
+        rapport = bench_flux(args.workdir, args.annonces)
+        print(json.dumps(rapport, indent=2, ensure_ascii=False))
+        sys.exit(0 if rapport['a_jour'] and rapport['erreurs'] == 0 else 1)
+    rapport = bench(args.swaps, args.threads, args.workdir, args.source)
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
+    sys.exit(0 if rapport['erreurs'] == 0 and rapport['reponses_incoherentes'] == 0
+             and rapport['bascules_avant_marqueur'] == 0 else 1)
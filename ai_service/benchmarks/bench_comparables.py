@@ -0,0 +1,126 @@
+# Fichier: benchmarks/bench_comparables.py
+# Index des annonces comparables (argus_comparables) : build, chargement, latence et mémoire.
+#
+# Pour chaque taille : dataset synthétique (generer_dataset.py, réutilisé s'il existe), annonces
+# nettoyées par ArgusEngine, écriture de l'index ; puis, dans un processus neuf (RSS propre),
+# chargement memory-mappé, requêtes tirées parmi les annonces (k plus proches + distribution de
+# prix) et, pour comparaison, le même calcul en balayage complet de la table (sans listes IVF).
+#
+# Usage : python benchmarks/bench_comparables.py [--rows 270000 2000000] [--queries 2000] [--k 10]
+#                                                [--workdir /tmp/argus_bench]
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import argus_comparables
+import argus_metrics
+
+REQUETES_BALAYAGE = 200
+
+
+def _percentiles(secondes):
+    ms = np.asarray(secondes) * 1000
+    return {'p50_ms': round(float(np.percentile(ms, 50)), 3), 'p99_ms': round(float(np.percentile(ms, 99)), 3),
+            'max_ms': round(float(ms.max()), 3)}
+
+
+def _balayage_complet(index, criteres, k):
+    """Mêmes distances sur toute la table, désaccord de modèle pénalisé : ce qu'évitent les listes IVF."""
+    d2 = index.distances(0, len(index), criteres['annee'], criteres['km'], criteres['puissance'],
+                         {col: index._code(col, v) for col, v in
+                          zip(argus_comparables.CATEGORIELS, (criteres['energie'], criteres['boite'], criteres['finition']))})
+    d2 += np.float32(1e6) * (index.codes['Modèle'] != index._code('Modèle', criteres['modele']))
+    proches = np.argpartition(d2, k - 1)[:k]
+    return proches[np.argsort(d2[proches])]
+
+
+def _mesurer_service(path, requetes, k, queue):
+    rss_depart = argus_metrics.rss_mo()
+    start = time.perf_counter()
+    index = argus_comparables.IndexComparables(path)
+    chargement_s = time.perf_counter() - start
+    rss_charge = argus_metrics.rss_mo()
+
+    latences, listes, niveaux = [], [], {}
+    for criteres in requetes:
+        start = time.perf_counter()
+        indices, distances, niveau = index.chercher(**criteres, k=k)
+        argus_comparables.distribution_prix(index.prix[indices])
+        latences.append(time.perf_counter() - start)
+        debut, fin, _ = index.plage(criteres['marque'], criteres['modele'])
+        listes.append(fin - debut)
+        niveaux[niveau] = niveaux.get(niveau, 0) + 1
+
+    balayage = []
+    for criteres in requetes[:REQUETES_BALAYAGE]:
+        start = time.perf_counter()
+        _balayage_complet(index, criteres, k)
+        balayage.append(time.perf_counter() - start)
+
+    queue.put({
+        'chargement_ms': round(chargement_s * 1000, 2),
+        'rss_chargement_mo': round(rss_charge - rss_depart, 1),
+        'rss_apres_requetes_mo': round(argus_metrics.rss_mo() - rss_depart, 1),
+        'listes_modele': len(index.plages_modele),
+        'liste_parcourue_mediane': int(np.median(listes)),
+        'liste_parcourue_max': int(np.max(listes)),
+        'niveaux': niveaux,
+        'requete': _percentiles(latences),
+        'balayage_complet': _percentiles(balayage),
+    })
+
+
+def bench(n, queries, k, workdir, seed):
+    from generer_dataset import generer
+    from ArgusBuilder import ArgusEngine
+    logging.getLogger().setLevel(logging.WARNING)
+
+    csv_path = os.path.join(workdir, f"leboncoin_synth_{n}_s{seed}_k1.csv")
+    if not os.path.exists(csv_path):
+        generer(n, csv_path, seed)
+    engine = ArgusEngine(csv_path)
+    engine.charger_donnees()
+    engine._impute_missing_powers()
+    annonces = engine.annonces_filtrees()
+    path = os.path.join(workdir, f"comparables_{n}.cols")
+    start = time.perf_counter()
+    lignes = argus_comparables.ecrire_index(annonces, path)
+    build_s = time.perf_counter() - start
+
+    # Requêtes : annonces réelles du dataset (distribution des modèles du trafic ~ celle de l'offre)
+    tirage = np.random.default_rng(seed).integers(0, len(annonces), queries)
+    requetes = [dict(marque=r.Marque, modele=r.Modèle, annee=int(r.Année), km=int(r.Kilométrage),
+                     puissance=int(r.Puissance) or None, energie=r.Énergie, boite=r.Boîte, finition=r.Finition)
+                for r in annonces.iloc[tirage].itertuples(index=False)]
+    del engine, annonces
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_mesurer_service, args=(path, requetes, k, queue))
+    proc.start()
+    service = queue.get()
+    proc.join()
+    return {'annonces_indexees': lignes, 'taille_fichier_mo': round(os.path.getsize(path) / (1024 * 1024), 1),
+            'octets_par_annonce': round(os.path.getsize(path) / lignes, 1), 'build_index_s': round(build_s, 3),
+            **service}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'index des annonces comparables")
+    parser.add_argument("--rows", type=int, nargs='+', default=[270_000, 2_000_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=argus_comparables.K_DEFAUT)
+    parser.add_argument("--workdir", default=os.path.join(os.environ.get("TMPDIR", "/tmp"), "argus_bench"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+    print(json.dumps({str(n): bench(n, args.queries, args.k, args.workdir, args.seed) for n in args.rows}, indent=2))
@@ -0,0 +1,81 @@
+# Fichier: benchmarks/bench_courbes.py
+# Cotation sur une grille de kilométrages : courbes précalculées (argus_courbes) contre
+# calculer_prix_final_vectorise et la boucle scalaire.
+#
+# Tous les segments du référentiel x une grille de km (courbes prix / km, balayages) et un lot
+# d'annonces (segment et km tirés au hasard, cas de /predict/batch). Mêmes résultats exigés
+# (sinon code de sortie 1). La boucle scalaire tourne sur un sous-ensemble (--scalaire-max).
+#
+# Usage : python benchmarks/bench_courbes.py [--km-max 500000] [--pas 5000] [--annonces 1000000]
+#                                            [--repeat 3] [--scalaire-max 200000]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import argus_snapshot
+from argus_index import SegmentIndex, calculer_prix_final, calculer_prix_final_vectorise, courbes_prix, evaluer_courbes
+
+
+def _chrono(fn, repeat):
+    meilleur, resultat = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resultat = fn()
+        meilleur = min(meilleur, time.perf_counter() - start)
+    return meilleur, resultat
+
+
+def bench(index, lignes, kms, repeat, scalaire_max):
+    variantes = {
+        'courbes': lambda: evaluer_courbes(index.courbes, lignes, kms),
+        'vectorise': lambda: calculer_prix_final_vectorise(index.cote[lignes], index.km_ref[lignes], kms,
+                                                           index.decote[lignes]),
+    }
+    lignes_plat, kms_plat = np.broadcast_arrays(lignes, kms)
+    lignes_plat, kms_plat = lignes_plat.ravel()[:scalaire_max].tolist(), kms_plat.ravel()[:scalaire_max].tolist()
+    variantes['scalaire'] = lambda: [calculer_prix_final(int(index.cote[i]), int(index.km_ref[i]), k, float(index.decote[i]))
+                                     for i, k in zip(lignes_plat, kms_plat)]
+    resultats, sorties = {}, {}
+    for nom, fn in variantes.items():
+        duree, sorties[nom] = _chrono(fn, 1 if nom == 'scalaire' else repeat)
+        n = len(lignes_plat) if nom == 'scalaire' else int(np.broadcast(lignes, kms).size)
+        resultats[nom] = {'evaluations': n, 'duree_s': round(duree, 4), 'evaluations_par_s': int(n / duree)}
+    identiques = all(np.array_equal(a, b) for a, b in zip(sorties['courbes'], sorties['vectorise']))
+    scalaire = [np.array(v) for v in zip(*sorties['scalaire'])]
+    identiques &= all(np.array_equal(np.ravel(a)[:len(lignes_plat)], b) for a, b in zip(sorties['courbes'], scalaire))
+    return {**resultats, 'identiques': identiques,
+            'acceleration_vs_vectorise': round(resultats['courbes']['evaluations_par_s']
+                                               / resultats['vectorise']['evaluations_par_s'], 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des courbes prix / km précalculées")
+    parser.add_argument("--referentiel", help="Référentiel (CSV ou .cols) ; défaut : celui du service")
+    parser.add_argument("--km-max", type=int, default=500_000)
+    parser.add_argument("--pas", type=int, default=5000)
+    parser.add_argument("--annonces", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scalaire-max", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    index = SegmentIndex.depuis_fichier(args.referentiel or argus_snapshot.trouver_referentiel())
+    construction_s, _ = _chrono(lambda: courbes_prix(index.cote, index.km_ref, index.decote), args.repeat)
+    rng = np.random.default_rng(args.seed)
+    rapport = {
+        'segments': len(index),
+        'construction_courbes_ms': round(construction_s * 1000, 2),
+        'grille': bench(index, np.arange(len(index))[:, None], np.arange(0, args.km_max + 1, args.pas)[None, :],
+                        args.repeat, args.scalaire_max),
+        'lot': bench(index, rng.integers(0, len(index), args.annonces), rng.integers(0, 400_000, args.annonces),
+                     args.repeat, args.scalaire_max),
+    }
+    print(json.dumps(rapport, indent=2))
+    sys.exit(0 if rapport['grille']['identiques'] and rapport['lot']['identiques'] else 1)
@@ -0,0 +1,105 @@
+# Fichier: benchmarks/bench_facettes.py
+# Navigation par facettes : masques DataFrame (ancien InteractiveArgus.run) vs FacetIndex.
+#
+# Pour des parcours complets tirés au hasard dans la cascade, on mesure chaque étape
+# (options du champ suivant) et la recherche de marque/modèle par sous-chaîne, avec les deux
+# approches, et on vérifie que les options renvoyées sont identiques.
+#
+# Usage : python benchmarks/bench_facettes.py [--paths 300] [--seed 0]
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from argus_facettes import FacetIndex, CASCADE
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENTIEL = os.path.join(BASE_DIR, "..", "backend", "argus_referentiel_v21.csv")
+
+
+def options_masque(df, selection):
+    """Étape de cascade façon InteractiveArgus : masque cumulé puis unique()."""
+    mask = np.ones(len(df), dtype=bool)
+    for col, valeur in zip(CASCADE, selection):
+        mask &= (df[col] == valeur).to_numpy()
+    return sorted(set(df[mask][CASCADE[len(selection)]].unique()))
+
+
+def recherche_masque(df, champ, texte):
+    return sorted(df[df[champ].str.contains(texte, na=False, regex=False)][champ].unique())
+
+
+def micro(latences_s):
+    us = np.asarray(latences_s) * 1e6
+    return {'p50_us': round(float(np.percentile(us, 50)), 2), 'p99_us': round(float(np.percentile(us, 99)), 2)}
+
+
+def bench(referentiel_path, n_paths, seed):
+    df = pd.read_csv(referentiel_path, sep=';')
+    df[['Année', 'Puissance']] = df[['Année', 'Puissance']].astype(int)
+
+    start = time.perf_counter()
+    facettes = FacetIndex({c: df[c].to_numpy() for c in CASCADE})
+    construction_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(seed)
+    lignes = [tuple(r) for r in df[CASCADE].itertuples(index=False, name=None)]
+    masque, index, ecarts = [], [], 0
+    for _ in range(n_paths):
+        cle = lignes[rng.randrange(len(lignes))]
+        for d in range(len(CASCADE)):
+            selection = cle[:d]
+            t0 = time.perf_counter()
+            attendu = options_masque(df, selection)
+            t1 = time.perf_counter()
+            obtenu = facettes.options(selection)
+            t2 = time.perf_counter()
+            masque.append(t1 - t0)
+            index.append(t2 - t1)
+            ecarts += attendu != obtenu
+
+    recherche_masque_s, recherche_index_s = [], []
+    noms = {champ: sorted(df[champ].unique()) for champ in ('Marque', 'Modèle')}
+    for _ in range(n_paths):
+        champ = rng.choice(('Marque', 'Modèle'))
+        nom = rng.choice(noms[champ])
+        debut = rng.randrange(len(nom))
+        texte = nom[debut:debut + rng.randint(1, 5)]
+        t0 = time.perf_counter()
+        attendu = recherche_masque(df, champ, texte)
+        t1 = time.perf_counter()
+        obtenu = facettes.rechercher(champ, texte)
+        t2 = time.perf_counter()
+        recherche_masque_s.append(t1 - t0)
+        recherche_index_s.append(t2 - t1)
+        ecarts += attendu != obtenu
+
+    return {
+        'segments': len(df),
+        'prefixes_indexes': len(facettes.options_par_prefixe),
+        'construction_index_ms': round(construction_ms, 1),
+        'cascade': {'masque': micro(masque), 'index': micro(index),
+                    'acceleration_p50': round(float(np.median(masque) / np.median(index)), 1)},
+        'recherche': {'masque': micro(recherche_masque_s), 'index': micro(recherche_index_s),
+                      'acceleration_p50': round(float(np.median(recherche_masque_s) / np.median(recherche_index_s)), 1)},
+        'ecarts': int(ecarts),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark navigation par facettes")
+    parser.add_argument("--referentiel", default=REFERENTIEL)
+    parser.add_argument("--paths", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    resultats = bench(args.referentiel, args.paths, args.seed)
+    print(json.dumps(resultats, indent=2))
+    sys.exit(0 if resultats['ecarts'] == 0 else 1)
@@ -0,0 +1,159 @@
+# Fichier: benchmarks/bench_predict.py
+# Latence de /predict sous charge et débit de /predict/batch (client de test Flask, sans réseau).
+#
+# Usage : python benchmarks/bench_predict.py [--requests 5000] [--threads 8] [--page-size 35] [--zipf 1.2]
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import api_ia
+import argus_cache
+from argus_index import SEGMENT_COLS
+
+
+def echantillon_payloads(index, n, seed=0):
+    """Requêtes tirées du référentiel (km aléatoire autour du km de référence)."""
+    rng = random.Random(seed)
+    cles = list(index.index.items())
+    payloads = []
+    for _ in range(n):
+        cle, i = cles[rng.randrange(len(cles))]
+        payload = dict(zip(SEGMENT_COLS, cle))
+        payload['km'] = max(0, int(index.km_ref[i]) + rng.randint(-60000, 150000))
+        payloads.append(payload)
+    return payloads
+
+
+def payloads_populaires(index, n, exposant, seed=0):
+    """Trafic concentré sur quelques segments (loi de Zipf sur le volume d'annonces), km proches du km de référence."""
+    rng = np.random.default_rng(seed)
+    cles = list(index.index.items())
+    cles.sort(key=lambda item: -int(index.volume[item[1]]))
+    poids = 1.0 / np.arange(1, len(cles) + 1) ** exposant
+    tirages = rng.choice(len(cles), size=n, p=poids / poids.sum())
+    payloads = []
+    for j in tirages:
+        cle, i = cles[j]
+        payload = dict(zip(SEGMENT_COLS, cle))
+        payload['km'] = max(0, int(index.km_ref[i]) + int(rng.normal(0, 15000)))
+        payloads.append(payload)
+    return payloads
+
+
+def percentiles(latences_s):
+    ms = np.asarray(latences_s) * 1000
+    return {'p50_ms': round(float(np.percentile(ms, 50)), 4), 'p99_ms': round(float(np.percentile(ms, 99)), 4),
+            'max_ms': round(float(ms.max()), 4)}
+
+
+def bench_lookup(index, payloads):
+    """Coût du lookup + calcul seul (hors Flask)."""
+    from argus_index import normaliser_cle, lire_km
+    latences = []
+    for p in payloads:
+        start = time.perf_counter()
+        index.estimer(normaliser_cle(p), lire_km(p))
+        latences.append(time.perf_counter() - start)
+    return percentiles(latences)
+
+
+def bench_http(payloads, threads):
+    """Requêtes /predict concurrentes via le client de test (un client par thread)."""
+    latences = []
+    verrou = threading.Lock()
+    parts = [payloads[i::threads] for i in range(threads)]
+
+    def worker(part):
+        client = api_ia.app.test_client()
+        local = []
+        for p in part:
+            start = time.perf_counter()
+            r = client.post('/predict', json=p)
+            local.append(time.perf_counter() - start)
+            assert r.status_code == 200, r.get_json()
+        with verrou:
+            latences.extend(local)
+
+    start = time.perf_counter()
+    ts = [threading.Thread(target=worker, args=(part,)) for part in parts]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    duree = time.perf_counter() - start
+    return {**percentiles(latences), 'requetes_par_s': int(len(payloads) / duree), 'threads': threads}
+
+
+def bench_batch(payloads, page_size):
+    """Débit annonces/s : appels /predict séquentiels vs pages /predict/batch."""
+    client = api_ia.app.test_client()
+
+    start = time.perf_counter()
+    for p in payloads:
+        client.post('/predict', json=p)
+    sequentiel = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(payloads), page_size):
+        r = client.post('/predict/batch', json=payloads[i:i + page_size])
+        assert r.status_code == 200
+    lot = time.perf_counter() - start
+
+    return {
+        'page_size': page_size,
+        'sequentiel_annonces_par_s': int(len(payloads) / sequentiel),
+        'batch_annonces_par_s': int(len(payloads) / lot),
+        'acceleration': round(sequentiel / lot, 2),
+    }
+
+
+def bench_cache(payloads):
+    """
+    /predict séquentiel sans cache puis avec un cache neuf (LRU local par défaut).
+    Deux passes par configuration : la première remplit le cache, la seconde est mesurée.
+    """
+    client = api_ia.app.test_client()
+    resultats = {}
+    cache_initial = api_ia.CACHE
+    for nom, cache in (("sans_cache", None), ("avec_cache", argus_cache.CachePrediction())):
+        api_ia.CACHE = cache
+        for passe in ("froide", "chaude"):
+            latences = []
+            for p in payloads:
+                start = time.perf_counter()
+                client.post('/predict', json=p)
+                latences.append(time.perf_counter() - start)
+            resultats[f"{nom}_{passe}"] = {**percentiles(latences), 'requetes_par_s': int(len(latences) / sum(latences))}
+        if cache is not None:
+            resultats[nom + '_stats'] = cache.stats()
+    api_ia.CACHE = cache_initial
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latence /predict")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--page-size", type=int, nargs='+', default=[35, 1000])
+    parser.add_argument("--zipf", type=float, default=1.2, help="Exposant de popularité pour le benchmark du cache")
+    args = parser.parse_args()
+
+    if api_ia.REFERENTIEL.bundle is None:
+        sys.exit("Référentiel introuvable")
+    api_ia.logger.setLevel("WARNING")
+    index = api_ia.REFERENTIEL.bundle.index
+    payloads = echantillon_payloads(index, args.requests)
+    print(json.dumps({
+        'segments': len(index),
+        'lookup': bench_lookup(index, payloads),
+        'predict': bench_http(payloads, args.threads),
+        'batch': [bench_batch(payloads, size) for size in args.page_size],
+        'cache': bench_cache(payloads_populaires(index, args.requests, args.zipf)),
+    }, indent=2))
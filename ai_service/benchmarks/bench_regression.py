@@ -0,0 +1,117 @@
+# Fichier: benchmarks/bench_regression.py
+# Pentes km -> prix : une LinearRegression sklearn par segment (ancien chemin) vs ajustement
+# par lot (argus_regression), en moindres carrés et en modes robustes.
+#
+# Sur les annonces filtrées (IQR) du dataset : durée de chaque méthode, écart des pentes des
+# moindres carrés à sklearn, puis couverture de l'intervalle de prix de /predict sur des
+# annonces mises de côté (référentiel construit sur le reste, pour chaque mode).
+#
+# Usage : python benchmarks/bench_regression.py [--input leboncoin_FINAL_PLATINUM_V16.csv] [--holdout 0.2] [--seed 0]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+import argus_regression
+from ArgusBuilder import ArgusEngine, INPUT_FILE
+from argus_index import SegmentIndex, SEGMENT_COLS, NIVEAU_INTERVALLE
+
+
+def pentes_sklearn(codes, km, prix, n_groups):
+    """Une régression par segment d'au moins 5 annonces, comme _calculate_depreciation_stabilized."""
+    ordre = np.argsort(codes, kind='stable')
+    bornes = np.cumsum(np.bincount(codes, minlength=n_groups))
+    pentes = np.full(n_groups, np.nan)
+    debut = 0
+    for g, fin in enumerate(bornes):
+        if fin - debut >= 5:
+            idx = ordre[debut:fin]
+            pentes[g] = LinearRegression().fit(km[idx].reshape(-1, 1), prix[idx]).coef_[0]
+        debut = fin
+    return pentes
+
+
+def chrono(fn, *args, **kwargs):
+    start = time.perf_counter()
+    resultat = fn(*args, **kwargs)
+    return resultat, time.perf_counter() - start
+
+
+def couverture(df_train, df_test, robuste):
+    """Part des prix mis de côté dans l'intervalle, par fiabilité du segment."""
+    engine = ArgusEngine(data_path=None, robuste=robuste)
+    engine.df = df_train
+    ref = engine._calculer_cotes_vectorise()
+    index = SegmentIndex({col: ref[col].to_numpy() for col in ref.columns})
+    cles = list(zip(*(df_test[c].tolist() for c in SEGMENT_COLS)))
+    lignes = index.resoudre(cles)
+    trouves = lignes >= 0
+    lot = index.estimer_lot(lignes[trouves], df_test['Kilométrage'].to_numpy()[trouves])
+    prix = df_test['Prix'].to_numpy()[trouves]
+    dedans = (prix >= lot['intervalle_bas'].astype(np.int64)) & (prix <= lot['intervalle_haut'].astype(np.int64))
+    largeur = (lot['intervalle_haut'] - lot['intervalle_bas']).astype(np.float64) / np.maximum(lot['cote_affinee'], 1)
+    resultat = {'annonces_cotees': int(trouves.sum()), 'couverture': round(float(dedans.mean()), 4),
+                'largeur_relative_mediane': round(float(np.median(largeur)), 4)}
+    for q in ("A", "B", "C"):
+        sel = lot['confiance'] == q
+        if sel.any():
+            resultat[f'couverture_{q}'] = round(float(dedans[sel].mean()), 4)
+    return resultat
+
+
+def bench(input_file, holdout, seed):
+    engine = ArgusEngine(input_file)
+    engine.charger_donnees()
+    engine._impute_missing_powers()
+    keys, codes, km, prix = engine._points_filtres()
+    n_groups = len(keys)
+    km, prix = km.astype(np.float64), prix.astype(np.float64)
+
+    sk, duree_sklearn = chrono(pentes_sklearn, codes, km, prix, n_groups)
+    fit, duree_ols = chrono(argus_regression.ajuster, codes, km, prix, n_groups)
+    _, duree_incertitude = chrono(argus_regression.incertitude, fit['n'], fit['sxx'], fit['sxy'], fit['syy'], fit['pente'])
+    compares = ~np.isnan(sk)
+    resultats = {
+        'annonces_filtrees': int(len(codes)),
+        'segments': int(n_groups),
+        'segments_regression_sklearn': int(compares.sum()),
+        'sklearn_par_segment_s': round(duree_sklearn, 3),
+        'lot_moindres_carres_s': round(duree_ols, 4),
+        'lot_incertitude_s': round(duree_incertitude, 4),
+        'acceleration': round(duree_sklearn / duree_ols, 1),
+        'ecart_pente_max_vs_sklearn': float(np.max(np.abs(fit['pente'][compares] - sk[compares]))) if compares.any() else 0.0,
+        'robuste': {},
+    }
+    petits = (fit['n'] >= 2) & (fit['n'] <= argus_regression.ROBUSTE_MAX_N) & (fit['sxx'] > 0)
+    for mode in argus_regression.ROBUST_MODES:
+        robuste, duree = chrono(argus_regression.ajuster, codes, km, prix, n_groups, robuste=mode)
+        resultats['robuste'][mode] = {
+            's': round(duree, 4),
+            'segments_concernes': int(petits.sum()),
+            'ecart_pente_median_vs_mco': round(float(np.median(np.abs(robuste['pente'][petits] - fit['pente'][petits]))), 5) if petits.any() else 0.0,
+        }
+
+    # Permutation plutôt que rng.random : indépendant d'un jeu synthétique tiré avec la même graine
+    rng = np.random.default_rng(seed)
+    test = rng.permutation(len(engine.df)) < holdout * len(engine.df)
+    df_train, df_test = engine.df[~test], engine.df[test]
+    resultats['intervalle'] = {'niveau': NIVEAU_INTERVALLE}
+    for mode in (None,) + argus_regression.ROBUST_MODES:
+        resultats['intervalle'][mode or 'moindres_carres'] = couverture(df_train, df_test, mode)
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'ajustement des pentes par segment")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.input, args.holdout, args.seed), indent=2))
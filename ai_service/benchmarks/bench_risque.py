@@ -0,0 +1,116 @@
+# Fichier: benchmarks/bench_risque.py
+# Débit du score de risque des descriptions (argus_risque) contre la boucle naïve motif par motif.
+#
+# Descriptions synthétiques d'annonces (phrases de vendeur, ~300 caractères, accents et
+# apostrophes typographiques), dont une part contient une signature, un mot-clé ou un numéro
+# virtuel. Trois variantes, mêmes résultats exigés (sinon code de sortie 1) :
+#   naif  : chaque motif cherché séparément dans chaque texte (backend Node actuel)
+#   texte : expression combinée, un appel par description
+#   lot   : expression combinée, lot joint et parcouru en une passe
+# --extra-motifs ajoute des signatures factices pour voir le coût en fonction de la taille du jeu.
+#
+# Usage : python benchmarks/bench_risque.py [--descriptions 50000] [--extra-motifs 0 200 1000] [--repeat 3]
+#                                           [--naif-max 10000]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import argus_risque
+
+PHRASES_VENDEUR = [
+    "Vends ma voiture en très bon état général", "Entretien à jour chez le concessionnaire",
+    "Contrôle technique OK, aucune contre-visite", "Distribution faite à 120 000 km",
+    "Pneus avant neufs, freins récents", "Première main, carnet d'entretien complet",
+    "Climatisation fonctionnelle, régulateur de vitesse", "Quelques rayures d'usage sur le pare-choc",
+    "Prix à débattre dans la limite du raisonnable", "Véhicule non fumeur, toujours dormi au garage",
+    "Faible consommation, idéal jeune conducteur", "Vendu dans l’état, pour pièces ou mécanicien",
+    "Disponible pour essai le week-end", "Historique des révisions fourni à l'acheteur",
+    "Boîte de vitesses récente, embrayage changé", "GPS, Bluetooth et radar de recul",
+]
+SUSPECTS = [
+    "Je suis actuellement à l’Étranger pour raisons professionnelles", "Paiement uniquement par MANDAT CASH",
+    "Contact par WhatsApp de préférence", "Le transporteur vous livre le véhicule", "Pas sérieux s'abstenir",
+    "Écrivez-moi sur mon gmail", "Je suis malentendant, merci de ne pas appeler", "Règlement par coupon PCS",
+]
+TELEPHONES = ["06 44 12 34 56", "07.80.11.22.33", "+33 6 12 34 56 78", "01 23 45 67 89"]
+
+
+def generer_descriptions(n, seed=0, part_suspecte=0.15):
+    rng = np.random.default_rng(seed)
+    descriptions = []
+    for _ in range(n):
+        phrases = [PHRASES_VENDEUR[i] for i in rng.integers(0, len(PHRASES_VENDEUR), rng.integers(4, 10))]
+        if rng.random() < part_suspecte:
+            phrases.insert(int(rng.integers(0, len(phrases) + 1)), SUSPECTS[rng.integers(0, len(SUSPECTS))])
+        if rng.random() < 0.2:
+            phrases.append("Tél : " + TELEPHONES[rng.integers(0, len(TELEPHONES))])
+        descriptions.append(". ".join(phrases) + ".")
+    return descriptions
+
+
+def motifs_factices(n, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    mots = sorted({w.lower() for p in PHRASES_VENDEUR for w in p.split() if len(w) > 3})
+    return [" ".join(rng.choice(mots, 3)) + f" ref{i}" for i in range(n)]
+
+
+def _chrono(fn, repeat):
+    meilleur, resultat = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resultat = fn()
+        meilleur = min(meilleur, time.perf_counter() - start)
+    return meilleur, resultat
+
+
+def bench(descriptions, extra, repeat, seed, naif_max):
+    patterns = argus_risque._charger_json(argus_risque.PATTERNS_FILE)
+    regles = argus_risque._charger_json(argus_risque.REGLES_FILE)
+    start = time.perf_counter()
+    jeu = argus_risque.JeuRegles(patterns.get("phrases", []) + motifs_factices(extra, seed),
+                                 regles.get("mots_cles", []), patterns.get("phones", []))
+    compilation_s = time.perf_counter() - start
+
+    # Boucle naïve sur un sous-ensemble (quelques minutes sinon avec 1000 motifs), comparée au même préfixe
+    echantillon = descriptions[:naif_max]
+    variantes = {
+        'naif': lambda: argus_risque.scorer_naif(jeu, echantillon),
+        'texte': lambda: [jeu.scorer(d) for d in descriptions],
+        'lot': lambda: jeu.scorer_lot(descriptions),
+    }
+    resultats, sorties = {}, {}
+    for nom, fn in variantes.items():
+        duree, sorties[nom] = _chrono(fn, repeat)
+        n = len(echantillon) if nom == 'naif' else len(descriptions)
+        resultats[nom] = {'descriptions': n, 'duree_s': round(duree, 3), 'descriptions_par_s': int(n / duree)}
+    identiques = all(sorties[nom][:len(echantillon)] == sorties['naif'] for nom in sorties)
+    return {
+        'motifs': len(jeu.motifs), 'compilation_ms': round(compilation_s * 1000, 2),
+        'signalees': sum(1 for r in sorties['lot'] if r['score'] > 0),
+        **resultats,
+        'acceleration_lot': round(resultats['lot']['descriptions_par_s'] / resultats['naif']['descriptions_par_s'], 1),
+        'identiques': identiques,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du score de risque des descriptions")
+    parser.add_argument("--descriptions", type=int, default=50_000)
+    parser.add_argument("--extra-motifs", type=int, nargs='+', default=[0, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--naif-max", type=int, default=10_000, help="Descriptions passées à la boucle naïve")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    descriptions = generer_descriptions(args.descriptions, args.seed)
+    rapport = {str(n): bench(descriptions, n, args.repeat, args.seed, args.naif_max) for n in args.extra_motifs}
+    print(json.dumps({'descriptions': len(descriptions),
+                      'caracteres_moyens': int(np.mean([len(d) for d in descriptions])), 'jeux': rapport}, indent=2))
+    sys.exit(0 if all(r['identiques'] for r in rapport.values()) else 1)
@@ -0,0 +1,306 @@
+# Fichier: benchmarks/bench_suite.py
+# Suite de non-régression des chemins chauds : build du référentiel et cotation, de 10k à 5M annonces.
+#
+# Pour chaque taille, un dataset synthétique au format LeBonCoin (generer_dataset.py, réutilisé
+# s'il existe déjà dans --workdir) puis, chaque mesure dans un processus neuf (pic de RSS propre) :
+#   build       durée de bout en bout et par étape instrumentée (chargement, normalisation,
+#               imputation, filtre IQR, ajustement, sauvegardes), pic de RSS ;
+#   flux        build par morceaux (argus_streaming), durée par étape et pic de RSS ;
+#   chargement  relecture du référentiel servi : CSV, fichiers colonnaires + index, instantané ;
+#   service     import d'api_ia (démarrage), latence de /predict (p50/p99, cache désactivé) et de
+#               /predict/batch par taille de lot, via le client de test Flask.
+# Résultats en JSON (--output). --baseline compare à un résultat précédent : code de sortie 1 si une
+# durée, une latence ou un pic mémoire dépasse la référence de plus de --threshold (débits : baisse),
+# au-delà d'un plancher absolu par unité pour ne pas signaler le bruit des mesures très courtes.
+#
+# Usage : python benchmarks/bench_suite.py [--sizes 10k 100k 1M] [--workdir /tmp/argus_bench] [--output res.json]
+#                                          [--baseline ref.json --threshold 0.25] [--results res.json]
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import multiprocessing
+import queue as queue_module
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+TAILLES_DEFAUT = ["10k", "100k", "1M"]
+TAILLES_LOT = [100, 1000]
+SEUIL_DEFAUT = 0.25
+# Écart absolu minimal pour signaler une régression, par suffixe de métrique
+PLANCHERS = {'_s': 0.05, '_ms': 0.2, '_mo': 20.0, '_par_s': 0.0}
+
+
+def lire_taille(texte):
+    """'10k', '2.5M' ou '50000' -> nombre d'annonces."""
+    multiplicateur = {'k': 1_000, 'm': 1_000_000}.get(texte[-1].lower(), 1)
+    return int(float(texte.rstrip('kKmM')) * multiplicateur)
+
+
+def _pic_rss_mo():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _durees_etapes(etapes):
+    """Durées des étapes instrumentées du build (argus_metrics.SuiviEtapes)."""
+    return {f"{m['etape']}_s": m['duree_s'] for m in etapes.mesures}
+
+
+def _percentiles_ms(secondes):
+    ms = np.asarray(secondes) * 1000
+    return {'p50_ms': round(float(np.percentile(ms, 50)), 3), 'p99_ms': round(float(np.percentile(ms, 99)), 3)}
+
+
+# --- MESURES (une par processus neuf) ---
+# ru_maxrss survit au fork+exec du démarrage « spawn » : le processus parent reste léger (ni pandas
+# ni génération du dataset chez lui), sinon son pic fixerait un plancher aux pics mesurés ici.
+
+def _generer(taille, path, seed, skew, queue):
+    from generer_dataset import generer
+    queue.put(generer(taille, path, seed, skew))
+
+
+def _mesurer_build(path, dossier, queue):
+    os.chdir(dossier)  # Les exports du build s'écrivent dans le répertoire courant
+    from ArgusBuilder import ArgusEngine
+    logging.getLogger().setLevel(logging.WARNING)  # Après l'import : ArgusBuilder configure le logging
+    rss_imports = _pic_rss_mo()
+    start = time.perf_counter()
+    engine = ArgusEngine(path)
+    engine.construire_referentiel()
+    engine.sauvegarder_referentiel()
+    engine.sauvegarder_referentiel_colonnes()
+    engine.sauvegarder_backoff()
+    engine.sauvegarder_snapshot()
+    queue.put({
+        'total_s': round(time.perf_counter() - start, 3),
+        'etapes': _durees_etapes(engine.etapes),
+        'pic_rss_mo': round(_pic_rss_mo(), 1),
+        'rss_imports_mo': round(rss_imports, 1),
+        'annonces': len(engine.df),
+        'cotes': len(engine.referentiel),
+    })
+
+
+def _mesurer_flux(path, queue):
+    from argus_streaming import construire_referentiel_streaming
+    from argus_metrics import SuiviEtapes
+    logging.getLogger().setLevel(logging.WARNING)
+    etapes = SuiviEtapes()
+    start = time.perf_counter()
+    referentiel, _ = construire_referentiel_streaming(path, etapes=etapes)
+    queue.put({'total_s': round(time.perf_counter() - start, 3), 'etapes': _durees_etapes(etapes),
+               'pic_rss_mo': round(_pic_rss_mo(), 1), 'cotes': len(referentiel)})
+
+
+def _mesurer_chargement(dossier, queue):
+    import argus_store
+    import argus_backoff
+    import argus_snapshot
+    from argus_index import SegmentIndex
+    from ArgusBuilder import OUTPUT_DB
+    logging.getLogger().setLevel(logging.WARNING)
+    resultats = {}
+    start = time.perf_counter()
+    SegmentIndex.depuis_fichier(os.path.join(dossier, OUTPUT_DB))
+    resultats['csv_s'] = round(time.perf_counter() - start, 4)
+    timings = {}
+    start = time.perf_counter()
+    argus_snapshot.BundleReferentiel.construire(os.path.join(dossier, argus_store.OUTPUT_COLUMNAR),
+                                                os.path.join(dossier, argus_backoff.OUTPUT_BACKOFF), timings=timings)
+    resultats['colonnes_s'] = round(time.perf_counter() - start, 4)
+    resultats['colonnes_construction_index_s'] = round(timings['construction_index_s'], 4)
+    start = time.perf_counter()
+    bundle = argus_snapshot.charger_snapshot(os.path.join(dossier, argus_snapshot.OUTPUT_SNAPSHOT))
+    resultats['instantane_s'] = round(time.perf_counter() - start, 4)
+    resultats['instantane_valide'] = bundle is not None
+    queue.put(resultats)
+
+
+def _mesurer_service(dossier, n_requetes, tailles_lot, queue):
+    import argus_store
+    import argus_backoff
+    import argus_snapshot
+    os.environ.update({
+        "ARGUS_REFERENTIEL": os.path.join(dossier, argus_store.OUTPUT_COLUMNAR),
+        "ARGUS_BACKOFF": os.path.join(dossier, argus_backoff.OUTPUT_BACKOFF),
+        "ARGUS_SNAPSHOT": os.path.join(dossier, argus_snapshot.OUTPUT_SNAPSHOT),
+        "ARGUS_CACHE_MAX_ENTRIES": "0", "ARGUS_LOG_SAMPLE": "0", "ARGUS_LOG_LEVEL": "warning",
+    })
+    start = time.perf_counter()
+    import api_ia
+    demarrage_s = time.perf_counter() - start
+    from bench_predict import echantillon_payloads
+
+    client = api_ia.app.test_client()
+    payloads = echantillon_payloads(api_ia.REFERENTIEL.bundle.index, n_requetes)
+    for payload in payloads[:50]:
+        client.post('/predict', json=payload)
+    latences = []
+    for payload in payloads:
+        start = time.perf_counter()
+        client.post('/predict', json=payload)
+        latences.append(time.perf_counter() - start)
+
+    lots = {}
+    rng = random.Random(0)
+    for taille in tailles_lot:
+        lot = [payloads[rng.randrange(len(payloads))] for _ in range(taille)]
+        client.post('/predict/batch', json=lot)
+        durees = []
+        for _ in range(max(3, 20_000 // taille)):
+            start = time.perf_counter()
+            client.post('/predict/batch', json=lot)
+            durees.append(time.perf_counter() - start)
+        mediane = float(np.median(durees))
+        lots[str(taille)] = {'mediane_ms': round(mediane * 1000, 3), 'annonces_par_s': int(taille / mediane)}
+
+    queue.put({
+        'demarrage_s': round(demarrage_s, 3),
+        'source': api_ia.DEMARRAGE.get('source'),
+        'predict': {'requetes': len(latences), **_percentiles_ms(latences)},
+        'predict_batch': lots,
+        'pic_rss_mo': round(_pic_rss_mo(), 1),
+    })
+
+
+def _dans_processus(cible, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=cible, args=(*args, queue))
+    proc.start()
+    while True:
+        try:
+            resultat = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            if not proc.is_alive():
+                raise RuntimeError(f"{cible.__name__} : processus terminé sans résultat (code {proc.exitcode})")
+    proc.join()
+    return resultat
+
+
+# --- SUITE ---
+
+def suite(tailles, workdir, seed=0, skew=1.0, flux=True, n_requetes=2000, tailles_lot=TAILLES_LOT):
+    from importlib.metadata import version
+    resultats = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': version('pandas'),
+            'cpu': os.cpu_count(),
+            'plateforme': platform.platform(),
+            'seed': seed,
+            'skew': skew,
+        },
+        'tailles': {},
+    }
+    for taille in tailles:
+        path = os.path.join(workdir, f"leboncoin_synth_{taille}_s{seed}_k{skew:g}.csv")
+        mesure = {}
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            mesure['segments_tires'] = _dans_processus(_generer, taille, path, seed, skew)
+            print(f"[{taille}] dataset généré en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        mesure['taille_fichier_mo'] = round(os.path.getsize(path) / (1024 * 1024), 1)
+        dossier = os.path.join(workdir, str(taille))
+        os.makedirs(dossier, exist_ok=True)
+
+        mesure['build'] = _dans_processus(_mesurer_build, path, dossier)
+        print(f"[{taille}] build {mesure['build']['total_s']}s", file=sys.stderr)
+        if flux:
+            mesure['flux'] = _dans_processus(_mesurer_flux, path)
+            print(f"[{taille}] flux {mesure['flux']['total_s']}s", file=sys.stderr)
+        mesure['chargement'] = _dans_processus(_mesurer_chargement, dossier)
+        mesure['service'] = _dans_processus(_mesurer_service, dossier, n_requetes, tailles_lot)
+        print(f"[{taille}] /predict p99 {mesure['service']['predict']['p99_ms']}ms", file=sys.stderr)
+        resultats['tailles'][str(taille)] = mesure
+    return resultats
+
+
+# --- COMPARAISON ---
+
+def aplatir(d, prefixe=''):
+    plat = {}
+    for cle, valeur in d.items():
+        nom = f"{prefixe}{cle}"
+        if isinstance(valeur, dict):
+            plat.update(aplatir(valeur, nom + '.'))
+        elif isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            plat[nom] = valeur
+    return plat
+
+
+def _suffixe(nom):
+    # '_par_s' avant '_s' : un débit se termine aussi par '_s'
+    return next((s for s in ('_par_s', '_ms', '_mo', '_s') if nom.endswith(s)), None)
+
+
+def comparer(resultats, reference, seuil=SEUIL_DEFAUT):
+    """Liste des régressions (métriques communes aux deux résultats), chacune avec son écart relatif."""
+    actuel, ref = aplatir(resultats['tailles']), aplatir(reference['tailles'])
+    regressions = []
+    for nom in sorted(actuel.keys() & ref.keys()):
+        suffixe = _suffixe(nom)
+        if suffixe is None or ref[nom] <= 0:
+            continue
+        ecart = (actuel[nom] - ref[nom]) / ref[nom]
+        if suffixe == '_par_s':
+            degrade = ecart < -seuil
+        else:
+            degrade = ecart > seuil and actuel[nom] - ref[nom] > PLANCHERS[suffixe]
+        if degrade:
+            regressions.append({'metrique': nom, 'reference': ref[nom], 'actuel': actuel[nom], 'ecart': round(ecart, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks build + service sur datasets synthétiques")
+    parser.add_argument("--sizes", nargs='+', default=TAILLES_DEFAUT, help="Tailles de dataset (10k, 1M, 5M...)")
+    parser.add_argument("--workdir", default=os.path.join(os.environ.get("TMPDIR", "/tmp"), "argus_bench"),
+                        help="Datasets générés (réutilisés) et sorties du build, un sous-répertoire par taille")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--requests", type=int, default=2000, help="Nombre de /predict unitaires mesurés")
+    parser.add_argument("--batch-sizes", type=int, nargs='+', default=TAILLES_LOT)
+    parser.add_argument("--no-streaming", action="store_true", help="Ne mesure pas le build par morceaux")
+    parser.add_argument("--output", help="Écrit les résultats JSON dans ce fichier (défaut : sortie standard)")
+    parser.add_argument("--results", help="Ne lance rien : relit ce fichier de résultats (à comparer avec --baseline)")
+    parser.add_argument("--baseline", help="Résultats de référence : code de sortie 1 en cas de régression")
+    parser.add_argument("--threshold", type=float, default=SEUIL_DEFAUT,
+                        help="Dégradation relative tolérée avant de signaler une régression")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results, encoding='utf-8') as f:
+            resultats = json.load(f)
+    else:
+        os.makedirs(args.workdir, exist_ok=True)
+        resultats = suite([lire_taille(t) for t in args.sizes], args.workdir, args.seed, args.skew,
+                          not args.no_streaming, args.requests, args.batch_sizes)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(resultats, f, indent=2)
+        else:
+            print(json.dumps(resultats, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            reference = json.load(f)
+        regressions = comparer(resultats, reference, args.threshold)
+        for r in regressions:
+            print(f"RÉGRESSION {r['metrique']} : {r['reference']} -> {r['actuel']} ({r['ecart']:+.0%})", file=sys.stderr)
+        print(f"{len(regressions)} régression(s) au-delà de {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+# Fichier: benchmarks/generer_dataset.py
+# Jeu d'annonces synthétique au format du dataset LeBonCoin (leboncoin_FINAL_PLATINUM_V16.csv),
+# de quelques milliers à plusieurs millions de lignes, pour les benchmarks de build et de service.
+#
+# Les segments sont tirés du référentiel V21 avec un poids Volume_Annonces ** skew : skew = 1 reproduit
+# la concentration observée (quelques modèles très présents, une longue traîne de segments rares),
+# skew > 1 l'accentue, skew = 0 l'aplatit. Km et prix sont bruités autour de la cote et de la décote
+# du segment, avec les défauts de saisie du scraping : marques en minuscules, finitions suivies
+# d'espaces, puissance manquante (0) et prix aberrants. Écriture par morceaux : la mémoire reste
+# bornée quelle que soit la taille demandée, et le fichier est identique pour une même graine.
+#
+# Usage : python benchmarks/generer_dataset.py --rows 1000000 --output /tmp/leboncoin_1M.csv [--seed 0] [--skew 1.0]
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENTIEL_SOURCE = os.path.join(BASE_DIR, "..", "backend", "argus_referentiel_v21.csv")
+
+COLONNES = ['Titre', 'Marque', 'Modèle', 'Année', 'Kilométrage', 'Puissance', 'Énergie', 'Boîte', 'Finition', 'Prix']
+MORCEAU = 500_000
+BRUIT_KM = 30_000
+BRUIT_PRIX = 1_500
+PART_ABERRANTS = 0.03
+PART_PUISSANCE_MANQUANTE = 0.10
+
+
+def charger_segments(path=REFERENTIEL_SOURCE):
+    ref = pd.read_csv(path, sep=';', encoding='utf-8-sig', keep_default_na=False)
+    return ref[ref['Volume_Annonces'] > 0].reset_index(drop=True)
+
+
+def generer_morceau(r, rng):
+    """Une annonce par ligne de segment de `r`, km et prix bruités autour du segment."""
+    n = len(r)
+    km_ref = r['Km_Reference'].to_numpy(np.float64)
+    km = np.clip(km_ref + rng.normal(0, BRUIT_KM, n), 0, None).astype(np.int64)
+    prix = r['Cote_Reference'].to_numpy(np.float64) + (km - km_ref) * r['Decote_par_Km'].to_numpy(np.float64)
+    prix += rng.normal(0, BRUIT_PRIX, n)
+    aberrants = rng.random(n) < PART_ABERRANTS
+    prix[aberrants] *= rng.uniform(0.1, 3, int(aberrants.sum()))
+    puissance = r['Puissance'].to_numpy().copy()
+    puissance[rng.random(n) < PART_PUISSANCE_MANQUANTE] = 0
+    return pd.DataFrame({
+        'Titre': 'x',
+        'Marque': r['Marque'].str.lower().to_numpy(),
+        'Modèle': r['Modèle'].to_numpy(),
+        'Année': r['Année'].to_numpy(),
+        'Kilométrage': km,
+        'Puissance': puissance,
+        'Énergie': r['Énergie'].to_numpy(),
+        'Boîte': r['Boîte'].to_numpy(),
+        'Finition': (r['Finition'] + ' ').to_numpy(),
+        'Prix': np.maximum(prix, 100).astype(np.int64),
+    }, columns=COLONNES)
+
+
+def generer(n, output, seed=0, skew=1.0, referentiel=REFERENTIEL_SOURCE, morceau=MORCEAU):
+    """Écrit `n` annonces dans `output` (CSV ';') ; retourne le nombre de segments distincts tirés."""
+    segments = charger_segments(referentiel)
+    poids = segments['Volume_Annonces'].to_numpy(np.float64) ** skew
+    poids /= poids.sum()
+    tires = np.zeros(len(segments), dtype=bool)
+    tmp = f"{output}.tmp{os.getpid()}"
+    for i, debut in enumerate(range(0, n, morceau)):
+        # Une graine par morceau : le contenu ne dépend pas de la taille des morceaux précédents
+        rng = np.random.default_rng([seed, i])
+        idx = rng.choice(len(segments), size=min(morceau, n - debut), p=poids)
+        df = generer_morceau(segments.iloc[idx], rng)
+        df.to_csv(tmp, sep=';', index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+        tires[idx] = True
+    os.replace(tmp, output)
+    return int(tires.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un dataset d'annonces synthétique au format LeBonCoin")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="Exposant appliqué à Volume_Annonces pour le tirage des segments")
+    parser.add_argument("--referentiel", default=REFERENTIEL_SOURCE)
+    args = parser.parse_args()
+    nb = generer(args.rows, args.output, args.seed, args.skew, args.referentiel)
+    print(f"{args.rows} annonces, {nb} segments -> {args.output}", file=sys.stderr)
@@ -0,0 +1,199 @@
+# Fichier: benchmarks/load_test.py
+# Test de charge local du mode production (gunicorn -c gunicorn.conf.py) sur socket Unix.
+#
+# Pour chaque nombre de workers, lance gunicorn avec la configuration de production liée à un
+# socket Unix (aucun port réseau), puis envoie des /predict en keep-alive depuis N threads
+# clients pour chaque niveau de concurrence. Rapporte débit, latences de queue et mémoire
+# proportionnelle (PSS, Linux) du maître + workers : le référentiel préchargé est partagé.
+# --batch-size ajoute un client de fond qui envoie en continu de gros /predict/batch
+# (requêtes lentes) pour mesurer leur effet sur la latence des /predict.
+#
+# Usage : python benchmarks/load_test.py [--workers 1 2 4] [--threads 1 4] [--concurrency 1 8 32]
+#                                        [--requests 2000] [--batch-size 0]
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from argus_index import SegmentIndex, SEGMENT_COLS
+from argus_snapshot import trouver_referentiel
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def echantillon(index, n, seed=0):
+    rng = random.Random(seed)
+    cles = list(index.index.items())
+    payloads = []
+    for _ in range(n):
+        cle, i = cles[rng.randrange(len(cles))]
+        payload = dict(zip(SEGMENT_COLS, cle))
+        payload['km'] = max(0, int(index.km_ref[i]) + rng.randint(-60000, 150000))
+        payloads.append(json.dumps(payload))
+    return payloads
+
+
+def pss_mo(pid):
+    """PSS cumulée du processus et de ses enfants directs (None hors Linux)."""
+    try:
+        enfants = open(f"/proc/{pid}/task/{pid}/children").read().split()
+        total = 0
+        for p in [str(pid)] + enfants:
+            for ligne in open(f"/proc/{p}/smaps_rollup"):
+                if ligne.startswith("Pss:"):
+                    total += int(ligne.split()[1])
+        return round(total / 1024, 1)
+    except OSError:
+        return None
+
+
+class Serveur:
+    """gunicorn en sous-processus, lié à un socket Unix temporaire."""
+
+    def __init__(self, workers, threads, extra_env=None):
+        self.socket_path = os.path.join(tempfile.mkdtemp(prefix="argus_load_"), "gunicorn.sock")
+        env = {**os.environ, "ARGUS_BIND": f"unix:{self.socket_path}", "ARGUS_WORKERS": str(workers),
+               "ARGUS_THREADS": str(threads), "ARGUS_LOG_SAMPLE": "0", "ARGUS_LOG_LEVEL": "warning",
+               **(extra_env or {})}
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "api_ia:app"],
+            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.workers = workers
+
+    def attendre(self, delai=60):
+        fin = time.time() + delai
+        while time.time() < fin:
+            try:
+                conn = UnixHTTPConnection(self.socket_path, timeout=2)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    if self._nb_workers() >= self.workers:
+                        return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("gunicorn n'a pas démarré")
+
+    def _nb_workers(self):
+        try:
+            return len(open(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children").read().split())
+        except OSError:
+            return self.workers
+
+    def arreter(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=30)
+
+
+def charger(socket_path, payloads, concurrency, batch_size):
+    latences, erreurs = [], [0]
+    verrou = threading.Lock()
+    parts = [payloads[i::concurrency] for i in range(concurrency)]
+    headers = {"Content-Type": "application/json"}
+    arret = threading.Event()
+
+    def client(part):
+        conn = UnixHTTPConnection(socket_path)
+        local = []
+        for corps in part:
+            start = time.perf_counter()
+            conn.request("POST", "/predict", body=corps, headers=headers)
+            r = conn.getresponse()
+            r.read()
+            local.append(time.perf_counter() - start)
+            if r.status != 200:
+                with verrou:
+                    erreurs[0] += 1
+        conn.close()
+        with verrou:
+            latences.extend(local)
+
+    def fond():
+        conn = UnixHTTPConnection(socket_path)
+        lot = "[" + ",".join((payloads * (batch_size // len(payloads) + 1))[:batch_size]) + "]"
+        while not arret.is_set():
+            conn.request("POST", "/predict/batch", body=lot, headers=headers)
+            conn.getresponse().read()
+        conn.close()
+
+    t_fond = threading.Thread(target=fond) if batch_size > 0 else None
+    if t_fond: t_fond.start()
+    start = time.perf_counter()
+    ts = [threading.Thread(target=client, args=(part,)) for part in parts]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    duree = time.perf_counter() - start
+    arret.set()
+    if t_fond: t_fond.join()
+
+    ms = np.asarray(latences) * 1000
+    return {
+        'requetes_par_s': int(len(latences) / duree),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'p999_ms': round(float(np.percentile(ms, 99.9)), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'erreurs': erreurs[0],
+    }
+
+
+def campagne(workers_list, threads_list, concurrency_list, n_requests, batch_size):
+    # Même ordre de recherche que api_ia, sans importer Flask dans le processus client
+    referentiel = trouver_referentiel()
+    payloads = echantillon(SegmentIndex.depuis_fichier(referentiel), n_requests)
+
+    resultats = []
+    for workers in workers_list:
+        for threads in threads_list:
+            serveur = Serveur(workers, threads)
+            try:
+                start = time.perf_counter()
+                serveur.attendre()
+                demarrage_s = round(time.perf_counter() - start, 2)
+                memoire = pss_mo(serveur.proc.pid)
+                for concurrency in concurrency_list:
+                    mesure = charger(serveur.socket_path, payloads, concurrency, batch_size)
+                    resultats.append({'workers': workers, 'threads': threads, 'concurrency': concurrency,
+                                      'batch_fond': batch_size, 'demarrage_s': demarrage_s,
+                                      'pss_total_mo': memoire, **mesure})
+                    print(json.dumps(resultats[-1]), file=sys.stderr)
+            finally:
+                serveur.arreter()
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge local de gunicorn.conf.py (socket Unix)")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, nargs='+', default=[1, 4])
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Taille des /predict/batch envoyés en continu en arrière-plan (0 = aucun)")
+    args = parser.parse_args()
+    print(json.dumps(campagne(args.workers, args.threads, args.concurrency, args.requests, args.batch_size), indent=2))
@@ -1,38 +1,27 @@
-import pandas as pd
-import numpy as np
+# Fichier: clean.py
+# Nettoyage de MA_COTE_ARGUS_OFFICIELLE.csv : correction des marques 'AUTRE' puis fusion
+# pondérée des lignes devenues identiques.
+#
+# Importable (aucun traitement à l'import) et vectorisé : les tables modèle -> marque sont
+# construites par drop_duplicates, la correction ne porte que sur le sous-ensemble 'AUTRE'
+# (une fois par modèle distinct) avec une seule regex compilée.
+#
+# Usage : python clean.py [--input MA_COTE_ARGUS_OFFICIELLE.csv] [--output ..._CLEAN.csv] [--check-parity]
+
+import re
+import sys
+import time
+import argparse
 
-# 1. CHARGEMENT DU FICHIER
-# Assure-toi que le fichier est dans le même dossier
-try:
-    df = pd.read_csv('MA_COTE_ARGUS_OFFICIELLE.csv', sep=';', encoding='utf-8')
-    print(f"Lignes initiales : {len(df)}")
-except:
-    # Fallback si encodage différent
-    df = pd.read_csv('MA_COTE_ARGUS_OFFICIELLE.csv', sep=';', encoding='latin-1')
-    print(f"Lignes initiales : {len(df)}")
+import pandas as pd
 
-# Nettoyage basique des chaînes
-df['Marque'] = df['Marque'].astype(str).str.strip().str.upper()
-df['Modele'] = df['Modele'].astype(str).str.strip().str.upper()
+# --- CONFIGURATION ---
+INPUT_FILE = 'MA_COTE_ARGUS_OFFICIELLE.csv'
+OUTPUT_FILE = 'MA_COTE_ARGUS_OFFICIELLE_CLEAN.csv'
 
-# ---------------------------------------------------------
-# 2. CORRECTION DES MARQUES "AUTRE"
-# ---------------------------------------------------------
-print("🔧 Correction des marques 'AUTRE'...")
-
-# Dictionnaire des modèles connus (appris du fichier lui-même)
-known_models = {}
-for idx, row in df[df['Marque'] != 'AUTRE'].iterrows():
-    m = row['Modele']
-    # On stocke le modèle exact
-    known_models[m] = row['Marque']
-    # On stocke aussi la racine (ex: 'CLIO' pour 'CLIO 2')
-    root = m.split(' ')[0]
-    if len(root) > 2 and root not in known_models:
-        known_models[root] = row['Marque']
-
-# Dictionnaire manuel pour les orphelins (ceux qui n'existent QUE dans AUTRE)
-manual_fix = {
+# Dictionnaire manuel pour les orphelins (ceux qui n'existent QUE dans AUTRE).
+# L'ordre compte : en cas de plusieurs correspondances, la première clé du dictionnaire gagne.
+MANUAL_FIX = {
     'SCIROCCO': 'VOLKSWAGEN', 'CADDY': 'VOLKSWAGEN', 'UP': 'VOLKSWAGEN',
     'JUMPY': 'CITROEN', 'JUMPER': 'CITROEN', 'BERLINGO': 'CITROEN', 'SAXO': 'CITROEN',
     'EXPERT': 'PEUGEOT', 'BOXER': 'PEUGEOT', 'PARTNER': 'PEUGEOT', 'RIFTER': 'PEUGEOT',
@@ -45,40 +34,11 @@ manual_fix = {
     'NV200': 'NISSAN', 'NV300': 'NISSAN', 'PRIMASTAR': 'NISSAN'
 }
 
-def fix_brand(row):
-    if row['Marque'] != 'AUTRE':
-        return row['Marque']
-    
-    model = row['Modele']
-    model_root = model.split(' ')[0]
-    
-    # 1. Vérification manuelle
-    for k, v in manual_fix.items():
-        if k in model: return v
-        
-    # 2. Vérification base connue (Exacte)
-    if model in known_models: return known_models[model]
-    
-    # 3. Vérification base connue (Racine)
-    if model_root in known_models: return known_models[model_root]
-    
-    return 'AUTRE' # Si vraiment introuvable
-
-df['Marque'] = df.apply(fix_brand, axis=1)
-
-# ---------------------------------------------------------
-# 3. FUSION ET RECALCUL (AGRÉGATION)
-# ---------------------------------------------------------
-print("🧮 Recalcul des cotes pondérées...")
-
-# On prépare le calcul de la moyenne pondérée : (Prix * Nb_Annonces)
-df['Masse_Prix'] = df['Cote_Moyenne'] * df['Nb_Annonces']
-
 # Colonnes identifiantes (ce qui définit une version unique)
-group_cols = ['Marque', 'Modele', 'Annee', 'Km_Tranche', 'Energie', 'Boite']
+GROUP_COLS = ['Marque', 'Modele', 'Annee', 'Km_Tranche', 'Energie', 'Boite']
 
 # Règles d'agrégation
-agg_rules = {
+AGG_RULES = {
     'Masse_Prix': 'sum',        # On somme les masses monétaires
     'Nb_Annonces': 'sum',       # On somme le nombre d'annonces
     'Prix_Min': 'min',          # On prend le prix le plus bas global
@@ -87,28 +47,184 @@ agg_rules = {
     'Fiabilité': 'first'        # On garde le premier commentaire de fiabilité trouvé
 }
 
-# GroupBy
-df_clean = df.groupby(group_cols, as_index=False).agg(agg_rules)
+FINAL_COLS = ['Marque', 'Modele', 'Annee', 'Km_Tranche', 'Energie', 'Boite',
+              'Cote_Moyenne', 'Cote_Mediane', 'Prix_Min', 'Prix_Max',
+              'Nb_Annonces', 'Fiabilité']
 
-# Calcul final de la nouvelle moyenne pondérée
-df_clean['Cote_Moyenne'] = (df_clean['Masse_Prix'] / df_clean['Nb_Annonces']).round().astype(int)
 
-# Nettoyage colonne temporaire
-df_clean.drop(columns=['Masse_Prix'], inplace=True)
+# ---------------------------------------------------------
+# 1. CHARGEMENT
+# ---------------------------------------------------------
+
+def charger(path=INPUT_FILE):
+    try:
+        df = pd.read_csv(path, sep=';', encoding='utf-8')
+    except UnicodeDecodeError:
+        # Fallback si encodage différent
+        df = pd.read_csv(path, sep=';', encoding='latin-1')
+    print(f"Lignes initiales : {len(df)}")
+
+    # Nettoyage basique des chaînes
+    df['Marque'] = df['Marque'].astype(str).str.strip().str.upper()
+    df['Modele'] = df['Modele'].astype(str).str.strip().str.upper()
+    return df
+
+
+# ---------------------------------------------------------
+# 2. CORRECTION DES MARQUES "AUTRE"
+# ---------------------------------------------------------
+
+def _racines(modeles):
+    return modeles.str.split(' ').str[0]
+
+
+def construire_modeles_connus(df):
+    """
+    Modèles connus (appris du fichier lui-même) -> marque.
+    Modèle exact : la dernière ligne l'emporte ; racine ('CLIO' pour 'CLIO 2', plus de 2 caractères) :
+    la première ligne l'emporte, sauf si la racine existe aussi comme modèle exact.
+    """
+    connus = df.loc[df['Marque'] != 'AUTRE', ['Modele', 'Marque']]
+    exacts = connus.drop_duplicates('Modele', keep='last')
+    racines = connus.assign(Modele=_racines(connus['Modele']))
+    racines = racines[racines['Modele'].str.len() > 2].drop_duplicates('Modele', keep='first')
+    known_models = dict(zip(racines['Modele'], racines['Marque']))
+    known_models.update(zip(exacts['Modele'], exacts['Marque']))
+    return known_models
+
+
+def compiler_correction_manuelle(manual_fix=MANUAL_FIX):
+    """
+    Une seule regex pour toutes les clés. Le lookahead capture les correspondances qui se
+    chevauchent ; à une position donnée, les alternatives sont essayées dans l'ordre du dictionnaire.
+    """
+    alternatives = '|'.join(re.escape(k) for k in manual_fix)
+    return re.compile(f'(?=({alternatives}))')
+
+
+def corriger_marques(df, manual_fix=MANUAL_FIX):
+    """Marques corrigées (mêmes règles et priorités que fix_brand, calculées une fois par modèle 'AUTRE' distinct)."""
+    marques = df['Marque'].copy()
+    autre = (marques == 'AUTRE').to_numpy()
+    if not autre.any():
+        return marques
+
+    known_models = construire_modeles_connus(df)
+    regex = compiler_correction_manuelle(manual_fix)
+    priorite = {k: i for i, k in enumerate(manual_fix)}
+    cibles = list(manual_fix.values())
+
+    modeles = pd.Series(df.loc[autre, 'Modele'].unique())
+    # 1. Vérification manuelle : la clé la plus prioritaire parmi toutes les correspondances
+    rangs = modeles.str.findall(regex).map(lambda ks: min(priorite[k] for k in ks) if ks else -1)
+    # 2. Base connue (exacte) puis 3. racine
+    resolus = modeles.map(known_models).fillna(_racines(modeles).map(known_models)).fillna('AUTRE')
+    manuel = rangs.to_numpy() >= 0
+    resolus[manuel] = [cibles[r] for r in rangs[manuel]]
+
+    marques.loc[autre] = df.loc[autre, 'Modele'].map(dict(zip(modeles, resolus))).to_numpy()
+    return marques
+
+
+# ---------------------------------------------------------
+# 3. FUSION ET RECALCUL (AGRÉGATION)
+# ---------------------------------------------------------
+
+def agreger(df):
+    # Moyenne pondérée : (Prix * Nb_Annonces)
+    df = df.assign(Masse_Prix=df['Cote_Moyenne'] * df['Nb_Annonces'])
+    df_clean = df.groupby(GROUP_COLS, as_index=False).agg(AGG_RULES)
+    df_clean['Cote_Moyenne'] = (df_clean['Masse_Prix'] / df_clean['Nb_Annonces']).round().astype(int)
+    return df_clean[FINAL_COLS]
+
+
+def nettoyer(df, timings=None):
+    """Pipeline complet sur un DataFrame chargé. `timings` (dict) reçoit la durée de chaque étape."""
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    df = df.assign(Marque=corriger_marques(df))
+    timings['correction_marques_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    df_clean = agreger(df)
+    timings['agregation_s'] = time.perf_counter() - start
+    return df_clean
 
-# Réorganiser les colonnes comme l'original
-final_cols = ['Marque', 'Modele', 'Annee', 'Km_Tranche', 'Energie', 'Boite', 
-              'Cote_Moyenne', 'Cote_Mediane', 'Prix_Min', 'Prix_Max', 
-              'Nb_Annonces', 'Fiabilité']
-              
-df_clean = df_clean[final_cols]
 
 # ---------------------------------------------------------
-# 4. SAUVEGARDE
+# IMPLÉMENTATION D'ORIGINE (référence pour --check-parity)
 # ---------------------------------------------------------
-output_file = 'MA_COTE_ARGUS_OFFICIELLE_CLEAN.csv'
-df_clean.to_csv(output_file, sep=';', index=False, encoding='utf-8')
 
-print(f"✅ Terminé ! Fichier généré : {output_file}")
-print(f"Lignes finales (après fusion) : {len(df_clean)}")
-print(f"Lignes fusionnées (nettoyées) : {len(df) - len(df_clean)}")
\ No newline at end of file
+def nettoyer_legacy(df):
+    """Script d'origine, ligne à ligne (iterrows + apply)."""
+    df = df.copy()
+    known_models = {}
+    for idx, row in df[df['Marque'] != 'AUTRE'].iterrows():
+        m = row['Modele']
+        known_models[m] = row['Marque']
+        root = m.split(' ')[0]
+        if len(root) > 2 and root not in known_models:
+            known_models[root] = row['Marque']
+
+    def fix_brand(row):
+        if row['Marque'] != 'AUTRE':
+            return row['Marque']
+        model = row['Modele']
+        model_root = model.split(' ')[0]
+        for k, v in MANUAL_FIX.items():
+            if k in model: return v
+        if model in known_models: return known_models[model]
+        if model_root in known_models: return known_models[model_root]
+        return 'AUTRE'
+
+    df['Marque'] = df.apply(fix_brand, axis=1)
+    df['Masse_Prix'] = df['Cote_Moyenne'] * df['Nb_Annonces']
+    df_clean = df.groupby(GROUP_COLS, as_index=False).agg(AGG_RULES)
+    df_clean['Cote_Moyenne'] = (df_clean['Masse_Prix'] / df_clean['Nb_Annonces']).round().astype(int)
+    df_clean.drop(columns=['Masse_Prix'], inplace=True)
+    return df_clean[FINAL_COLS]
+
+
+def verifier_parite(df):
+    """Compare les CSV produits par les deux implémentations. Retourne (identique, timings)."""
+    timings = {}
+    start = time.perf_counter()
+    legacy = nettoyer_legacy(df)
+    timings['legacy_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorise = nettoyer(df, timings)
+    timings['vectorise_s'] = time.perf_counter() - start
+    identique = legacy.to_csv(sep=';', index=False) == vectorise.to_csv(sep=';', index=False)
+    return identique, timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correction des marques 'AUTRE' et fusion de la cote officielle")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--check-parity", action="store_true",
+                        help="Compare avec l'implémentation ligne à ligne d'origine (timings inclus) puis quitte")
+    args = parser.parse_args()
+
+    df = charger(args.input)
+
+    if args.check_parity:
+        identique, timings = verifier_parite(df)
+        print(f"Parité legacy/vectorisé : {'OK' if identique else 'ÉCART'}")
+        for etape, duree in timings.items():
+            print(f"   {etape} : {duree:.3f}")
+        print(f"   accélération : x{timings['legacy_s'] / timings['vectorise_s']:.1f}")
+        sys.exit(0 if identique else 1)
+
+    print("🔧 Correction des marques 'AUTRE' + 🧮 recalcul des cotes pondérées...")
+    timings = {}
+    df_clean = nettoyer(df, timings)
+
+    # ---------------------------------------------------------
+    # 4. SAUVEGARDE
+    # ---------------------------------------------------------
+    df_clean.to_csv(args.output, sep=';', index=False, encoding='utf-8')
+
+    print(f"✅ Terminé ! Fichier généré : {args.output}")
+    print(f"Lignes finales (après fusion) : {len(df_clean)}")
+    print(f"Lignes fusionnées (nettoyées) : {len(df) - len(df_clean)}")
+    print("Durées : " + ", ".join(f"{etape} {duree:.3f}s" for etape, duree in timings.items()))
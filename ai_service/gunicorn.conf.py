@@ -0,0 +1,38 @@
+# Fichier: gunicorn.conf.py
+# Mode de service production : gunicorn préforké, référentiel chargé AVANT le fork.
+#
+# preload_app importe api_ia dans le processus maître (référentiel, tables de repli, index,
+# facettes) : les workers partagent ces pages en copie-sur-écriture au lieu de recharger chacun
+# leur copie. gc.freeze() avant chaque fork évite que le ramasse-miettes ne touche (et donc ne
+# duplique) les objets hérités. Les workers gthread servent plusieurs requêtes à la fois :
+# une requête lente n'en bloque plus d'autres.
+# Un référentiel republié est rechargé à chaud par chaque worker (ARGUS_REFERENTIEL_RELOAD_S,
+# voir argus_snapshot.ReferentielServi) : plus de redémarrage, mais la nouvelle version n'est
+# plus partagée entre workers (un pickle par worker en mémoire) jusqu'au prochain redéploiement.
+#
+# Usage : gunicorn -c gunicorn.conf.py api_ia:app
+# Variables : PORT, ARGUS_WORKERS (ou WEB_CONCURRENCY), ARGUS_THREADS, ARGUS_TIMEOUT, ARGUS_BIND
+
+import gc
+import os
+import multiprocessing
+
+bind = os.environ.get("ARGUS_BIND") or f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get("ARGUS_WORKERS") or os.environ.get("WEB_CONCURRENCY") or min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = "gthread"
+threads = int(os.environ.get("ARGUS_THREADS", 4))
+preload_app = True
+
+timeout = int(os.environ.get("ARGUS_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Pas de log d'accès par requête (voir ARGUS_LOG_SAMPLE dans api_ia pour l'échantillonnage)
+accesslog = os.environ.get("ARGUS_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.environ.get("ARGUS_LOG_LEVEL", "info").lower()
+
+
+def pre_fork(server, worker):
+    gc.freeze()